@@ -0,0 +1,42 @@
+"""Compare per-call arithmetic tools with the BatchArithmetic tool.
+
+poetry run python -m src.benchmarks.arithmetic --items 10000 --numbers 8
+"""
+
+import argparse
+import random
+import time
+
+from src.langchain.react_custom import total
+from src.libs.arithmetic import batch_arithmetic
+
+
+def measure(func, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(items: int, numbers: int, seed: int = 0):
+    rng = random.Random(seed)
+    rows = [" ".join(str(rng.randint(0, 10**6)) for _ in range(numbers)) for _ in range(items)]
+
+    per_call = measure(lambda: [total(row) for row in rows])
+    batch = measure(batch_arithmetic, ";".join(f"Total[{row}]" for row in rows))
+    print(f"{items} x Total[{numbers} numbers]: per call {per_call * 1000:.1f} ms ({items} tool calls), batch {batch * 1000:.1f} ms (1 tool call)")
+
+    large = " ".join(rows)
+    per_call = measure(total, large)
+    batch = measure(batch_arithmetic, f"Total[{large}]")
+    print(f"Total[{items * numbers} numbers]: per call {per_call * 1000:.1f} ms, batch {batch * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="arithmetic benchmark")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--numbers", type=int, default=8)
+    args = parser.parse_args()
+    main(items=args.items, numbers=args.numbers)
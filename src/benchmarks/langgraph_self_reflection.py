@@ -0,0 +1,305 @@
+"""Latency benchmark of the self-reflection RAG graph with a simulated chat model and retriever.
+
+poetry run python -m src.benchmarks.langgraph_self_reflection --questions 200 --concurrency 32 --latency lognormal:0.2:0.5
+poetry run python -m src.benchmarks.langgraph_self_reflection --save baseline.json
+poetry run python -m src.benchmarks.langgraph_self_reflection --baseline baseline.json  # exit status 1 on a regression
+
+Model and retriever calls only sleep, so the numbers isolate the graph: p50 / p99 end-to-end latency, throughput,
+and per node the time not spent in model or retriever calls (graph, prompt and parser overhead).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict, PrivateAttr
+
+from src.examples.langgraph_self_reflection import create_graph
+from src.langchain.callback import ProfilingCallbackHandler
+
+
+def _load_fake_chat_model():
+    # tests/ is not a package (and `tests` may name an installed distribution), load the shared fake by path
+    path = Path(__file__).resolve().parents[2] / "tests" / "langchain" / "fake_chat_model.py"
+    spec = importlib.util.spec_from_file_location("fake_chat_model", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.FakeChatModel
+
+
+FakeChatModel = _load_fake_chat_model()
+
+NODES = ("retrieve", "grade_documents", "generate", "transform_query")
+
+Latency = Callable[[random.Random], float]
+
+
+def parse_latency(spec: str) -> Latency:
+    """`constant:SECONDS`, `uniform:LOW:HIGH` or `lognormal:MEDIAN:SIGMA` (heavy tailed, like real model latency)."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "constant" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "lognormal" and len(values) == 2:
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0.0, sigma)
+    raise ValueError(f"unknown latency distribution: {spec!r}")
+
+
+def _fraction(text: str) -> float:
+    """Deterministic value in [0, 1) for `text`."""
+    return zlib.crc32(text.encode("utf-8")) % 10_000 / 10_000
+
+
+class LatencyFakeChatModel(FakeChatModel):
+    """FakeChatModel sleeping for a sampled latency, and answering the graph's structured graders.
+
+    Document relevance is a deterministic function of the prompt, the hallucination and answer grades are drawn
+    with `grounded_rate` / `answered_rate`, so retry loops happen at a controlled rate.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    latency: Any = parse_latency("constant:0")
+    relevant_rate: float = 0.5
+    grounded_rate: float = 0.9
+    answered_rate: float = 0.9
+    seed: int = 0
+
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    def _sample(self) -> float:
+        with self._lock:
+            return self.latency(self._rng)
+
+    def _chance(self, rate: float) -> bool:
+        with self._lock:
+            return self._rng.random() < rate
+
+    def bind_tools(self, tools: Sequence[Any], tool_choice: Optional[Any] = None, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _result(self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]]) -> ChatResult:
+        if not tools:
+            message = AIMessage(content="fake response")
+        else:
+            name = tools[0]["function"]["name"]
+            if name == "GradeDocuments":
+                yes = _fraction(messages[-1].content) < self.relevant_rate
+            else:
+                yes = self._chance(self.grounded_rate if name == "GradeHallucinations" else self.answered_rate)
+            message = AIMessage(content="", tool_calls=[{"name": name, "args": {"binary_score": "yes" if yes else "no"}, "id": "call_0"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self._sample())
+        return self._result(messages, kwargs.get("tools"))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._sample())
+        return self._result(messages, kwargs.get("tools"))
+
+
+class SyntheticRetriever(BaseRetriever):
+    """`k` documents out of a generated corpus of `size`, chosen from the query, after a sampled latency."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    size: int = 1000
+    k: int = 4
+    latency: Any = parse_latency("constant:0")
+    seed: int = 0
+
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    def _sample(self) -> float:
+        with self._lock:
+            return self.latency(self._rng)
+
+    def _documents(self, query: str) -> List[Document]:
+        first = zlib.crc32(query.encode("utf-8"))
+        ids = [(first + i * 7919) % self.size for i in range(self.k)]
+        return [Document(page_content=f"document {i}: synthetic passage about topic {i % 97}", metadata={"id": i}) for i in ids]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        time.sleep(self._sample())
+        return self._documents(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        await asyncio.sleep(self._sample())
+        return self._documents(query)
+
+
+def _percentile(values: List[float], q: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def _external_seconds(record, by_id: Dict[str, Any]) -> float:
+    """Time spent in the model and retriever calls under `record`."""
+    total = 0.0
+    for child in (by_id[c] for c in record.children if c in by_id):
+        total += child.latency if child.kind in ("llm", "chat_model", "retriever") else _external_seconds(child, by_id)
+    return total
+
+
+def run(graph, questions: Sequence[str], concurrency: int = 16, mode: str = "async") -> Dict[str, Any]:
+    """Run every question through `graph` (`ainvoke` on one event loop, or `invoke` on a thread pool) and report timings."""
+    profiler = ProfilingCallbackHandler(maxlen=1_000_000)
+    config = {"callbacks": [profiler], "recursion_limit": 50}
+    latencies: List[float] = []
+
+    def invoke(question: str) -> None:
+        start = time.perf_counter()
+        graph.invoke({"question": question}, config=config)
+        latencies.append(time.perf_counter() - start)
+
+    async def ainvoke_all() -> None:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def ainvoke(question: str) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                await graph.ainvoke({"question": question}, config=config)
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(ainvoke(question) for question in questions))
+
+    start = time.perf_counter()
+    if mode == "async":
+        asyncio.run(ainvoke_all())
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(invoke, questions))
+    elapsed = time.perf_counter() - start
+
+    by_id = {r.run_id: r for r in profiler.records}
+    graph_runs = {r.run_id for r in profiler.records if r.parent_run_id is None}
+    nodes: Dict[str, Dict[str, float]] = {}
+    for name in NODES:
+        records = [r for r in profiler.records if r.name == name and r.parent_run_id in graph_runs]
+        if records:
+            nodes[name] = {
+                "count": len(records),
+                "p50": _percentile([r.latency for r in records], 50),
+                # concurrent model calls can add up to more than the node latency
+                "overhead_mean": sum(max(r.latency - _external_seconds(r, by_id), 0.0) for r in records) / len(records),
+            }
+    return {
+        "mode": mode,
+        "questions": len(questions),
+        "concurrency": concurrency,
+        "p50": _percentile(latencies, 50),
+        "p99": _percentile(latencies, 99),
+        "throughput": len(questions) / elapsed,
+        "nodes": nodes,
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Metrics of `result` more than `tolerance` worse than `baseline`."""
+    regressions = []
+    for metric in ("p50", "p99"):
+        if result[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(f"{metric} {baseline[metric] * 1000:.1f} ms -> {result[metric] * 1000:.1f} ms")
+    if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput']:.1f}/s -> {result['throughput']:.1f}/s")
+    for name, node in result["nodes"].items():
+        before = baseline.get("nodes", {}).get(name)
+        # overheads are small, ignore sub-millisecond noise
+        if before and node["overhead_mean"] > before["overhead_mean"] * (1 + tolerance) + 0.001:
+            regressions.append(f"{name} overhead {before['overhead_mean'] * 1000:.2f} ms -> {node['overhead_mean'] * 1000:.2f} ms")
+    return regressions
+
+
+def report(result: Dict[str, Any]) -> None:
+    print(f"{result['questions']} questions, {result['mode']}, concurrency {result['concurrency']}")
+    print(f"end to end: p50 {result['p50'] * 1000:.1f} ms, p99 {result['p99'] * 1000:.1f} ms, throughput {result['throughput']:.1f} questions/s")
+    for name, node in result["nodes"].items():
+        print(f"  {name:<16} {node['count']:6d} runs  p50 {node['p50'] * 1000:8.1f} ms  overhead {node['overhead_mean'] * 1000:7.2f} ms")
+
+
+def main(
+    questions: int,
+    concurrency: int,
+    latency: str,
+    retriever_latency: str,
+    mode: str,
+    save: Optional[str] = None,
+    baseline: Optional[str] = None,
+    tolerance: float = 0.2,
+    seed: int = 0,
+) -> int:
+    chat = LatencyFakeChatModel(latency=parse_latency(latency), seed=seed)
+    retriever = SyntheticRetriever(latency=parse_latency(retriever_latency), seed=seed)
+    graph = create_graph(chat, retriever, max_generations=3, max_rewrites=2)
+    # the graph logs every step to stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run(graph, [f"question {i}" for i in range(questions)], concurrency=concurrency, mode=mode)
+    report(result)
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="self-reflection graph benchmark")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", default="lognormal:0.05:0.5", help="chat model latency distribution")
+    parser.add_argument("--retriever-latency", default="constant:0.01")
+    parser.add_argument("--mode", choices=("async", "thread"), default="async")
+    parser.add_argument("--save", help="write the result as JSON, e.g. a baseline")
+    parser.add_argument("--baseline", help="compare with a saved result, exit status 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(
+        main(
+            questions=args.questions,
+            concurrency=args.concurrency,
+            latency=args.latency,
+            retriever_latency=args.retriever_latency,
+            mode=args.mode,
+            save=args.save,
+            baseline=args.baseline,
+            tolerance=args.tolerance,
+            seed=args.seed,
+        )
+    )
@@ -0,0 +1,82 @@
+"""Compare parsing the full ReAct completion with stopping the stream at the first action.
+
+poetry run python -m src.benchmarks.react_parser --completions 2000 --token-latency 0.02
+"""
+
+import argparse
+import random
+import time
+from typing import Iterator, List
+
+from langchain_core.exceptions import OutputParserException
+
+from src.langchain.react_parser import ReActOutputParser, StreamingReActParser, parse_stream
+
+
+def generate_completions(count: int, seed: int = 0) -> List[str]:
+    """ReAct completions that keep going after the action with a hallucinated observation, like a real model."""
+    rng = random.Random(seed)
+    completions = []
+    for _ in range(count):
+        company = rng.choice("ABCDEF")
+        tail = "".join(f"\n観察: {rng.randint(0, 10**5)}\n思考: I need to get invoice amount of company {rng.choice('ABCDEF')}." for _ in range(rng.randint(1, 4)))
+        completions.append(f"思考: I need to get invoice amount of company {company}.\n行動: GetInvoice[{company}]{tail}")
+    return completions
+
+
+def tokens(text: str, size: int = 4) -> List[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def simulated_stream(chunks: List[str], latency: float) -> Iterator[str]:
+    for chunk in chunks:
+        time.sleep(latency)
+        yield chunk
+
+
+def main(completions: int, token_latency: float, streamed: int):
+    texts = generate_completions(completions)
+    chunked = [tokens(text) for text in texts]
+
+    parser = ReActOutputParser()
+    start = time.perf_counter()
+    for text in texts:
+        try:
+            parser.parse(text)
+        except OutputParserException:
+            pass  # the hallucinated tail makes the last line an observation, the full-text parser fails
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    consumed = 0
+    for chunks in chunked:
+        streaming = StreamingReActParser()
+        for chunk in chunks:
+            consumed += 1
+            if streaming.feed(chunk) is not None:
+                break
+    incremental = time.perf_counter() - start
+    total = sum(map(len, chunked))
+    print(f"parse {completions} completions: full text {full * 1e6 / completions:.1f} us, streaming {incremental * 1e6 / completions:.1f} us per completion")
+    print(f"tokens consumed: {consumed} of {total} ({consumed / total:.0%}), {total - consumed} tokens not generated")
+
+    # wall clock with a simulated token latency, for a few completions
+    sample = chunked[:streamed]
+    start = time.perf_counter()
+    for chunks in sample:
+        list(simulated_stream(chunks, token_latency))
+    wait_all = time.perf_counter() - start
+    start = time.perf_counter()
+    for chunks in sample:
+        parse_stream(simulated_stream(chunks, token_latency))
+    stop_early = time.perf_counter() - start
+    print(f"latency per step at {token_latency * 1000:.0f} ms/token: full completion {wait_all / len(sample) * 1000:.0f} ms, stop at action {stop_early / len(sample) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="react parser benchmark")
+    parser.add_argument("--completions", type=int, default=2000)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--streamed", type=int, default=5, help="completions replayed with the token latency")
+    args = parser.parse_args()
+    main(completions=args.completions, token_latency=args.token_latency, streamed=args.streamed)
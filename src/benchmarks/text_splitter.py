@@ -0,0 +1,68 @@
+"""Compare LangChain's RecursiveCharacterTextSplitter with JapaneseTextSplitter on a generated Japanese corpus.
+
+poetry run python -m src.benchmarks.text_splitter --documents 2000 --paragraphs 20 --processes 4
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.libs.splitter import JapaneseTextSplitter
+
+WORDS = ["今日", "は", "天気", "が", "良い", "ので", "散歩", "に", "行き", "ます", "東京", "大阪", "会議", "資料", "確認", "LangChain", "agent"]
+
+
+def generate_corpus(documents: int, paragraphs: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+
+    def sentence():
+        return "".join(rng.choice(WORDS) + ("、" if rng.random() < 0.1 else "") for _ in range(rng.randint(5, 40))) + "。"
+
+    return ["\n\n".join("".join(sentence() for _ in range(rng.randint(1, 12))) for _ in range(paragraphs)) for _ in range(documents)]
+
+
+def measure(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(documents: int, paragraphs: int, chunk_size: int, processes: int):
+    corpus = generate_corpus(documents, paragraphs)
+    chars = sum(map(len, corpus))
+    print(f"corpus: {documents} documents, {chars / 1e6:.1f}M characters, chunk_size={chunk_size}")
+
+    def report(name, seconds, chunks):
+        print(f"{name:<40} {seconds * 1000:8.1f} ms {chars / seconds / 1e6:7.1f} Mchar/s {chunks:8d} chunks")
+
+    langchain = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+    seconds, result = measure(lambda: [langchain.split_text(text) for text in corpus])
+    report("RecursiveCharacterTextSplitter", seconds, sum(map(len, result)))
+
+    langchain_ja = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0, separators=["\n\n", "\n", "。", "、", ""], keep_separator="end")
+    seconds, result = measure(lambda: [langchain_ja.split_text(text) for text in corpus])
+    report("RecursiveCharacterTextSplitter (。、)", seconds, sum(map(len, result)))
+
+    serial = JapaneseTextSplitter(chunk_size=chunk_size, processes=1)
+    seconds, result = measure(lambda: list(serial.split_corpus(corpus)))
+    report("JapaneseTextSplitter", seconds, sum(map(len, result)))
+
+    parallel = JapaneseTextSplitter(chunk_size=chunk_size, processes=processes, batch_chars=256 * 1024)
+    seconds, result = measure(lambda: list(parallel.split_corpus(corpus)))
+    report(f"JapaneseTextSplitter ({processes} processes)", seconds, sum(map(len, result)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="text splitter benchmark")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--paragraphs", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+    main(documents=args.documents, paragraphs=args.paragraphs, chunk_size=args.chunk_size, processes=args.processes)
@@ -10,7 +10,6 @@ from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 from langgraph.graph import END, START, MessagesState, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import ToolNode
@@ -19,6 +18,9 @@ from typing_extensions import TypedDict
 from langchain.globals import set_debug
 import langchain
 
+from src.libs.llm import get_chat_model
+from src.libs.llm_cache import get_llm_cache, with_cache
+
 set_debug(True)
 
 MEMORY_KEY = "chat_history"
@@ -430,7 +432,8 @@ class routeResponse(BaseModel):
     next: Literal[*options]
 
 
-def create_supervisor_agnet(llm: BaseChatModel, members: List[str]) -> CompiledStateGraph:
+def create_supervisor_agnet(llm: BaseChatModel, members: List[str], cache=None) -> CompiledStateGraph:
+    """`cache` (e.g. SQLiteLRUCache) is used by the routing prompt, which is deterministic for the same conversation."""
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system_prompt),
@@ -442,7 +445,7 @@ def create_supervisor_agnet(llm: BaseChatModel, members: List[str]) -> CompiledS
         ]
     ).partial(options=str(options), members=", ".join(members))
 
-    supervisor_chain = prompt | llm.with_structured_output(routeResponse)
+    supervisor_chain = prompt | with_cache(llm, cache).with_structured_output(routeResponse)
 
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -520,7 +523,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     langchain.debug = args.verbose
-    llm = ChatOpenAI(
+    llm = get_chat_model(
         temperature=0,
         model=MODEL,
         top_p=0.1,
@@ -532,7 +535,7 @@ if __name__ == "__main__":
     elif args.type == "two":
         agent = get_parts_order_agent(llm)
     elif args.type == "multiturn":
-        agent = create_supervisor_agnet(llm=llm, members=members)
+        agent = create_supervisor_agnet(llm=llm, members=members, cache=get_llm_cache())
 
     # 会話ループ
     user = ""
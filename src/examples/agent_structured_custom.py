@@ -14,9 +14,9 @@ from langchain.agents import (  # create_react_agent,
     create_structured_chat_agent,
 )
 from langchain.agents.agent import AgentOutputParser
-from langchain.agents.format_scratchpad import format_log_to_str
 from langchain.agents.mrkl.prompt import FORMAT_INSTRUCTIONS
 from langchain.memory import ConversationBufferMemory
+from src.libs.scratchpad import IncrementalScratchpad
 from src.libs.tools import TOOL_GOOGLE, multiplier
 
 FINAL_ANSWER_ACTION = "Final Answer:"
@@ -127,9 +127,10 @@ class GoogleSearchOutputParser(AgentOutputParser):
 
 # replace create_react_agent start
 llm_with_stop = llm.bind(stop=["\nObservation"])
+scratchpad_google = IncrementalScratchpad()
 agent_google = (
     RunnablePassthrough.assign(
-        agent_scratchpad=lambda x: format_log_to_str(x["intermediate_steps"]),
+        agent_scratchpad=lambda x: scratchpad_google.format(x["intermediate_steps"]),
     )
     | prompt_google
     | llm_with_stop
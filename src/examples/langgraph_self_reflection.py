@@ -1,11 +1,25 @@
-from typing import List
+import asyncio
+import hashlib
+import threading
+import time
+from collections import Counter
+from concurrent.futures import as_completed
+from typing import Any, Awaitable, Callable, Hashable, Iterable, List, Optional
 
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableParallel
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from langgraph.graph import END, START, StateGraph
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
+from src.libs.dedup import NearDuplicateFilter
+from src.libs.hybrid_search import tokenize
+from src.libs.llm_cache import with_cache
+from src.libs.search import TTLCache, normalize_query
+from src.libs.vector_index import embed
+
 
 retrieve_grader_system = """You are a grader assessing relevance of a retrieved document to a user question. \n
     If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
@@ -55,16 +69,173 @@ class GraphState(TypedDict):
         question: question
         generation: LLM generation
         documents: list of documents
+        generation_attempts: number of generations so far
+        rewrites: number of question rewrites so far
+        deadline: time.monotonic() after which the graph stops retrying
     """
 
     question: str
     generation: str
     documents: List[str]
+    generation_attempts: int
+    rewrites: int
+    deadline: float
+
+
+class GraphMemo:
+    """Memo of question rewrites, retrieval results and relevance verdicts, keyed on the normalized question.
+
+    Share one instance across runs with `create_graph(..., memo=memo)`, or scope it to a single run with
+    `graph.invoke(state, config={"configurable": {"memo": GraphMemo()}})` (the run's memo takes precedence).
+    A question that comes back after a rewrite is neither rewritten, retrieved nor graded again, and documents
+    already graded for a question are never re-graded.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600.0):
+        self.rewrites = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.retrievals = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.verdicts = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def lookup(self, name: str, key: Hashable):
+        """Memoized value of `key` in the `name` cache, or None. Counted in `hits` / `misses`."""
+        value = getattr(self, name).get(key)
+        with self._lock:
+            (self.misses if value is None else self.hits)[name] += 1
+        return value
+
+    def get_or_compute(self, name: str, key: Hashable, compute: Callable[[], object]):
+        value = self.lookup(name, key)
+        if value is None:
+            value = compute()
+            getattr(self, name).set(key, value)
+        return value
+
+    async def aget_or_compute(self, name: str, key: Hashable, compute: Callable[[], Awaitable[object]]):
+        value = self.lookup(name, key)
+        if value is None:
+            value = await compute()
+            getattr(self, name).set(key, value)
+        return value
+
+    @staticmethod
+    def verdict_key(question: str, document: str) -> tuple:
+        return normalize_query(question), hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+class RelevancePrefilter:
+    """Cheap relevance verdicts before the LLM `retrieval_grader`.
+
+    Documents scoring below `reject_below` are graded "no" and, with `accept_above`, those scoring at or above it
+    "yes" without an LLM call; only the rest are sent to the grader. The score is the fraction of the question's
+    terms (see `hybrid_search.tokenize`) found in the document, or the cosine similarity when `embeddings` is given.
+    `counts` has the number of documents "rejected", "accepted" and sent to the grader ("graded").
+    """
 
+    def __init__(self, reject_below: float = 0.1, accept_above: Optional[float] = None, embeddings=None):
+        self.reject_below = reject_below
+        self.accept_above = accept_above
+        self.embeddings = embeddings
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def scores(self, question: str, documents: List[str]) -> List[float]:
+        if self.embeddings is not None:
+            vectors = embed(self.embeddings, [question, *documents])
+            return (vectors[1:] @ vectors[0]).tolist()
+        terms = set(tokenize(question))
+        if not terms:
+            return [1.0] * len(documents)
+        return [len(terms.intersection(tokenize(document))) / len(terms) for document in documents]
+
+    def verdicts(self, question: str, documents: List[str]) -> List[Optional[str]]:
+        """ "yes", "no", or None for the documents the LLM has to grade."""
+        verdicts: List[Optional[str]] = []
+        for score in self.scores(question, documents):
+            if score < self.reject_below:
+                verdicts.append("no")
+            elif self.accept_above is not None and score >= self.accept_above:
+                verdicts.append("yes")
+            else:
+                verdicts.append(None)
+        with self._lock:
+            self.counts["rejected"] += verdicts.count("no")
+            self.counts["accepted"] += verdicts.count("yes")
+            self.counts["graded"] += verdicts.count(None)
+        return verdicts
+
+
+def _memo(config: Optional[RunnableConfig], default: Optional[GraphMemo]) -> Optional[GraphMemo]:
+    return ((config or {}).get("configurable") or {}).get("memo") or default
+
+
+class _RelevanceGrading:
+    """Relevance grading of `documents` for `question`, with the verdicts from the memo and the prefilter filled in."""
+
+    def __init__(self, question, documents, run_memo: Optional[GraphMemo], min_relevant: Optional[int], prefilter: Optional[RelevancePrefilter] = None):
+        self.min_relevant = min_relevant
+        self.run_memo = run_memo
+        self.keys = [GraphMemo.verdict_key(question, d.page_content) for d in documents]
+        self.grades: List[Optional[str]] = [None] * len(documents)
+        if run_memo is not None:
+            self.grades = [run_memo.lookup("verdicts", key) for key in self.keys]
+        if prefilter is not None:
+            unknown = [i for i, grade in enumerate(self.grades) if grade is None]
+            for i, grade in zip(unknown, prefilter.verdicts(question, [documents[i].page_content for i in unknown])):
+                self.grades[i] = grade
+        self.pending = [i for i, grade in enumerate(self.grades) if grade is None]
+        self.inputs = [{"question": question, "document": documents[i].page_content} for i in self.pending]
+
+    def record(self, i: int, grade: str) -> None:
+        self.grades[i] = grade
+        if self.run_memo is not None:
+            self.run_memo.verdicts.set(self.keys[i], grade)
+
+    def done(self) -> bool:
+        """Nothing left to grade, or enough relevant documents for the early stop."""
+        return not self.inputs or self.min_relevant is not None and self.grades.count("yes") >= self.min_relevant
+
+
+def create_graph(
+    chat,
+    retriever,
+    cache=None,
+    grade_concurrency: int = 8,
+    min_relevant: Optional[int] = None,
+    parallel_graders: bool = False,
+    max_generations: Optional[int] = None,
+    max_rewrites: Optional[int] = None,
+    deadline_seconds: Optional[float] = None,
+    memo: Optional[GraphMemo] = None,
+    prefilter: Optional[RelevancePrefilter] = None,
+    dedup: Optional[NearDuplicateFilter] = None,
+):
+    """`cache` (e.g. SQLiteLRUCache) is used by the deterministic graders so repeated gradings are free.
+    `retriever` can be any retriever, e.g. a local `VectorIndexRetriever` (src/libs/vector_index.py) or `HybridRetriever`
+    (src/libs/hybrid_search.py, BM25 + vectors, better for part numbers and codes).
+
+    Retrieved documents are graded concurrently, at most `grade_concurrency` at a time. With `min_relevant`,
+    grading stops as soon as that many relevant documents are found; the others are dropped ungraded.
+
+    `parallel_graders` runs the hallucination and answer graders at the same time (one LLM latency instead of
+    two, at the cost of an answer grading when the generation is not grounded).
+
+    Retries are bounded by `max_generations` (generate calls), `max_rewrites` (transform_query calls) and
+    `deadline_seconds` from the first retrieval. Once a budget is spent, the graph ends with the last generation,
+    or generates from whatever documents it has instead of rewriting the question again.
+
+    `memo` (see GraphMemo) memoizes rewrites, retrievals and relevance verdicts. `prefilter` (see RelevancePrefilter)
+    settles the obvious documents before the LLM grader. `dedup` (see src/libs/dedup.py) collapses near-duplicate
+    retrieved documents, e.g. overlapping chunks, before they are graded and put in the generation prompt.
+
+    Every node also has an async implementation (`ainvoke` / `abatch` down to the model and the retriever), used
+    by `graph.ainvoke` / `graph.astream`, so many questions can be served on one event loop (see `arun_questions`)."""
+    grader_chat = with_cache(chat, cache)
 
-def create_graph(chat, retriever):
     # Retrieval Grader
-    structured_llm_grader = chat.with_structured_output(GradeDocuments)
+    structured_llm_grader = grader_chat.with_structured_output(GradeDocuments)
 
     grade_prompt = ChatPromptTemplate.from_messages(
         [
@@ -80,7 +251,7 @@ def create_graph(chat, retriever):
     rag_chain = generate_prompt | chat | StrOutputParser()
 
     # Hallucination Grader
-    structured_llm_grader = chat.with_structured_output(GradeHallucinations)
+    structured_llm_grader = grader_chat.with_structured_output(GradeHallucinations)
     hallucination_prompt = ChatPromptTemplate.from_messages(
         [
             ("system", hallucination_system),
@@ -90,7 +261,7 @@ def create_graph(chat, retriever):
     hallucination_grader = hallucination_prompt | structured_llm_grader
 
     # Answer Grader
-    structured_llm_grader = chat.with_structured_output(GradeAnswer)
+    structured_llm_grader = grader_chat.with_structured_output(GradeAnswer)
     answer_prompt = ChatPromptTemplate.from_messages(
         [
             ("system", answer_grader_system),
@@ -100,6 +271,9 @@ def create_graph(chat, retriever):
 
     answer_grader = answer_prompt | structured_llm_grader
 
+    # Both generation graders in one step, used with parallel_graders
+    graders = RunnableParallel(hallucination=hallucination_grader, answer=answer_grader)
+
     # Question Re-writer
     re_write_prompt = ChatPromptTemplate.from_messages(
         [
@@ -113,7 +287,7 @@ def create_graph(chat, retriever):
 
     question_rewriter = re_write_prompt | chat | StrOutputParser()
 
-    def retrieve(state):
+    def retrieve(state, config: RunnableConfig):
         """
         Retrieve documents
 
@@ -127,9 +301,31 @@ def create_graph(chat, retriever):
         question = state["question"]
 
         # Retrieval
-        documents = retriever.invoke(question)
+        run_memo = _memo(config, memo)
+        if run_memo is None:
+            documents = retriever.invoke(question)
+        else:
+            documents = run_memo.get_or_compute("retrievals", normalize_query(question), lambda: retriever.invoke(question))
+        return retrieved(state, documents)
+
+    async def aretrieve(state, config: RunnableConfig):
+        print("---RETRIEVE---")
+        question = state["question"]
+        run_memo = _memo(config, memo)
+        if run_memo is None:
+            documents = await retriever.ainvoke(question)
+        else:
+            documents = await run_memo.aget_or_compute("retrievals", normalize_query(question), lambda: retriever.ainvoke(question))
+        return retrieved(state, documents)
+
+    def retrieved(state, documents):
+        if dedup is not None:
+            documents = dedup.collapse(documents)
         print(f"{len(documents)} documents retrieved")
-        return {"documents": documents, "question": question}
+        result = {"documents": documents, "question": state["question"]}
+        if deadline_seconds is not None and "deadline" not in state:
+            result["deadline"] = time.monotonic() + deadline_seconds
+        return result
 
     def generate(state):
         """
@@ -147,9 +343,16 @@ def create_graph(chat, retriever):
 
         # RAG generation
         generation = rag_chain.invoke({"context": documents, "question": question})
-        return {"documents": documents, "question": question, "generation": generation}
+        return {"documents": documents, "question": question, "generation": generation, "generation_attempts": state.get("generation_attempts", 0) + 1}
 
-    def grade_documents(state):
+    async def agenerate(state):
+        print("---GENERATE---")
+        question = state["question"]
+        documents = state["documents"]
+        generation = await rag_chain.ainvoke({"context": documents, "question": question})
+        return {"documents": documents, "question": question, "generation": generation, "generation_attempts": state.get("generation_attempts", 0) + 1}
+
+    def grade_documents(state, config: RunnableConfig):
         """
         Determines whether the retrieved documents are relevant to the question.
 
@@ -164,20 +367,83 @@ def create_graph(chat, retriever):
         question = state["question"]
         documents = state["documents"]
 
-        # Score each doc
+        # Score the docs concurrently, keeping their order
+        grades = grade_relevance(question, documents, _memo(config, memo))
+        return filter_documents(state, grades)
+
+    async def agrade_documents(state, config: RunnableConfig):
+        print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+        grades = await agrade_relevance(state["question"], state["documents"], _memo(config, memo))
+        return filter_documents(state, grades)
+
+    def filter_documents(state, grades: List[Optional[str]]):
+        question = state["question"]
+        documents = state["documents"]
         filtered_docs = []
-        for d in documents:
-            score = retrieval_grader.invoke({"question": question, "document": d.page_content})
-            grade = score.binary_score
+        for d, grade in zip(documents, grades):
             if grade == "yes":
                 print("---GRADE: DOCUMENT RELEVANT---")
                 filtered_docs.append(d)
+            elif grade is None:
+                print("---GRADE: DOCUMENT NOT GRADED (ENOUGH RELEVANT DOCUMENTS)---")
             else:
                 print("---GRADE: DOCUMENT NOT RELEVANT---")
         print(f"filtered documents ({len(documents)} -> {len(filtered_docs)})")
         return {"documents": filtered_docs, "question": question}
 
-    def transform_query(state):
+    def grade_relevance(question, documents, run_memo: Optional[GraphMemo] = None) -> List[Optional[str]]:
+        """binary_score of every document, in order. None for documents skipped by the early stop."""
+        grading = _RelevanceGrading(question, documents, run_memo, min_relevant, prefilter)
+        if grading.done():
+            return grading.grades
+        if min_relevant is None:
+            scores = retrieval_grader.batch(grading.inputs, config={"max_concurrency": grade_concurrency})
+            for i, score in zip(grading.pending, scores):
+                grading.record(i, score.binary_score)
+            return grading.grades
+
+        executor = ContextThreadPoolExecutor(max_workers=grade_concurrency)
+        try:
+            futures = {executor.submit(retrieval_grader.invoke, x): i for i, x in zip(grading.pending, grading.inputs)}
+            for future in as_completed(futures):
+                grading.record(futures[future], future.result().binary_score)
+                if grading.done():
+                    break
+        finally:
+            # do not wait for the gradings still running
+            executor.shutdown(wait=False, cancel_futures=True)
+        return grading.grades
+
+    async def agrade_relevance(question, documents, run_memo: Optional[GraphMemo] = None) -> List[Optional[str]]:
+        grading = _RelevanceGrading(question, documents, run_memo, min_relevant, prefilter)
+        if grading.done():
+            return grading.grades
+        if min_relevant is None:
+            scores = await retrieval_grader.abatch(grading.inputs, config={"max_concurrency": grade_concurrency})
+            for i, score in zip(grading.pending, scores):
+                grading.record(i, score.binary_score)
+            return grading.grades
+
+        semaphore = asyncio.Semaphore(grade_concurrency)
+
+        async def grade(i, x):
+            async with semaphore:
+                return i, await retrieval_grader.ainvoke(x)
+
+        tasks = [asyncio.ensure_future(grade(i, x)) for i, x in zip(grading.pending, grading.inputs)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                i, score = await task
+                grading.record(i, score.binary_score)
+                if grading.done():
+                    break
+        finally:
+            # the gradings still running are cancelled
+            for task in tasks:
+                task.cancel()
+        return grading.grades
+
+    def transform_query(state, config: RunnableConfig):
         """
         Transform the query to produce a better question.
 
@@ -193,11 +459,34 @@ def create_graph(chat, retriever):
         documents = state["documents"]
 
         # Re-write question
-        better_question = question_rewriter.invoke({"question": question})
-        return {"documents": documents, "question": better_question}
+        run_memo = _memo(config, memo)
+        if run_memo is None:
+            better_question = question_rewriter.invoke({"question": question})
+        else:
+            better_question = run_memo.get_or_compute("rewrites", normalize_query(question), lambda: question_rewriter.invoke({"question": question}))
+        return {"documents": documents, "question": better_question, "rewrites": state.get("rewrites", 0) + 1}
+
+    async def atransform_query(state, config: RunnableConfig):
+        print("---TRANSFORM QUERY---")
+        question = state["question"]
+        run_memo = _memo(config, memo)
+        if run_memo is None:
+            better_question = await question_rewriter.ainvoke({"question": question})
+        else:
+            better_question = await run_memo.aget_or_compute("rewrites", normalize_query(question), lambda: question_rewriter.ainvoke({"question": question}))
+        return {"documents": state["documents"], "question": better_question, "rewrites": state.get("rewrites", 0) + 1}
 
     ### Edges ###
 
+    def out_of_budget(state, counter: str, limit: Optional[int]) -> bool:
+        if limit is not None and state.get(counter, 0) >= limit:
+            print(f"---BUDGET: {counter} LIMIT ({limit}) REACHED---")
+            return True
+        if "deadline" in state and time.monotonic() >= state["deadline"]:
+            print("---BUDGET: DEADLINE REACHED---")
+            return True
+        return False
+
     def decide_to_generate(state):
         """
         Determines whether to generate an answer, or re-generate a question.
@@ -213,7 +502,11 @@ def create_graph(chat, retriever):
         state["question"]
         filtered_documents = state["documents"]
 
-        if not filtered_documents:
+        if not filtered_documents and out_of_budget(state, "rewrites", max_rewrites):
+            # no more rewrites: answer from what we have, the prompt allows "I don't know"
+            print("---DECISION: NO RELEVANT DOCUMENTS, GENERATE ANYWAY---")
+            return "generate"
+        elif not filtered_documents:
             # All documents have been filtered check_relevance
             # We will re-generate a new query
             print("---DECISION: ALL DOCUMENTS ARE NOT RELEVANT TO QUESTION, TRANSFORM QUERY---")
@@ -239,22 +532,47 @@ def create_graph(chat, retriever):
         documents = state["documents"]
         generation = state["generation"]
 
-        score = hallucination_grader.invoke({"documents": documents, "generation": generation})
-        grade = score.binary_score
+        if parallel_graders:
+            scores = graders.invoke({"documents": documents, "question": question, "generation": generation})
+            grounded, answered = scores["hallucination"].binary_score, scores["answer"].binary_score
+        else:
+            grounded = hallucination_grader.invoke({"documents": documents, "generation": generation}).binary_score
+            answered = None
+        if grounded == "yes" and answered is None:
+            answered = answer_grader.invoke({"question": question, "generation": generation}).binary_score
+        return decide_on_generation(state, grounded, answered)
 
+    async def agrade_generation_v_documents_and_question(state):
+        print("---CHECK HALLUCINATIONS---")
+        question = state["question"]
+        generation = state["generation"]
+
+        if parallel_graders:
+            scores = await graders.ainvoke({"documents": state["documents"], "question": question, "generation": generation})
+            grounded, answered = scores["hallucination"].binary_score, scores["answer"].binary_score
+        else:
+            grounded = (await hallucination_grader.ainvoke({"documents": state["documents"], "generation": generation})).binary_score
+            answered = None
+        if grounded == "yes" and answered is None:
+            answered = (await answer_grader.ainvoke({"question": question, "generation": generation})).binary_score
+        return decide_on_generation(state, grounded, answered)
+
+    def decide_on_generation(state, grounded: str, answered: Optional[str]) -> str:
         # Check hallucination
-        if grade == "yes":
+        if grounded == "yes":
             print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
             # Check question-answering
             print("---GRADE GENERATION vs QUESTION---")
-            score = answer_grader.invoke({"question": question, "generation": generation})
-            grade = score.binary_score
-            if grade == "yes":
+            if answered == "yes":
                 print("---DECISION: GENERATION ADDRESSES QUESTION---")
                 return "useful"
+            elif out_of_budget(state, "rewrites", max_rewrites):
+                return "stop"
             else:
                 print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
                 return "not useful"
+        elif out_of_budget(state, "generation_attempts", max_generations):
+            return "stop"
         else:
             print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
             return "not supported"
@@ -262,10 +580,11 @@ def create_graph(chat, retriever):
     workflow = StateGraph(GraphState)
 
     # Define the nodes
-    workflow.add_node("retrieve", retrieve)  # retrieve
-    workflow.add_node("grade_documents", grade_documents)  # grade documents
-    workflow.add_node("generate", generate)  # generatae
-    workflow.add_node("transform_query", transform_query)  # transform_query
+    # sync implementation for invoke / stream, async one for ainvoke / astream
+    workflow.add_node("retrieve", RunnableLambda(retrieve, afunc=aretrieve, name="retrieve"))  # retrieve
+    workflow.add_node("grade_documents", RunnableLambda(grade_documents, afunc=agrade_documents, name="grade_documents"))  # grade documents
+    workflow.add_node("generate", RunnableLambda(generate, afunc=agenerate, name="generate"))  # generatae
+    workflow.add_node("transform_query", RunnableLambda(transform_query, afunc=atransform_query, name="transform_query"))  # transform_query
 
     # Build graph
     workflow.add_edge(START, "retrieve")
@@ -281,11 +600,12 @@ def create_graph(chat, retriever):
     workflow.add_edge("transform_query", "retrieve")
     workflow.add_conditional_edges(
         "generate",
-        grade_generation_v_documents_and_question,
+        RunnableLambda(grade_generation_v_documents_and_question, afunc=agrade_generation_v_documents_and_question),
         {
             "not supported": "generate",
             "useful": END,
             "not useful": "transform_query",
+            "stop": END,  # retry budget or deadline exhausted
         },
     )
 
@@ -293,3 +613,23 @@ def create_graph(chat, retriever):
     app = workflow.compile()
 
     return app
+
+
+async def arun_questions(graph, questions: Iterable[str], max_concurrency: int = 64, config: Optional[RunnableConfig] = None, return_exceptions: bool = False) -> List[Any]:
+    """Final states of `graph.ainvoke` for every question, in order, with at most `max_concurrency` runs in flight.
+
+    All runs share the event loop: an in-flight question costs a task, not a thread. With `return_exceptions`,
+    a failed run gives its exception instead of cancelling the others.
+
+    ```
+    graph = create_graph(chat, retriever)
+    states = asyncio.run(arun_questions(graph, questions, max_concurrency=200))
+    ```
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(question: str):
+        async with semaphore:
+            return await graph.ainvoke({"question": question}, config=config)
+
+    return await asyncio.gather(*(run(question) for question in questions), return_exceptions=return_exceptions)
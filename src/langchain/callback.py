@@ -1,9 +1,16 @@
-from typing import Any, Dict, List, Optional
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import IO, Any, Deque, Dict, List, Optional, Sequence, Tuple
 from uuid import UUID
 
 from langchain_openai import ChatOpenAI
 from langchain_core.callbacks import BaseCallbackHandler, StdOutCallbackHandler
 from langchain_core.messages import HumanMessage
+from langchain_core.outputs import LLMResult
 
 
 class MyCustomHandler(BaseCallbackHandler):
@@ -41,6 +48,325 @@ class PromptStdoutHandler(StdOutCallbackHandler):
             print(f"\n\n\033[1m> {i}. Prompt:\n{prompt}\n-----\n\033[0m")  # noqa: #231
 
 
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+@dataclass
+class RunRecord:
+    """Timing of one LLM, chat model, tool, retriever or chain run.
+
+    `self_seconds` is the latency not spent in child runs, e.g. graph or agent overhead for a chain.
+    """
+
+    run_id: str
+    parent_run_id: Optional[str]
+    kind: str
+    name: str
+    start: float
+    end: Optional[float] = None
+    first_token: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    streamed_tokens: int = 0
+    children_seconds: float = 0.0
+    error: Optional[str] = None
+    children: List[str] = field(default_factory=list)
+
+    @property
+    def latency(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def self_seconds(self) -> Optional[float]:
+        return None if self.end is None else max(self.latency - self.children_seconds, 0.0)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        tokens = self.completion_tokens or self.streamed_tokens
+        if self.end is None or not tokens:
+            return None
+        # generation speed: measured from the first token when streaming
+        elapsed = self.end - (self.first_token if self.first_token is not None else self.start)
+        return tokens / elapsed if elapsed > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update(
+            latency=self.latency,
+            time_to_first_token=self.time_to_first_token,
+            self_seconds=self.self_seconds,
+            tokens_per_second=self.tokens_per_second,
+        )
+        return data
+
+
+class Histogram:
+    """Cumulative Prometheus style histogram."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, result = 0, []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _quantile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class ProfilingCallbackHandler(BaseCallbackHandler):
+    """Records latency, time to first token, token usage and the run tree of every LLM, tool and chain run.
+
+    Finished runs are kept in a ring buffer of `maxlen` records (`records`, `summary()`, `export_jsonl()`),
+    while histograms and token counters are cumulative for `to_prometheus()`. At most `max_active` runs are
+    tracked while in progress: runs whose end never comes (e.g. a cancelled task) are dropped oldest first and
+    counted in `dropped`.
+
+    ```
+    profiler = ProfilingCallbackHandler()
+    graph.invoke(inputs, config={"callbacks": [profiler]})
+    print(profiler.summary())
+    ```
+    """
+
+    def __init__(self, maxlen: int = 10_000, latency_buckets: Sequence[float] = LATENCY_BUCKETS, timer=time.perf_counter, max_active: int = 10_000):
+        self.records: Deque[RunRecord] = deque(maxlen=maxlen)
+        self.max_active = max_active
+        self.dropped = 0
+        self.latency_buckets = latency_buckets
+        self.timer = timer
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.time_to_first_token: Dict[Tuple[str, str], Histogram] = {}
+        self.tokens_per_second: Dict[Tuple[str, str], Histogram] = {}
+        self.tokens: Dict[Tuple[str, str, str], int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self._active: Dict[UUID, RunRecord] = {}
+        self._lock = threading.Lock()
+
+    # start / end bookkeeping
+
+    def _start(self, kind: str, serialized: Optional[Dict[str, Any]], run_id: UUID, parent_run_id: Optional[UUID], kwargs) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or ((serialized or {}).get("id") or [kind])[-1]
+        record = RunRecord(
+            run_id=str(run_id),
+            parent_run_id=str(parent_run_id) if parent_run_id else None,
+            kind=kind,
+            name=name,
+            start=self.timer(),
+        )
+        with self._lock:
+            self._active[run_id] = record
+            while len(self._active) > self.max_active:
+                # insertion order is start order
+                del self._active[next(iter(self._active))]
+                self.dropped += 1
+            parent = self._active.get(parent_run_id)
+            if parent is not None:
+                parent.children.append(record.run_id)
+
+    def _end(self, run_id: UUID, parent_run_id: Optional[UUID], error: Optional[BaseException] = None) -> Optional[RunRecord]:
+        end = self.timer()
+        with self._lock:
+            record = self._active.pop(run_id, None)
+            if record is None:
+                return None
+            record.end = end
+            if error is not None:
+                record.error = repr(error)
+                key = (record.kind, record.name)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            parent = self._active.get(parent_run_id)
+            if parent is not None:
+                parent.children_seconds += record.latency
+            self._observe(record)
+            self.records.append(record)
+        return record
+
+    def _observe(self, record: RunRecord) -> None:
+        key = (record.kind, record.name)
+        self._histogram(self.latency, key, self.latency_buckets).observe(record.latency)
+        if record.time_to_first_token is not None:
+            self._histogram(self.time_to_first_token, key, self.latency_buckets).observe(record.time_to_first_token)
+        if record.tokens_per_second is not None:
+            self._histogram(self.tokens_per_second, key, TOKENS_PER_SECOND_BUCKETS).observe(record.tokens_per_second)
+        for token_type, count in (("prompt", record.prompt_tokens), ("completion", record.completion_tokens)):
+            if count:
+                self.tokens[(*key, token_type)] = self.tokens.get((*key, token_type), 0) + count
+
+    @staticmethod
+    def _histogram(histograms: Dict[Tuple[str, str], Histogram], key: Tuple[str, str], buckets: Sequence[float]) -> Histogram:
+        if key not in histograms:
+            histograms[key] = Histogram(buckets)
+        return histograms[key]
+
+    # callbacks
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("llm", serialized, run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("chat_model", serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_new_token(self, token: str, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        record = self._active.get(run_id)
+        if record is None:
+            return
+        if record.first_token is None and token:
+            record.first_token = self.timer()
+        record.streamed_tokens += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        record = self._active.get(run_id)
+        if record is not None:
+            record.prompt_tokens, record.completion_tokens = _token_usage(response)
+        self._end(run_id, parent_run_id)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("tool", serialized, run_id, parent_run_id, kwargs)
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("retriever", serialized, run_id, parent_run_id, kwargs)
+
+    def on_retriever_end(self, documents, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id)
+
+    def on_retriever_error(self, error, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id, error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("chain", serialized, run_id, parent_run_id, kwargs)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._end(run_id, parent_run_id, error)
+
+    # reports
+
+    def tree(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Nested timings of `run_id` and its children, None when the run aged out of the ring buffer.
+
+        Runs still in progress are included with a `latency` and `self_seconds` of None.
+        """
+        with self._lock:
+            by_id = {r.run_id: r for r in self.records}
+            by_id.update((r.run_id, r) for r in self._active.values())
+        if str(run_id) not in by_id:
+            return None
+
+        def node(record: RunRecord) -> Dict[str, Any]:
+            return {
+                "name": record.name,
+                "kind": record.kind,
+                "latency": record.latency,
+                "self_seconds": record.self_seconds,
+                "children": [node(by_id[c]) for c in list(record.children) if c in by_id],
+            }
+
+        return node(by_id[str(run_id)])
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per `kind:name` count, mean and p50/p90/p99 latency of the records in the ring buffer."""
+        with self._lock:
+            latencies: Dict[str, List[float]] = {}
+            for record in self.records:
+                latencies.setdefault(f"{record.kind}:{record.name}", []).append(record.latency)
+        return {
+            key: {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": _quantile(values, 0.5),
+                "p90": _quantile(values, 0.9),
+                "p99": _quantile(values, 0.99),
+            }
+            for key, values in sorted(latencies.items())
+        }
+
+    def to_prometheus(self, prefix: str = "langchain") -> str:
+        lines: List[str] = []
+        with self._lock:
+            for metric, histograms, help_text in (
+                ("run_latency_seconds", self.latency, "Latency of LLM, tool, retriever and chain runs."),
+                ("time_to_first_token_seconds", self.time_to_first_token, "Time to the first streamed token."),
+                ("tokens_per_second", self.tokens_per_second, "Completion tokens generated per second."),
+            ):
+                if not histograms:
+                    continue
+                name = f"{prefix}_{metric}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (kind, run_name), histogram in sorted(histograms.items()):
+                    labels = f'kind="{kind}",name="{_escape(run_name)}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+            if self.tokens:
+                name = f"{prefix}_tokens_total"
+                lines += [f"# HELP {name} Prompt and completion tokens reported by the model.", f"# TYPE {name} counter"]
+                for (kind, run_name, token_type), count in sorted(self.tokens.items()):
+                    lines.append(f'{name}{{kind="{kind}",name="{_escape(run_name)}",type="{token_type}"}} {count}')
+            if self.errors:
+                name = f"{prefix}_run_errors_total"
+                lines += [f"# HELP {name} Runs that raised an error.", f"# TYPE {name} counter"]
+                for (kind, run_name), count in sorted(self.errors.items()):
+                    lines.append(f'{name}{{kind="{kind}",name="{_escape(run_name)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def export_jsonl(self, file: IO[str]) -> int:
+        """Write the records in the ring buffer to `file`, one JSON object per line. Returns the number written."""
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            file.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+        return len(records)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    """(prompt, completion) tokens from `llm_output` (OpenAI) or the messages' `usage_metadata`."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
 def main():
     # To enable streaming, we pass in `streaming=True` to the ChatModel constructor
     # Additionally, we pass in a list with our custom handler
@@ -1,16 +1,30 @@
-import re
-from typing import Any, Sequence, Union
+from typing import Any, Optional, Sequence
 
 # from langchain.agents.react.output_parser import ReActOutputParser
 from langchain_openai import OpenAI
 
 from langchain.agents import AgentExecutor
-from langchain.agents.agent import Agent, AgentOutputParser
-from langchain_core.agents import AgentAction, AgentFinish
-from langchain_core.exceptions import OutputParserException
-from langchain_core.prompts import BasePromptTemplate, PromptTemplate
+from langchain.agents.agent import AgentOutputParser
+from langchain.chains import LLMChain
+from langchain_core.example_selectors import BaseExampleSelector
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.prompts import BasePromptTemplate, FewShotPromptTemplate, PromptTemplate
 from langchain_core.tools import BaseTool, Tool
 
+from src.langchain.react_parser import (  # noqa: F401 (ReActOutputParser is still importable from here)
+    WORD_ACTION,
+    WORD_FINISH,
+    WORD_OBSERVATION,
+    WORD_QUESTION,
+    WORD_THOUGHT,
+    ReActOutputParser,
+    StreamingReActAgent,
+)
+from src.libs.arithmetic import BATCH_ARITHMETIC_DESCRIPTION, batch_arithmetic
+from src.libs.example_selector import IndexedExampleSelector, examples_from_texts
+from src.libs.tool_cache import ToolCache, memoize_tools
+from src.libs.vector_index import HashingEmbeddings
+
 ##########
 # define tools
 ##########
@@ -58,18 +72,19 @@ tools = [
         func=total,
         description="Get total.",
     ),
+    Tool(
+        name="BatchArithmetic",
+        func=batch_arithmetic,
+        description=BATCH_ARITHMETIC_DESCRIPTION,
+    ),
 ]
 
+# the tools are pure: their results are shared by every run of the process
+tool_cache = ToolCache()
+
 ##########
 # define agent
 ##########
-WORD_QUESTION = "質問"  # Question
-WORD_THOUGHT = "思考"  # Thought
-WORD_ACTION = "行動"  # Action
-WORD_OBSERVATION = "観察"  # Observation
-WORD_FINISH = "完了"  # Finish
-
-
 EXAMPLES = [
     f"""{WORD_QUESTION}: How much is the difference between the invoice of company A and company B ?
 {WORD_THOUGHT}: I need to get invoice amount of company A.
@@ -116,6 +131,25 @@ Observation 1: 1500
 {WORD_OBSERVATION}: 11300
 {WORD_THOUGHT}: So the answer is 11300.
 {WORD_ACTION}: {WORD_FINISH}[11300]""",
+    f"""{WORD_QUESTION}: How much are the total invoice amount of company A, B and the difference between company C and D ?
+{WORD_THOUGHT}: I need to get invoice amount of company A.
+{WORD_ACTION}: GetInvoice[A]
+{WORD_OBSERVATION}: 2000
+{WORD_THOUGHT}: I need to get invoice amount of company B.
+{WORD_ACTION}: GetInvoice[B]
+{WORD_OBSERVATION}: 1500
+{WORD_THOUGHT}: I need to get invoice amount of company C.
+{WORD_ACTION}: GetInvoice[C]
+{WORD_OBSERVATION}: 20000
+{WORD_THOUGHT}: I need to get invoice amount of company D.
+{WORD_ACTION}: GetInvoice[D]
+{WORD_OBSERVATION}: 6700
+{WORD_THOUGHT}: I need both the total of A, B and the difference of C, D, so I calculate them at once.
+{WORD_ACTION}: BatchArithmetic[Total[2000 1500]; Diff[20000 6700]]
+{WORD_OBSERVATION}: Total[2000 1500] = 3500
+Diff[20000 6700] = 13300
+{WORD_THOUGHT}: So the answer is 3500 and 13300.
+{WORD_ACTION}: {WORD_FINISH}[3500 and 13300]""",
 ]
 
 SUFFIX = """\n{word_question}: {input}
@@ -125,59 +159,96 @@ prompt = PromptTemplate.from_examples(EXAMPLES, SUFFIX, ["word_question", "input
 TEST_PROMPT = prompt.partial(word_question=WORD_QUESTION)
 
 
-class ReActOutputParser(AgentOutputParser):
-    def parse(self, text: str) -> Union[AgentAction, AgentFinish]:
-        action_prefix = f"{WORD_ACTION}: "
-        if not text.strip().split("\n")[-1].startswith(action_prefix):
-            raise OutputParserException(f"Could not parse LLM Output: {text}")
-        action_block = text.strip().split("\n")[-1]
+def create_selected_prompt(example_selector: BaseExampleSelector) -> BasePromptTemplate:
+    """TEST_PROMPT with the examples chosen per question by `example_selector` instead of all EXAMPLES."""
+    return FewShotPromptTemplate(
+        example_selector=example_selector,
+        example_prompt=PromptTemplate.from_template("{example}"),
+        suffix=SUFFIX,
+        input_variables=["input", "agent_scratchpad"],
+        partial_variables={"word_question": WORD_QUESTION},
+    )
+
 
-        action_str = action_block[len(action_prefix) :]
+def default_example_selector(k: int = 1, max_tokens: int = 2000) -> IndexedExampleSelector:
+    return IndexedExampleSelector.from_examples(examples_from_texts(EXAMPLES), HashingEmbeddings(), k=k, max_tokens=max_tokens)
 
-        re_matches = re.search(r"(.*?)\[(.*?)\]", action_str)
-        if re_matches is None:
-            raise OutputParserException(f"Could not parse action directive: {action_str}")
-        action, action_input = re_matches.group(1), re_matches.group(2)
 
-        # 最後が行動: Finishであれば処理を終わらせる
-        if action == WORD_FINISH:
-            return AgentFinish({"output": action_input}, text)
-        else:
-            return AgentAction(action, action_input, text)
+# independent actions of one step on consecutive lines, their observations come back in the same order
+PARALLEL_EXAMPLES = [
+    f"""{WORD_QUESTION}: How much is the total invoice amount of company B, C, and D ?
+{WORD_THOUGHT}: I need to get invoice amounts of company B, C and D. They do not depend on each other.
+{WORD_ACTION}: GetInvoice[B]
+{WORD_ACTION}: GetInvoice[C]
+{WORD_ACTION}: GetInvoice[D]
+{WORD_OBSERVATION}: 1500
+{WORD_OBSERVATION}: 20000
+{WORD_OBSERVATION}: 6700
+{WORD_THOUGHT}: I need to get total amount of obtained amount B, C, and D.
+{WORD_ACTION}: Total[1500 20000 6700]
+{WORD_OBSERVATION}: 28200
+{WORD_THOUGHT}: So the answer is 28200.
+{WORD_ACTION}: {WORD_FINISH}[28200]""",
+    f"""{WORD_QUESTION}: How much is the difference between the invoice of company A and company B ?
+{WORD_THOUGHT}: I need to get invoice amounts of company A and B. They do not depend on each other.
+{WORD_ACTION}: GetInvoice[A]
+{WORD_ACTION}: GetInvoice[B]
+{WORD_OBSERVATION}: 2000
+{WORD_OBSERVATION}: 1500
+{WORD_THOUGHT}: I need to get difference of obtained amount between company A and company B.
+{WORD_ACTION}: Diff[2000 1500]
+{WORD_OBSERVATION}: 500
+{WORD_THOUGHT}: So the answer is 500.
+{WORD_ACTION}: {WORD_FINISH}[500]""",
+]
+
+PARALLEL_PROMPT = PromptTemplate.from_examples(PARALLEL_EXAMPLES, SUFFIX, ["word_question", "input", "agent_scratchpad"]).partial(word_question=WORD_QUESTION)
 
 
-class ReActTestAgent(Agent):
+class ReActTestAgent(StreamingReActAgent):
     @classmethod
     def create_prompt(cls, tools: Sequence[BaseTool]) -> BasePromptTemplate:
         return TEST_PROMPT
 
     @classmethod
     def _validate_tools(cls, tools: Sequence[BaseTool]) -> None:
-        if len(tools) != 3:
+        if len(tools) != 4:
             raise ValueError("The number of tools is invalid.")
         tool_names = {tool.name for tool in tools}
-        if tool_names != {"GetInvoice", "Diff", "Total"}:
+        if tool_names != {"GetInvoice", "Diff", "Total", "BatchArithmetic"}:
             raise ValueError("The name of tools is invalid.")
 
     @property
     def _agent_type(self) -> str:
         return "react-test"
 
-    @property
-    def finish_tool_name(self) -> str:
-        return WORD_FINISH
 
-    @property
-    def observation_prefix(self) -> str:
-        return f"{WORD_OBSERVATION}: "
+class ParallelReActTestAgent(ReActTestAgent):
+    """ReActTestAgent that may emit several independent actions in one step, run them with ParallelAgentExecutor."""
+
+    @classmethod
+    def create_prompt(cls, tools: Sequence[BaseTool]) -> BasePromptTemplate:
+        return PARALLEL_PROMPT
 
     @property
-    def llm_prefix(self) -> str:
-        return f"{WORD_THOUGHT}: "
+    def _agent_type(self) -> str:
+        return "react-test-parallel"
 
     @classmethod
     def _get_default_output_parser(cls, **kwargs: Any) -> AgentOutputParser:
-        return ReActOutputParser()
+        return ReActOutputParser(multiple_actions=True)
+
+
+def create_agent(llm: BaseLanguageModel, tools: Sequence[BaseTool], example_selector: Optional[BaseExampleSelector] = None) -> ReActTestAgent:
+    """ReActTestAgent, prompted with the examples picked by `example_selector` when given."""
+    if example_selector is None:
+        return ReActTestAgent.from_llm_and_tools(llm, tools)
+    ReActTestAgent._validate_tools(tools)
+    return ReActTestAgent(
+        llm_chain=LLMChain(llm=llm, prompt=create_selected_prompt(example_selector)),
+        allowed_tools=[tool.name for tool in tools],
+        output_parser=ReActOutputParser(),
+    )
 
 
 def main():
@@ -186,13 +257,11 @@ def main():
     ##########
 
     llm = OpenAI()
-    agent = ReActTestAgent.from_llm_and_tools(
-        llm,
-        tools,
-    )
+    cached_tools = memoize_tools(tools, tool_cache)
+    agent = create_agent(llm, cached_tools, default_example_selector())
     agent_executor = AgentExecutor.from_agent_and_tools(
         agent=agent,
-        tools=tools,
+        tools=cached_tools,
         verbose=True,
     )
 
@@ -1,15 +1,23 @@
 # import wikipedia
-
+import os
+from pathlib import Path
 
 from langchain.agents import AgentExecutor, AgentType, initialize_agent
 from langchain.agents.react.base import DocstoreExplorer
-from langchain_community.docstore import Wikipedia
 from langchain_core.tools import Tool
 from langchain_openai import OpenAI
 
+from src.libs.offline_docstore import OfflineWikipedia
+
+ROOT = Path(__file__).resolve().parents[2]
+# a Wikipedia-style JSONL dump, indexed once into WIKIPEDIA_INDEX
+WIKIPEDIA_DUMP = os.getenv("WIKIPEDIA_DUMP", str(ROOT / "data" / "wikipedia_sample.jsonl"))
+WIKIPEDIA_INDEX = os.getenv("WIKIPEDIA_INDEX", str(ROOT / ".cache" / "wikipedia_index"))
+
 # wikipedia.set_lang("ja")
 # build tools
-docstore = DocstoreExplorer(Wikipedia())
+# docstore = DocstoreExplorer(Wikipedia())  # live search, one request per Search
+docstore = DocstoreExplorer(OfflineWikipedia.open(WIKIPEDIA_INDEX, WIKIPEDIA_DUMP))
 tools = [
     Tool(
         name="Search",
@@ -0,0 +1,230 @@
+import re
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple, Union
+
+from langchain.agents.agent import Agent, AgentOutputParser
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.callbacks import Callbacks
+from langchain_core.exceptions import OutputParserException
+from pydantic import PrivateAttr
+
+from src.libs.scratchpad import IncrementalScratchpad, ObservationCompaction
+
+WORD_QUESTION = "質問"  # Question
+WORD_THOUGHT = "思考"  # Thought
+WORD_ACTION = "行動"  # Action
+WORD_OBSERVATION = "観察"  # Observation
+WORD_FINISH = "完了"  # Finish
+
+# the input runs to the last `]` of the line: `BatchArithmetic[Total[1 2]; Diff[3 4]]`
+_DIRECTIVE = re.compile(r"(.*?)\[(.*)\]")
+
+
+def _result(action_str: str, log: str) -> Union[AgentAction, AgentFinish]:
+    re_matches = _DIRECTIVE.search(action_str)
+    if re_matches is None:
+        raise OutputParserException(f"Could not parse action directive: {action_str}")
+    action, action_input = re_matches.group(1), re_matches.group(2)
+
+    # 最後が行動: Finishであれば処理を終わらせる
+    if action == WORD_FINISH:
+        return AgentFinish({"output": action_input}, log)
+    else:
+        return AgentAction(action, action_input, log)
+
+
+def _results(lines: List[str], log: str) -> Union[AgentAction, AgentFinish, List[AgentAction]]:
+    results = [_result(line[len(WORD_ACTION) + 2 :], log) for line in lines]
+    if len(results) == 1:
+        return results[0]
+    if any(isinstance(result, AgentFinish) for result in results):
+        raise OutputParserException(f"{WORD_FINISH} cannot be combined with other actions: {log}")
+    return results
+
+
+class ReActOutputParser(AgentOutputParser):
+    """`行動: Tool[input]` on the last line of the completion, `行動: 完了[answer]` to finish.
+
+    With `multiple_actions`, every `行動:` line at the end of the completion is an action (independent actions the
+    executor can run concurrently) and a list of actions is returned when there are several.
+    """
+
+    multiple_actions: bool = False
+
+    def parse(self, text: str) -> Union[AgentAction, AgentFinish, List[AgentAction]]:
+        action_prefix = f"{WORD_ACTION}: "
+        lines = text.strip().split("\n") if self.multiple_actions else [text.strip().rpartition("\n")[2]]
+        actions = []
+        for line in reversed(lines):
+            if not line.startswith(action_prefix):
+                break
+            actions.append(line)
+        if not actions:
+            raise OutputParserException(f"Could not parse LLM Output: {text}")
+        return _results(actions[::-1], text)
+
+    @property
+    def _type(self) -> str:
+        return "react-custom"
+
+
+class StreamingReActParser:
+    """Incremental `行動: Tool[input]` detection over a stream of tokens.
+
+    `feed` returns the action as soon as the `]` closing the input of an action line arrives, so the caller can stop the
+    generation there instead of paying for the rest (typically a hallucinated `観察:`). Each token is scanned once.
+    The log of the result is the text up to the `]`.
+
+    With `multiple_actions`, the result is known once the line after an action is not another action.
+
+    ```
+    parser = StreamingReActParser()
+    for chunk in llm.stream(prompt):
+        if (result := parser.feed(chunk)) is not None:
+            break
+    ```
+    """
+
+    def __init__(self, multiple_actions: bool = False):
+        self.multiple_actions = multiple_actions
+        self.text = ""
+        self.result: Optional[Union[AgentAction, AgentFinish, List[AgentAction]]] = None
+        self._actions: List[str] = []
+        self._scanned = 0
+        self._end = 0  # end of the last action line
+        self._prefix = f"{WORD_ACTION}: "
+
+    def feed(self, token: str) -> Optional[Union[AgentAction, AgentFinish, List[AgentAction]]]:
+        if self.result is not None:
+            return self.result
+        self.text += token
+        while True:
+            if self._actions and self._next_line_is_not_an_action():
+                return self._done()
+            end = self.text.find("]", self._scanned)
+            if end < 0:
+                self._scanned = len(self.text)
+                return None
+            self._scanned = end + 1
+            line = self.text[self.text.rfind("\n", 0, end) + 1 : end + 1].strip()
+            if line.startswith(self._prefix) and "[" in line and line.count("[") == line.count("]"):
+                self._actions.append(line)
+                self._end = self._scanned
+                if not self.multiple_actions or line.startswith(f"{self._prefix}{WORD_FINISH}["):
+                    return self._done()
+
+    def _next_line_is_not_an_action(self) -> bool:
+        rest = self.text[self._end :]
+        newline = rest.find("\n")
+        if newline < 0:
+            # still on the action line (e.g. trailing spaces)
+            return bool(rest.strip())
+        line = rest[newline + 1 :].lstrip()
+        if len(line) < len(self._prefix):
+            return not self._prefix.startswith(line) or "\n" in line
+        return not line.startswith(self._prefix)
+
+    def _done(self):
+        self.text = self.text[: self._end]
+        self.result = _results(self._actions, self.text)
+        return self.result
+
+    def finish(self) -> Union[AgentAction, AgentFinish, List[AgentAction]]:
+        """Result once the stream ended: the detected actions, or `ReActOutputParser.parse` of the whole text."""
+        if self.result is not None:
+            return self.result
+        if self._actions:
+            return self._done()
+        return ReActOutputParser(multiple_actions=self.multiple_actions).parse(self.text)
+
+
+def _text(chunk: Any) -> str:
+    return chunk if isinstance(chunk, str) else chunk.content
+
+
+def parse_stream(chunks: Iterator[Any], multiple_actions: bool = False) -> Tuple[Union[AgentAction, AgentFinish, List[AgentAction]], int]:
+    """(result, number of chunks consumed) of a completion stream, closing the stream once the action is known.
+
+    Closing the generator closes the HTTP response of a streaming model, which cancels the generation.
+    """
+    parser = StreamingReActParser(multiple_actions)
+    consumed = 0
+    try:
+        for chunk in chunks:
+            consumed += 1
+            if parser.feed(_text(chunk)) is not None:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return parser.finish(), consumed
+
+
+async def aparse_stream(chunks: AsyncIterator[Any], multiple_actions: bool = False) -> Tuple[Union[AgentAction, AgentFinish, List[AgentAction]], int]:
+    parser = StreamingReActParser(multiple_actions)
+    consumed = 0
+    try:
+        async for chunk in chunks:
+            consumed += 1
+            if parser.feed(_text(chunk)) is not None:
+                break
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return parser.finish(), consumed
+
+
+class StreamingReActAgent(Agent):
+    """Base of the custom ReAct agents: streams the completion and stops it at the first complete action.
+
+    When the output parser has `multiple_actions`, a step can return several actions; their observations follow the
+    step's log in order in the scratchpad (see `ParallelAgentExecutor` in src/libs/agents.py to run them concurrently).
+    The scratchpad is extended with the new steps only, and old observations are shortened with `compaction`.
+    """
+
+    compaction: Optional[ObservationCompaction] = None
+
+    _scratchpad: Optional[IncrementalScratchpad] = PrivateAttr(default=None)
+
+    @property
+    def _multiple_actions(self) -> bool:
+        return getattr(self.output_parser, "multiple_actions", False)
+
+    def _construct_scratchpad(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+        if self._scratchpad is None:
+            # the actions of one step share the step's log
+            self._scratchpad = IncrementalScratchpad(self.observation_prefix, self.llm_prefix, self.compaction, group_actions=self._multiple_actions)
+        return self._scratchpad.format(intermediate_steps)
+
+    def _prompt_and_stop(self, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any):
+        full_inputs = self.get_full_inputs(intermediate_steps, **kwargs)
+        prompt = self.llm_chain.prompt
+        prompt_value = prompt.format_prompt(**{key: full_inputs[key] for key in prompt.input_variables})
+        return prompt_value, full_inputs["stop"]
+
+    def plan(self, intermediate_steps: List[Tuple[AgentAction, str]], callbacks: Callbacks = None, **kwargs: Any) -> Union[AgentAction, AgentFinish, List[AgentAction]]:
+        prompt_value, stop = self._prompt_and_stop(intermediate_steps, **kwargs)
+        result, _ = parse_stream(self.llm_chain.llm.stream(prompt_value, config={"callbacks": callbacks}, stop=stop), self._multiple_actions)
+        return result
+
+    async def aplan(self, intermediate_steps: List[Tuple[AgentAction, str]], callbacks: Callbacks = None, **kwargs: Any) -> Union[AgentAction, AgentFinish, List[AgentAction]]:
+        prompt_value, stop = self._prompt_and_stop(intermediate_steps, **kwargs)
+        result, _ = await aparse_stream(self.llm_chain.llm.astream(prompt_value, config={"callbacks": callbacks}, stop=stop), self._multiple_actions)
+        return result
+
+    @property
+    def finish_tool_name(self) -> str:
+        return WORD_FINISH
+
+    @property
+    def observation_prefix(self) -> str:
+        return f"{WORD_OBSERVATION}: "
+
+    @property
+    def llm_prefix(self) -> str:
+        return f"{WORD_THOUGHT}: "
+
+    @classmethod
+    def _get_default_output_parser(cls, **kwargs: Any) -> AgentOutputParser:
+        return ReActOutputParser()
@@ -1,11 +1,16 @@
-from typing import Any, Sequence
+from typing import Any, List, Optional, Sequence, Tuple
 
 from langchain.agents import AgentExecutor
 from langchain.agents.agent import Agent, AgentOutputParser
 from langchain.agents.react.output_parser import ReActOutputParser
+from langchain_core.agents import AgentAction
 from langchain_core.prompts import BasePromptTemplate, PromptTemplate
 from langchain_core.tools import BaseTool, Tool
 from langchain_openai import OpenAI
+from pydantic import PrivateAttr
+
+from src.libs.scratchpad import IncrementalScratchpad, ObservationCompaction
+from src.libs.tool_cache import ToolCache, memoize_tools
 
 ##########
 # define tools
@@ -23,6 +28,10 @@ def get_birthplace(name):
     return birthplace_dic[name]
 
 
+# GetBirthplace results are shared by every run of the process, the Llm tool samples and is not memoized
+tool_cache = ToolCache()
+
+
 ##########
 # define agent
 ##########
@@ -49,6 +58,10 @@ TEST_PROMPT = PromptTemplate.from_examples(EXAMPLES, SUFFIX, ["input", "agent_sc
 
 
 class ReActTestAgent(Agent):
+    compaction: Optional[ObservationCompaction] = None
+
+    _scratchpad: Optional[IncrementalScratchpad] = PrivateAttr(default=None)
+
     @classmethod
     def create_prompt(cls, tools: Sequence[BaseTool]) -> BasePromptTemplate:
         return TEST_PROMPT
@@ -77,6 +90,11 @@ class ReActTestAgent(Agent):
     def llm_prefix(self) -> str:
         return "Thought: "
 
+    def _construct_scratchpad(self, intermediate_steps: List[Tuple[AgentAction, str]]) -> str:
+        if self._scratchpad is None:
+            self._scratchpad = IncrementalScratchpad(self.observation_prefix, self.llm_prefix, self.compaction)
+        return self._scratchpad.format(intermediate_steps)
+
     @classmethod
     def _get_default_output_parser(cls, **kwargs: Any) -> AgentOutputParser:
         return ReActOutputParser()
@@ -97,6 +115,7 @@ def main():
         ),
         Tool(name="Llm", func=llm, description="Use this tool to ask general questions"),
     ]
+    tools = memoize_tools(tools, tool_cache, impure=["Llm"])
 
     agent = ReActTestAgent.from_llm_and_tools(
         llm,
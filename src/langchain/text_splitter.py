@@ -1,29 +1,33 @@
-from typing import List
+from functools import lru_cache
+from typing import Iterator, List
 
 from langchain_community.document_loaders import TextLoader
 from langchain_core.documents import Document
 from langchain_text_splitters import MarkdownTextSplitter, RecursiveCharacterTextSplitter
 
+from src.libs.chunk_cache import DEFAULT_CACHE_PATH, ChunkCache
+from src.libs.markdown_chunker import iter_markdown_chunks
 
-def create_documents(texts):
-    splitter = RecursiveCharacterTextSplitter(
+
+@lru_cache(maxsize=None)
+def _character_splitter() -> RecursiveCharacterTextSplitter:
+    # splitters are stateless, build once instead of on every call
+    return RecursiveCharacterTextSplitter(
         separators=None,
         chunk_size=20,
         chunk_overlap=0,
     )
-    docs = splitter.create_documents(
+
+
+def create_documents(texts):
+    docs = _character_splitter().create_documents(
         texts=texts,
     )
     return docs
 
 
 def split_text(text) -> List[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        separators=None,
-        chunk_size=20,
-        chunk_overlap=0,
-    )
-    lst = splitter.split_text(text)
+    lst = _character_splitter().split_text(text)
     return lst
 
 
@@ -37,6 +41,21 @@ def split_markdown_text(md_filename) -> List[Document]:
     return loader.load_and_split(text_splitter=splitter)
 
 
+def iter_markdown_text(md_filename, chunk_bytes=1000, chunk_overlap_bytes=200) -> Iterator[Document]:
+    """Memory-mapped version of split_markdown_text for large files: chunks are bounded in UTF-8 bytes (a Japanese
+    character is 3 bytes), carry their section headers and byte offset as metadata, and are decoded one at a time."""
+    return iter_markdown_chunks(md_filename, chunk_bytes=chunk_bytes, chunk_overlap_bytes=chunk_overlap_bytes)
+
+
+def split_markdown_tree(root, cache_path=DEFAULT_CACHE_PATH, chunk_size=1000, chunk_overlap=200) -> List[Document]:
+    """Chunks of every markdown file under `root`, re-chunking only the files and sections changed since the last run."""
+    cache = ChunkCache(cache_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    try:
+        return cache.ingest_tree(root)
+    finally:
+        cache.close()
+
+
 if __name__ == "__main__":
     texts = [
         """
@@ -1,14 +1,29 @@
-from langchain_openai import ChatOpenAI
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterator, Optional, Sequence
 
-from langchain_core.prompts import PromptTemplate
 from langchain.agents import AgentExecutor, create_react_agent
-from src.libs.tools import TOOL_GOOGLE
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.callbacks import CallbackManagerForChainRun
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.load import dumpd
+from langchain_core.prompts import BasePromptTemplate, PromptTemplate
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+from pydantic import PrivateAttr
 
+from src.libs.llm import get_chat_model
+from src.libs.tools import get_tool
 
-def create_google_agent_executor(
-    llm=ChatOpenAI(model="gpt-3.5-turbo"),
-    prompt=PromptTemplate.from_template(
-        template="""Answer the following questions as best you can. You have access to the following tools:
+GOOGLE_AGENT_MODEL = "gpt-3.5-turbo"
+
+GOOGLE_AGENT_PROMPT = """Answer the following questions as best you can. You have access to the following tools:
 
 {tools}
 
@@ -27,28 +42,185 @@ Begin!
 
 Question: {input}
 Thought:{agent_scratchpad}"""
-    ),
-    memory=None,
-) -> AgentExecutor:
-    """Return ReAct Agent Executor with Google Search as the only tool."""
-    tools_google = [
-        TOOL_GOOGLE,
-    ]
 
-    print(prompt)
 
-    agent_google = create_react_agent(
-        llm=llm,
-        tools=tools_google,
-        prompt=prompt,
-    )
+@dataclass
+class AgentFactoryStats:
+    hits: int = 0
+    misses: int = 0
+    build_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def model_key(llm: BaseLanguageModel) -> str:
+    """Identify a model instance by its class, identifying params (model name, temperature, ...) and identity.
+
+    Identifying params leave out the endpoint, credentials, callbacks and cache, so two instances with equal params
+    are still different models. The cached executor references the model, which keeps the id from being reused.
+    """
+    params = json.dumps(llm._identifying_params, sort_keys=True, default=str)
+    return f"{type(llm).__module__}.{type(llm).__qualname__}@{id(llm):x}:{params}"
+
+
+def prompt_key(prompt: BasePromptTemplate) -> str:
+    return hashlib.sha256(json.dumps(dumpd(prompt), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class AgentExecutorFactory:
+    """Cache of ReAct AgentExecutors keyed by (model params, prompt hash, tool set).
+
+    Executors without memory hold no per-run state, so one cached executor can serve any number of
+    sessions and threads. When `memory` is given the cached agent is reused but wrapped in a new
+    executor, because memory belongs to a single conversation.
+
+    Concurrent requests for the same key wait for a single build; builds for different keys run in parallel.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.stats = AgentFactoryStats()
+        self._executors: "OrderedDict[Hashable, AgentExecutor]" = OrderedDict()
+        self._building: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        llm: BaseLanguageModel,
+        prompt: BasePromptTemplate,
+        tools: Sequence[BaseTool],
+        memory: Optional[Any] = None,
+        **executor_kwargs: Any,
+    ) -> AgentExecutor:
+        key = (
+            model_key(llm),
+            prompt_key(prompt),
+            tuple(sorted((tool.name, id(tool)) for tool in tools)),
+            tuple(sorted(executor_kwargs.items())),
+        )
+        with self._lock:
+            executor = self._executors.get(key)
+            building = self._building.get(key)
+            if executor is not None:
+                self._executors.move_to_end(key)
+                self.stats.hits += 1
+            elif building is not None:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+                self._building[key] = Future()
+        if executor is None:
+            executor = building.result() if building is not None else self._build(key, llm, prompt, tools, executor_kwargs)
+        if memory is None:
+            return executor
+        return AgentExecutor(agent=executor.agent, tools=executor.tools, memory=memory, **executor_kwargs)
+
+    def _build(self, key: Hashable, llm: BaseLanguageModel, prompt: BasePromptTemplate, tools: Sequence[BaseTool], executor_kwargs: Dict[str, Any]) -> AgentExecutor:
+        future = self._building[key]
+        try:
+            start = time.perf_counter()
+            agent = create_react_agent(llm=llm, tools=tools, prompt=prompt)
+            executor = AgentExecutor(agent=agent, tools=tools, **executor_kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self.stats.build_seconds += time.perf_counter() - start
+            del self._building[key]
+            self._executors[key] = executor
+            while len(self._executors) > self.maxsize:
+                self._executors.popitem(last=False)
+        future.set_result(executor)
+        return executor
+
+    def clear(self) -> None:
+        with self._lock:
+            self._executors.clear()
+            self.stats = AgentFactoryStats()
 
-    agent_executor_google = AgentExecutor(
-        agent=agent_google,
-        tools=tools_google,
+    def __len__(self) -> int:
+        return len(self._executors)
+
+
+agent_executor_factory = AgentExecutorFactory()
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """AgentExecutor running the actions of one step concurrently on a thread pool.
+
+    An agent that returns several independent actions in one step (e.g. `ParallelReActTestAgent` in
+    src/langchain/react_custom.py) gets all their observations back at once, after the slowest tool instead of
+    the sum of them. Observations keep the order of the actions. `ainvoke` already gathers the actions of a step.
+    """
+
+    max_workers: int = 8
+
+    _pending: Dict[int, Future] = PrivateAttr(default_factory=dict)
+    _pending_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: list,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Any]:
+        # the base class yields every planned action before running the first one: start them all as they come
+        started = []
+        try:
+            with ContextThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+                    if isinstance(item, AgentAction):
+                        future = executor.submit(super()._perform_agent_action, name_to_tool_map, color_mapping, item, run_manager)
+                        with self._pending_lock:
+                            self._pending[id(item)] = future
+                        started.append(id(item))
+                    yield item
+        finally:
+            with self._pending_lock:
+                for key in started:
+                    self._pending.pop(key, None)
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        with self._pending_lock:
+            future = self._pending.pop(id(agent_action), None)
+        if future is None:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        return future.result()
+
+
+@functools.lru_cache(maxsize=None)
+def _default_google_prompt() -> BasePromptTemplate:
+    return PromptTemplate.from_template(template=GOOGLE_AGENT_PROMPT)
+
+
+def create_google_agent_executor(
+    llm: Optional[BaseLanguageModel] = None,
+    prompt: Optional[BasePromptTemplate] = None,
+    memory=None,
+    factory: AgentExecutorFactory = agent_executor_factory,
+) -> AgentExecutor:
+    """Return ReAct Agent Executor with Google Search as the only tool.
+
+    The executor is cached by `factory`, so calling this per request does not rebuild the agent.
+    """
+    return factory.get(
+        llm=get_chat_model(model=GOOGLE_AGENT_MODEL) if llm is None else llm,
+        prompt=_default_google_prompt() if prompt is None else prompt,
+        tools=[get_tool("google-search")],
         memory=memory,
         verbose=True,
         handle_parsing_errors=False,
     )
-
-    return agent_executor_google
@@ -0,0 +1,164 @@
+import re
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+OPERATIONS = {
+    "total": "total",
+    "sum": "total",
+    "diff": "diff",
+    "difference": "diff",
+    "multiplier": "multiply",
+    "multiply": "multiply",
+    "product": "multiply",
+}
+INFIX_OPERATIONS = {"+": "total", "*": "multiply"}
+
+_ITEM_SEPARATOR = re.compile(r"[;\n]")
+_CALL = re.compile(r"^\s*([A-Za-z]+)\s*\[(.*)\]\s*$", re.DOTALL)
+_INFIX = re.compile(r"^\s*-?\d+(?:\s*([+*])\s*-?\d+)+\s*$")
+# np.fromstring reads "1 - 2" as [1, -2]; a minus sign must be followed by a digit
+_DANGLING_MINUS = re.compile(r"-(?![0-9])")
+_BIG_NUMBER = re.compile(r"[0-9]{19}")
+_INT64 = np.iinfo(np.int64)
+# int64 results must stay below 2**63; keep one bit of margin for the float estimates
+_SAFE_BITS = 62
+
+Numbers = Union[np.ndarray, List[int]]
+
+
+def parse_numbers(text: str) -> Numbers:
+    """Parse whitespace or comma separated integers.
+
+    Returns an int64 array, or a list of Python ints when a number does not fit in int64.
+    """
+    text = text.replace(",", " ")
+    if not text.strip() or _DANGLING_MINUS.search(text):
+        raise ValueError(f"Could not parse numbers in {text.strip()!r}")
+    try:
+        values = np.fromstring(text, dtype=np.int64, sep=" ")
+    except ValueError:
+        raise ValueError(f"Could not parse numbers in {text.strip()!r}") from None
+    # out of range numbers are clamped to the int64 limits.
+    # scanning the text is cheaper than two reductions for short inputs, and the other way round for long ones
+    if len(text) < 4096:
+        overflow = len(text) >= 19 and _BIG_NUMBER.search(text) is not None
+    else:
+        overflow = values.max() == _INT64.max or values.min() == _INT64.min
+    if overflow:
+        return [int(s) for s in text.split()]
+    return values
+
+
+def parse_item(item: str) -> Tuple[str, Numbers]:
+    """Parse `Op[1 2 3]`, `Op[1,2,3]` or `1+2+3` into (operation, numbers)."""
+    match = _CALL.match(item)
+    if match:
+        name, args = match.groups()
+        operation = OPERATIONS.get(name.lower())
+        if operation is None:
+            raise ValueError(f"Unknown operation {name!r}. Use one of {sorted(OPERATIONS)}")
+        if not args.strip():
+            raise ValueError(f"No numbers given: {item.strip()!r}")
+        numbers = parse_numbers(args)
+    else:
+        match = _INFIX.match(item)
+        if match is None:
+            raise ValueError(f"Could not parse {item.strip()!r}")
+        if "+" in item and "*" in item:
+            raise ValueError(f"Mixed operators are not supported: {item.strip()!r}")
+        operation = INFIX_OPERATIONS[match.group(1)]
+        numbers = parse_numbers(item.replace(match.group(1), " "))
+    if operation == "diff" and len(numbers) != 2:
+        raise ValueError(f"Diff needs exactly two numbers: {item.strip()!r}")
+    return operation, numbers
+
+
+def evaluate_exact(operation: str, numbers: Sequence[int]) -> int:
+    if operation == "total":
+        return sum(numbers)
+    if operation == "diff":
+        return abs(numbers[0] - numbers[1])
+    result = 1
+    for n in numbers:
+        result *= n
+    return result
+
+
+def _evaluate_vectorized(operation: str, rows: List[np.ndarray]) -> Tuple[List[int], List[bool]]:
+    """Evaluate all rows of one operation at once. Returns the results and whether each row fits in int64."""
+    values = np.concatenate(rows)
+    counts = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    with np.errstate(over="ignore"):
+        if operation == "diff":
+            computed = np.abs(values[offsets] - values[offsets + 1])
+            bound = np.maximum(np.abs(values[offsets]), np.abs(values[offsets + 1])).astype(np.float64) * 2
+            safe = bound < 2.0**_SAFE_BITS
+        elif operation == "total":
+            computed = np.add.reduceat(values, offsets)
+            bound = np.maximum.reduceat(np.abs(values), offsets).astype(np.float64) * counts
+            safe = bound < 2.0**_SAFE_BITS
+        else:
+            computed = np.multiply.reduceat(values, offsets)
+            bits = np.add.reduceat(np.log2(np.maximum(np.abs(values), 1).astype(np.float64)), offsets)
+            safe = bits < _SAFE_BITS
+    return computed.tolist(), safe.tolist()
+
+
+def evaluate_batch(items: Sequence[Tuple[str, Numbers]]) -> List[int]:
+    """Evaluate (operation, numbers) pairs from `parse_item`, keeping the input order.
+
+    Rows of the same operation are evaluated together with NumPy (int64).
+    Rows that could overflow int64 are evaluated exactly with Python ints instead.
+    """
+    by_operation: Dict[str, List[int]] = defaultdict(list)
+    for i, (operation, _) in enumerate(items):
+        by_operation[operation].append(i)
+
+    results: List[int] = [0] * len(items)
+    for operation, indices in by_operation.items():
+        exact = [i for i in indices if not isinstance(items[i][1], np.ndarray)]
+        vectorized = [i for i in indices if isinstance(items[i][1], np.ndarray)]
+        if vectorized:
+            computed, safe = _evaluate_vectorized(operation, [items[i][1] for i in vectorized])
+            for i, value, ok in zip(vectorized, computed, safe):
+                if ok:
+                    results[i] = value
+                else:
+                    exact.append(i)
+        for i in exact:
+            results[i] = evaluate_exact(operation, [int(n) for n in items[i][1]])
+    return results
+
+
+def batch_arithmetic(text: str) -> str:
+    """Evaluate every calculation in `text` and return one line per calculation.
+
+    ```
+    >>> print(batch_arithmetic("Total[1500 20000 6700]; Diff[2000 1500]; 3*4"))
+    Total[1500 20000 6700] = 28200
+    Diff[2000 1500] = 500
+    3*4 = 12
+    ```
+    """
+    items = [item.strip() for item in _ITEM_SEPARATOR.split(text) if item.strip()]
+    parsed: List[Tuple[str, Numbers]] = []
+    positions: List[int] = []
+    errors: Dict[int, str] = {}
+    for i, item in enumerate(items):
+        try:
+            parsed.append(parse_item(item))
+            positions.append(i)
+        except ValueError as e:
+            errors[i] = f"error: {e}"
+    values = dict(zip(positions, evaluate_batch(parsed)))
+    return "\n".join(f"{item} = {values[i] if i in values else errors[i]}" for i, item in enumerate(items))
+
+
+BATCH_ARITHMETIC_DESCRIPTION = (
+    "useful for when you need many additions, differences or multiplications at once. "
+    "The input is a list of calculations separated by `;`. Each calculation is `Total[numbers]`, `Diff[a b]`, `Multiplier[numbers]`, "
+    "`a+b+c` or `a*b*c`. For example, `Total[1500 20000 6700]; Diff[2000 1500]; 3*4` returns one line per calculation."
+)
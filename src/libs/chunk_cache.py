@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from langchain_core.documents import Document
+
+from src.libs.markdown_chunker import MarkdownFile, chunk_metadata
+
+DEFAULT_CACHE_PATH = ".cache/chunk_cache.sqlite3"
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    unchanged_files: int = 0
+    section_hits: int = 0
+    section_misses: int = 0
+    removed_files: int = 0
+
+    @property
+    def changed_files(self) -> int:
+        return self.files - self.unchanged_files
+
+
+class ChunkCache:
+    """Incremental markdown ingestion: only files and sections whose content changed are re-chunked.
+
+    - files whose size and mtime did not change are not even opened, their chunks come from the cache
+    - other files are split into header sections and each section is looked up by sha256 of its bytes
+      (plus the chunking parameters), so editing one section of a large file re-chunks only that section
+
+    Chunks are stored relative to their section, so sections moved by an edit above them are still hits.
+    The output is the same as `MarkdownFile.chunks` (see `src.libs.markdown_chunker`).
+
+    ```
+    cache = ChunkCache(".cache/chunk_cache.sqlite3", chunk_size=1000, chunk_overlap=200)
+    docs = cache.ingest_tree("docs")
+    print(cache.stats)
+    ```
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, chunk_size: int = 1000, chunk_overlap: int = 0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.stats = IngestStats()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._config = f"{chunk_size}:{chunk_overlap}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                config TEXT NOT NULL,
+                sections TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sections (key TEXT PRIMARY KEY, chunks TEXT NOT NULL)")
+
+    def ingest(self, path: str) -> List[Document]:
+        """Documents for the chunks of the markdown file at `path`."""
+        path = str(path)
+        stat = os.stat(path)
+        with self._lock:
+            self.stats.files += 1
+            row = self._conn.execute("SELECT size, mtime_ns, config, sections FROM files WHERE path = ?", (path,)).fetchone()
+            if row is not None and tuple(row[:3]) == (stat.st_size, stat.st_mtime_ns, self._config):
+                self.stats.unchanged_files += 1
+                return self._documents(path, json.loads(row[3]))
+            sections = self._chunk_file(path)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, config, sections) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, self._config, json.dumps(sections, ensure_ascii=False)),
+            )
+            self._conn.commit()
+            return self._documents(path, sections)
+
+    def ingest_tree(self, root: str, pattern: str = "**/*.md") -> List[Document]:
+        """Ingest every file under `root` matching `pattern` and forget files that no longer exist."""
+        paths = sorted(str(p) for p in Path(root).glob(pattern) if p.is_file())
+        documents = [doc for path in paths for doc in self.ingest(path)]
+        self._forget(root, set(paths))
+        return documents
+
+    def _chunk_file(self, path: str) -> List[Tuple[int, List[str], str]]:
+        """[(section start, headers, section key)] of the file, chunking the sections not in the cache."""
+        sections = []
+        with MarkdownFile(path) as md:
+            for start, end, headers in md.sections():
+                key = hashlib.sha256(self._config.encode() + b"\x00" + md.mm[start:end]).hexdigest()
+                if self._conn.execute("SELECT 1 FROM sections WHERE key = ?", (key,)).fetchone():
+                    self.stats.section_hits += 1
+                else:
+                    self.stats.section_misses += 1
+                    chunks = [(offset - start, md.mm[offset : offset + length].decode("utf-8")) for offset, length in md.section_spans(start, end, self.chunk_size, self.chunk_overlap)]
+                    self._conn.execute("INSERT INTO sections (key, chunks) VALUES (?, ?)", (key, json.dumps(chunks, ensure_ascii=False)))
+                sections.append((start, list(headers), key))
+        return sections
+
+    def _documents(self, path: str, sections: Iterable[Tuple[int, List[str], str]]) -> List[Document]:
+        documents = []
+        for start, headers, key in sections:
+            (chunks,) = self._conn.execute("SELECT chunks FROM sections WHERE key = ?", (key,)).fetchone()
+            for offset, text in json.loads(chunks):
+                metadata = chunk_metadata(path, start + offset, len(text.encode("utf-8")), headers)
+                documents.append(Document(page_content=text, metadata=metadata))
+        return documents
+
+    def _forget(self, root: str, paths: set) -> None:
+        with self._lock:
+            # resolved, so that root="." or "./docs" matches the paths stored as "docs/a.md"
+            root = Path(root).resolve()
+            stale = [p for (p,) in self._conn.execute("SELECT path FROM files") if p not in paths and Path(p).resolve().is_relative_to(root)]
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in stale])
+            self.stats.removed_files += len(stale)
+            # drop sections no longer referenced by any file
+            used = {key for (sections,) in self._conn.execute("SELECT sections FROM files") for _, _, key in json.loads(sections)}
+            unused = [key for (key,) in self._conn.execute("SELECT key FROM sections") if key not in used]
+            self._conn.executemany("DELETE FROM sections WHERE key = ?", [(key,) for key in unused])
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,73 @@
+import threading
+import unicodedata
+import zlib
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+class NearDuplicateFilter:
+    """Collapse near-duplicate documents (e.g. overlapping chunks) with MinHash over character shingles.
+
+    Two documents are near-duplicates when the estimated Jaccard similarity of their `shingle`-character sets is
+    at least `threshold`. Documents are kept in order: a document duplicating an earlier one is dropped and its
+    metadata is added to the kept one under `duplicates`, so the provenance is not lost. Character shingles
+    work the same for Japanese and English text.
+
+    ```
+    dedup = NearDuplicateFilter(threshold=0.8)
+    documents = dedup.collapse(retriever.invoke(question))
+    ```
+    """
+
+    def __init__(self, threshold: float = 0.8, shingle: int = 5, num_perm: int = 128, seed: int = 0):
+        self.threshold = threshold
+        self.shingle = shingle
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing: ((a * x + b) mod 2^64) >> 32 with a odd, one (a, b) per permutation
+        self._a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+        self.removed = 0
+        self._lock = threading.Lock()
+
+    def _shingles(self, text: str) -> np.ndarray:
+        text = " ".join(unicodedata.normalize("NFKC", text).split())
+        grams = {text[i : i + self.shingle] for i in range(max(len(text) - self.shingle + 1, 1))}
+        return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """MinHash signatures, shape (len(texts), num_perm)."""
+        signatures = np.empty((len(texts), len(self._a)), dtype=np.uint64)
+        for row, text in enumerate(texts):
+            hashes = (self._a[:, None] * self._shingles(text)[None, :] + self._b[:, None]) >> np.uint64(32)
+            signatures[row] = hashes.min(axis=1)
+        return signatures
+
+    def collapse(self, documents: Sequence[Document]) -> List[Document]:
+        """`documents` without their near-duplicates, in order, with `duplicates` metadata on the kept ones."""
+        if len(documents) < 2:
+            return list(documents)
+        signatures = self.signatures([doc.page_content for doc in documents])
+        # estimated Jaccard similarity of every pair: fraction of equal MinHash values
+        similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+        kept: List[int] = []
+        duplicates = {}
+        representative = list(range(len(documents)))
+        for i in range(len(documents)):
+            # a chain of overlapping windows collapses into its first one
+            original = next((j for j in range(i) if similarity[i, j] >= self.threshold), None)
+            if original is None:
+                kept.append(i)
+            else:
+                representative[i] = representative[original]
+                duplicates.setdefault(representative[i], []).append(documents[i].metadata)
+        with self._lock:
+            self.removed += len(documents) - len(kept)
+        result = []
+        for i in kept:
+            doc = documents[i]
+            if i in duplicates:
+                doc = Document(page_content=doc.page_content, metadata={**doc.metadata, "duplicates": duplicates[i]})
+            result.append(doc)
+        return result
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, List, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.example_selectors import BaseExampleSelector
+
+from src.libs.vector_index import VectorIndex, embed
+
+
+def examples_from_texts(texts: Sequence[str]) -> List[Dict[str, str]]:
+    """`{"question": ..., "example": text}` of worked examples whose first line is `<question word>: <question>`."""
+    return [{"question": text.split("\n", 1)[0].partition(": ")[2], "example": text} for text in texts]
+
+
+class IndexedExampleSelector(BaseExampleSelector):
+    """Few-shot examples most similar to the input, within a token budget, from a local `VectorIndex`.
+
+    The `input_key` of each example is embedded once when it is added (or loaded from a saved index), so a prompt
+    costs one query embedding and one matrix product whatever the number of examples. The `k` best examples are
+    taken in order of similarity while they fit in `max_tokens` (`count_tokens` counts characters by default), so
+    the prompt stays the same size as the example store grows.
+
+    ```
+    selector = IndexedExampleSelector.from_examples(examples, HashingEmbeddings(), k=2, max_tokens=1000)
+    prompt = FewShotPromptTemplate(example_selector=selector, example_prompt=PromptTemplate.from_template("{example}"), suffix=SUFFIX, input_variables=["input", "agent_scratchpad"])
+    ```
+    """
+
+    def __init__(
+        self,
+        index: VectorIndex,
+        embeddings: Embeddings,
+        k: int = 2,
+        max_tokens: int = 2000,
+        input_key: str = "question",
+        query_key: str = "input",
+        text_key: str = "example",
+        count_tokens: Callable[[str], int] = len,
+    ):
+        self.index = index
+        self.embeddings = embeddings
+        self.k = k
+        self.max_tokens = max_tokens
+        self.input_key = input_key
+        self.query_key = query_key
+        self.text_key = text_key
+        self.count_tokens = count_tokens
+
+    @classmethod
+    def from_examples(cls, examples: Sequence[Dict[str, str]], embeddings: Embeddings, **kwargs: Any) -> "IndexedExampleSelector":
+        dim = len(embeddings.embed_query(""))
+        selector = cls(VectorIndex(dim), embeddings, **kwargs)
+        selector.add_examples(examples)
+        return selector
+
+    @classmethod
+    def load(cls, directory: str, embeddings: Embeddings, mmap: bool = True, **kwargs: Any) -> "IndexedExampleSelector":
+        return cls(VectorIndex.load(directory, mmap=mmap), embeddings, **kwargs)
+
+    def save(self, directory: str) -> None:
+        self.index.save(directory)
+
+    def add_examples(self, examples: Sequence[Dict[str, str]]) -> None:
+        if examples:
+            texts = [example[self.input_key] for example in examples]
+            self.index.add(embed(self.embeddings, texts), [Document(page_content=text, metadata=dict(example)) for text, example in zip(texts, examples)])
+
+    def add_example(self, example: Dict[str, str]) -> Any:
+        self.add_examples([example])
+
+    def select_examples(self, input_variables: Dict[str, str]) -> List[dict]:
+        if not len(self.index):
+            return []
+        _, ids = self.index.search(embed(self.embeddings, [input_variables[self.query_key]]), k=self.k)
+        selected, tokens = [], 0
+        for i in ids[0]:
+            example = self.index.documents[i].metadata
+            cost = self.count_tokens(example[self.text_key])
+            if tokens + cost > self.max_tokens:
+                continue
+            selected.append(example)
+            tokens += cost
+        return selected
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import re
+import time
+from typing import Callable, Iterator, List, Optional, Sequence, Union
+
+from src.libs.local_server import LocalHTTPServer
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+def echo_responder(prompt: str, model: str) -> str:
+    """Deterministic default answer: same prompt and model, same text."""
+    digest = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:8]
+    return f"fake response {digest}"
+
+
+def _apply_stop(text: str, stop: Optional[Union[str, Sequence[str]]]) -> str:
+    # the API accepts a single stop sequence as a plain string
+    if isinstance(stop, str):
+        stop = [stop]
+    for s in stop or []:
+        index = text.find(s)
+        if index >= 0:
+            text = text[:index]
+    return text
+
+
+def _count_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+class FakeOpenAIServer(LocalHTTPServer):
+    """Local OpenAI-compatible server for load tests without network or API keys.
+
+    Serves `/v1/chat/completions` and `/v1/completions`, with and without `stream`.
+
+    - `responder(prompt, model)` decides the completion. When `responses` is given they are returned in order
+      (cycling), like `FakeListLLM`; otherwise the answer is derived from the prompt so it is deterministic
+      regardless of request order.
+    - `latency` is the delay before the first byte (time to first token), `token_latency` the delay between
+      streamed chunks.
+    - `stop` sequences are honoured so ReAct style prompts behave like the real API.
+
+    ```
+    with FakeOpenAIServer(latency=0.2, token_latency=0.01) as server:
+        llm = get_chat_model(base_url=server.base_url, api_key="fake")
+    ```
+    """
+
+    def __init__(
+        self,
+        responses: Optional[List[str]] = None,
+        responder: Callable[[str, str], str] = echo_responder,
+        latency: float = 0.0,
+        token_latency: float = 0.0,
+        **kwargs,
+    ):
+        super().__init__(latency=latency, **kwargs)
+        self.responses = responses
+        self.responder = responder
+        self.token_latency = token_latency
+        self.prompts: List[str] = []
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def handle(self, method, path, query, body):
+        if method != "POST" or path not in ("/v1/chat/completions", "/v1/completions"):
+            return 404, {"error": {"message": f"unknown path {path}", "type": "invalid_request_error"}}
+        chat = path == "/v1/chat/completions"
+        if chat:
+            prompt = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in body["messages"])
+        else:
+            prompt = body["prompt"] if isinstance(body["prompt"], str) else "\n".join(body["prompt"])
+        model = body.get("model", "fake")
+        text = _apply_stop(self._respond(prompt, model), body.get("stop"))
+        usage = {
+            "prompt_tokens": _count_tokens(prompt),
+            "completion_tokens": _count_tokens(text),
+            "total_tokens": _count_tokens(prompt) + _count_tokens(text),
+        }
+        if body.get("stream"):
+            return 200, self._stream(chat, model, text, usage)
+        if chat:
+            choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop", "logprobs": None}
+            return 200, {"id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": model, "choices": [choice], "usage": usage}
+        choice = {"index": 0, "text": text, "finish_reason": "stop", "logprobs": None}
+        return 200, {"id": "cmpl-fake", "object": "text_completion", "created": 0, "model": model, "choices": [choice], "usage": usage}
+
+    def _respond(self, prompt: str, model: str) -> str:
+        with self._lock:
+            self.prompts.append(prompt)
+            if self.responses:
+                return self.responses[(len(self.prompts) - 1) % len(self.responses)]
+        return self.responder(prompt, model)
+
+    def _stream(self, chat: bool, model: str, text: str, usage: dict) -> Iterator[bytes]:
+        def event(choice, **extra):
+            obj = "chat.completion.chunk" if chat else "text_completion"
+            data = {"id": "chatcmpl-fake" if chat else "cmpl-fake", "object": obj, "created": 0, "model": model, "choices": [choice], **extra}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        for i, token in enumerate(_TOKEN.findall(text)):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            if chat:
+                yield event({"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None, "logprobs": None})
+            else:
+                yield event({"index": 0, "text": token, "finish_reason": None, "logprobs": None})
+        if chat:
+            yield event({"index": 0, "delta": {}, "finish_reason": "stop", "logprobs": None}, usage=usage)
+        else:
+            yield event({"index": 0, "text": "", "finish_reason": "stop", "logprobs": None}, usage=usage)
+        yield b"data: [DONE]\n\n"
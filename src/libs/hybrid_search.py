@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from src.libs.vector_index import VectorIndex, VectorIndexRetriever, embed
+
+# codes such as J-26 or v1.2 stay one token, CJK runs become character bigrams, other scripts words
+_CODE = r"[0-9a-z]+(?:[-_./][0-9a-z]+)*"
+_CJK_CHARS = r"\u3005\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN = re.compile(rf"(?P<code>{_CODE})(?![^\W_{_CJK_CHARS}])|(?P<cjk>[{_CJK_CHARS}]+)|(?P<word>[^\W_{_CJK_CHARS}]+)")
+_PART = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """BM25 terms of `text`: ASCII words and codes (plus the parts of a code), CJK character bigrams, other words.
+
+    `J-26` gives `j-26`, `j` and `26`, so both the exact code and its parts match; `東京都` gives `東京` and `京都`.
+    """
+    terms = []
+    for match in _TOKEN.finditer(unicodedata.normalize("NFKC", text).casefold()):
+        token = match.group()
+        if match.lastgroup == "cjk":
+            terms.extend([token] if len(token) == 1 else [token[i : i + 2] for i in range(len(token) - 1)])
+        elif match.lastgroup == "code":
+            terms.append(token)
+            parts = _PART.findall(token)
+            if len(parts) > 1:
+                terms.extend(parts)
+        else:
+            terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index stored as CSR arrays (one `.npy` each), memory-mapped by `load`.
+
+    Postings of term `t` are `doc_ids[offsets[t]:offsets[t + 1]]` with their term frequencies in `tfs`, so a query
+    touches only the postings of its terms, and opening a large index maps the files instead of reading them.
+
+    ```
+    index = BM25Index.from_texts(texts)
+    scores, ids = index.search("J-26 の在庫", k=10)
+    ```
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray, lengths: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], **kwargs: Any) -> "BM25Index":
+        postings: Dict[str, List[tuple]] = {}
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+        vocabulary = {term: i for i, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for term, i in vocabulary.items():
+            offsets[i + 1] = len(postings[term])
+        np.cumsum(offsets, out=offsets)
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for term, i in vocabulary.items():
+            entries = np.asarray(postings[term])
+            doc_ids[offsets[i] : offsets[i + 1]] = entries[:, 0]
+            tfs[offsets[i] : offsets[i + 1]] = entries[:, 1]
+        return cls(vocabulary, offsets, doc_ids, tfs, np.asarray(lengths, dtype=np.float32), **kwargs)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for `query`."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        n = len(self)
+        for term, count in Counter(tokenize(query)).items():
+            i = self.vocabulary.get(term)
+            if i is None:
+                continue
+            doc_ids = self.doc_ids[self.offsets[i] : self.offsets[i + 1]]
+            tfs = self.tfs[self.offsets[i] : self.offsets[i + 1]]
+            idf = np.log1p((n - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_ids] / max(self.average_length, 1e-9))
+            scores[doc_ids] += count * idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, query: str, k: int = 10) -> tuple:
+        """(scores, indices) of the best `k` documents with a positive score, best first (ties by index)."""
+        scores = self.scores(query)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            # keep the lowest indices among the ties at the k-th score
+            kth = scores[candidates].min()
+            candidates = np.union1d(np.flatnonzero(scores > kth), np.flatnonzero(scores == kth))
+        order = np.lexsort((candidates, -scores[candidates]))[:k]
+        return scores[candidates[order]], candidates[order]
+
+    def save(self, directory: str) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ("offsets", "doc_ids", "tfs", "lengths"):
+            np.save(directory / f"bm25_{name}.tmp.npy", getattr(self, name))
+        with open(directory / "bm25_vocabulary.tmp.json", "w", encoding="utf-8") as f:
+            json.dump({"terms": sorted(self.vocabulary, key=self.vocabulary.get), "k1": self.k1, "b": self.b}, f, ensure_ascii=False)
+        for name in ("offsets", "doc_ids", "tfs", "lengths"):
+            os.replace(directory / f"bm25_{name}.tmp.npy", directory / f"bm25_{name}.npy")
+        os.replace(directory / "bm25_vocabulary.tmp.json", directory / "bm25_vocabulary.json")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "BM25Index":
+        directory = Path(directory)
+        with open(directory / "bm25_vocabulary.json", encoding="utf-8") as f:
+            data = json.load(f)
+        arrays = {name: np.load(directory / f"bm25_{name}.npy", mmap_mode="r" if mmap else None) for name in ("offsets", "doc_ids", "tfs", "lengths")}
+        return cls({term: i for i, term in enumerate(data["terms"])}, k1=data["k1"], b=data["b"], **arrays)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Ids ordered by sum(1 / (k + rank)) over `rankings` (rank starting at 1), ties by first appearance."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 and dense retrieval over the same documents, merged with reciprocal rank fusion.
+
+    BM25 finds exact identifiers (part numbers, product codes, rare Japanese terms) that embeddings blur, dense
+    scores find paraphrases; better first-stage recall means fewer `transform_query` loops in
+    `langgraph_self_reflection`. Each side contributes its best `candidates` documents.
+
+    ```
+    retriever = HybridRetriever.from_documents(docs, HashingEmbeddings(), k=4)
+    retriever.save("index")
+    retriever = HybridRetriever.load("index", HashingEmbeddings())
+    graph = create_graph(chat, retriever)
+    ```
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    bm25: BM25Index
+    vectors: VectorIndexRetriever
+    k: int = 4
+    candidates: int = 20
+    rrf_k: int = 60
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], embeddings: Embeddings, k: int = 4, **kwargs: Any) -> "HybridRetriever":
+        documents = list(documents)
+        vectors = VectorIndexRetriever.from_documents(documents, embeddings, k=k)
+        return cls(bm25=BM25Index.from_texts(doc.page_content for doc in documents), vectors=vectors, k=k, **kwargs)
+
+    def save(self, directory: str) -> None:
+        self.vectors.index.save(directory)
+        self.bm25.save(directory)
+
+    @classmethod
+    def load(cls, directory: str, embeddings: Embeddings, mmap: bool = True, k: int = 4, **kwargs: Any) -> "HybridRetriever":
+        vectors = VectorIndexRetriever(index=VectorIndex.load(directory, mmap=mmap), embeddings=embeddings, k=k)
+        return cls(bm25=BM25Index.load(directory, mmap=mmap), vectors=vectors, k=k, **kwargs)
+
+    def search(self, query: str, k: Optional[int] = None) -> List[int]:
+        """Indices of the best `k` documents."""
+        _, lexical = self.bm25.search(query, k=self.candidates)
+        _, dense = self.vectors.index.search(embed(self.vectors.embeddings, [query]), k=self.candidates)
+        return reciprocal_rank_fusion([lexical.tolist(), dense[0].tolist()], k=self.rrf_k)[: k or self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self.vectors.index.documents
+        return [documents[i] for i in self.search(query)]
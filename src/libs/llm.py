@@ -1,7 +1,118 @@
+import json
 import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
 
-from langchain_openai import OpenAI
 from langchain_community.llms import FakeListLLM
+from langchain_core.language_models import BaseLanguageModel
+from langchain_openai import ChatOpenAI, OpenAI
+
+DEFAULT_CHAT_MODEL = "gpt-3.5-turbo"  # same as ChatOpenAI()
+
+
+@dataclass(frozen=True)
+class PoolLimits:
+    """HTTP connection pool settings shared by every client of a provider.
+
+    Defaults can be overridden with LLM_POOL_MAX_CONNECTIONS, LLM_POOL_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_POOL_KEEPALIVE_EXPIRY and LLM_POOL_TIMEOUT.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    timeout: float = 120.0
+
+    @classmethod
+    def from_env(cls) -> "PoolLimits":
+        return cls(
+            max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE_CONNECTIONS", cls.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+            timeout=float(os.getenv("LLM_POOL_TIMEOUT", cls.timeout)),
+        )
+
+
+class LLMProvider:
+    """Process-wide OpenAI models sharing one keep-alive HTTP connection pool.
+
+    Models are cached by (class, model, params): asking twice for the same configuration returns the
+    same instance, so TLS and connection setup are paid once per process instead of once per
+    Streamlit rerun or example. Per-request settings such as callbacks should be passed through the
+    runnable config rather than the constructor, because cached instances are shared.
+
+    `base_url` (or `LLM_BASE_URL`) points every model at an OpenAI compatible endpoint such as
+    `FakeOpenAIServer` for offline load tests.
+
+    Models are not cached: wrap a deterministic call site with `with_cache` (src/libs/llm_cache.py).
+    """
+
+    def __init__(
+        self,
+        limits: Optional[PoolLimits] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        self.limits = limits or PoolLimits.from_env()
+        self.base_url = base_url or os.getenv("LLM_BASE_URL")
+        self.api_key = api_key
+        self._http_client = None
+        self._models: Dict[Hashable, BaseLanguageModel] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def http_client(self):
+        if self._http_client is None:
+            import httpx
+
+            with self._lock:
+                if self._http_client is None:
+                    self._http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.limits.max_connections,
+                            max_keepalive_connections=self.limits.max_keepalive_connections,
+                            keepalive_expiry=self.limits.keepalive_expiry,
+                        ),
+                        timeout=self.limits.timeout,
+                    )
+        return self._http_client
+
+    def chat_model(self, model: str = DEFAULT_CHAT_MODEL, **params: Any) -> ChatOpenAI:
+        return self._get(ChatOpenAI, model=model, **params)
+
+    def completion_model(self, **params: Any) -> OpenAI:
+        return self._get(OpenAI, **params)
+
+    def _get(self, cls, **params):
+        key = (cls, json.dumps(params, sort_keys=True, default=repr))
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        http_client = self.http_client
+        with self._lock:
+            if key not in self._models:
+                if self.base_url:
+                    params.setdefault("base_url", self.base_url)
+                if self.api_key:
+                    params.setdefault("api_key", self.api_key)
+                self._models[key] = cls(http_client=http_client, **params)
+            return self._models[key]
+
+    def close(self) -> None:
+        with self._lock:
+            self._models.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+
+provider = LLMProvider()
+
+
+def get_chat_model(model: str = DEFAULT_CHAT_MODEL, **params: Any) -> ChatOpenAI:
+    """Shared ChatOpenAI for `model` and `params`, using the process-wide connection pool."""
+    return provider.chat_model(model=model, **params)
 
 
 def get_llm():
@@ -11,4 +122,4 @@ def get_llm():
             "Final Answer: 4",
         ]
         return FakeListLLM(responses=responses)
-    return OpenAI(temperature=0, streaming=True)
+    return provider.completion_model(temperature=0, streaming=True)
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.load import dumps, loads
+
+DEFAULT_CACHE_PATH = ".cache/llm_cache.sqlite3"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SQLiteLRUCache(BaseCache):
+    """Persistent exact-match cache for LLM and chat model responses.
+
+    Entries are keyed by sha256(prompt, llm_string). LangChain builds `llm_string` from the model name,
+    every invocation param (temperature, tools, response format, ...) and the stop words, so a hit only
+    happens for a byte-identical request to an identically configured model.
+
+    The least recently used entries are evicted once the cache holds more than `max_entries` entries
+    or `max_bytes` of serialized generations. Only deterministic prompts (temperature 0) should be
+    routed through it.
+
+    ```
+    cache = SQLiteLRUCache(".cache/llm_cache.sqlite3")
+    chat = ChatOpenAI(temperature=0, cache=cache)  # or with_cache(chat, cache)
+    ```
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 100_000, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+        # running totals, so an update does not aggregate the whole table
+        self._count, self._size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.stats.hits += 1
+        return loads(row[0], allowed_objects="core")
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = dumps(list(return_val))
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            if replaced is None:
+                self._count += 1
+            self._size += len(value) - (replaced[0] if replaced else 0)
+            self._evict()
+
+    def _evict(self) -> None:
+        excess = self._count - self.max_entries
+        byte_excess = self._size - self.max_bytes
+        if excess <= 0 and byte_excess <= 0:
+            return
+        if byte_excess > 0:
+            # number of least recently used entries whose sizes add up to the byte excess
+            (needed,) = self._conn.execute(
+                "SELECT COUNT(*) FROM (SELECT SUM(size) OVER (ORDER BY accessed_at ROWS UNBOUNDED PRECEDING) - size AS freed_before FROM llm_cache) WHERE freed_before < ?",
+                (byte_excess,),
+            ).fetchone()
+            excess = max(excess, needed)
+        sizes = self._conn.execute("DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?) RETURNING size", (excess,)).fetchall()
+        self._count -= len(sizes)
+        self._size -= sum(size for (size,) in sizes)
+        self.stats.evictions += len(sizes)
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._count, self._size = 0, 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def __bool__(self) -> bool:
+        # LangChain checks `if self.cache`, an empty cache must still be enabled
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[SQLiteLRUCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[SQLiteLRUCache]:
+    """Process-wide cache at LLM_CACHE_PATH, or None when the env var is not set."""
+    global _default_cache
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.path != path:
+            _default_cache = SQLiteLRUCache(path)
+        return _default_cache
+
+
+def with_cache(model: BaseLanguageModel, cache: Optional[BaseCache]) -> BaseLanguageModel:
+    """Copy of `model` that reads and writes `cache`. Returns `model` itself when `cache` is None."""
+    if cache is None:
+        return model
+    return model.model_copy(update={"cache": cache})
+
+
+def cache_stats(caches: Sequence[SQLiteLRUCache]) -> CacheStats:
+    total = CacheStats()
+    for cache in caches:
+        total.hits += cache.stats.hits
+        total.misses += cache.stats.misses
+        total.evictions += cache.stats.evictions
+    return total
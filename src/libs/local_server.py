@@ -0,0 +1,101 @@
+import json
+from abc import ABC, abstractmethod
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class LocalHTTPServer(ABC):
+    """Small threaded HTTP server on 127.0.0.1 used as an offline stand-in for remote APIs.
+
+    Subclasses implement `handle(method, path, query, body)` and return `(status, payload)`.
+    The payload is sent as JSON, or as a chunked `text/event-stream` when it is an iterator of bytes.
+    `latency` (seconds) is slept before every response to emulate network round trips.
+    `clients` records the client addresses seen, i.e. one entry per TCP connection.
+
+    ```
+    with MyServer(latency=0.05) as server:
+        client = SomeClient(base_url=server.url)
+    ```
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.request_count = 0
+        self.clients = set()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @abstractmethod
+    def handle(self, method: str, path: str, query: dict, body: Any) -> Tuple[int, Any]:
+        """`(status, payload)` of a request; `query` is parsed with `parse_qs`, `body` is the decoded JSON or None."""
+
+    def start(self) -> "LocalHTTPServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with server._lock:
+                    server.request_count += 1
+                    server.clients.add(self.client_address)
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = server.handle(method, parsed.path, parse_qs(parsed.query), body)
+                if isinstance(payload, Iterator):
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in payload:
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
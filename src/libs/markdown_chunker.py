@@ -0,0 +1,154 @@
+import mmap
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from src.libs.splitter import next_span
+
+# code block, paragraph, line, sentence, clause, word, byte (moved back to a UTF-8 character boundary)
+MARKDOWN_SEPARATORS = (b"\n```\n", b"\n\n", b"\n", "。".encode(), "、".encode(), b" ", b"")
+
+# a fence opens with an optional info string (```python) and is closed by a bare fence of the same character, at least as long
+_HEADER_OR_FENCE = re.compile(rb"^(?:(`{3,}|~{3,})([^\r\n]*?)|(#{1,6})[ \t]+([^\r\n]*?)[ \t#]*)\r?$", re.MULTILINE)
+_WHITESPACE = b" \t\r\n"
+
+
+def chunk_metadata(source: str, offset: int, length: int, headers: Sequence[str]) -> dict:
+    metadata = {"source": source, "offset": offset, "length": length}
+    # same keys as MarkdownHeaderTextSplitter
+    metadata.update({f"Header {level}": title for level, title in enumerate(headers, start=1) if title})
+    return metadata
+
+
+@dataclass(frozen=True)
+class MarkdownChunk:
+    """View of `length` bytes at `offset` in a memory-mapped markdown file. `text` is decoded on demand.
+
+    A chunk keeps the mapping of its file alive, so `text` still works after the `MarkdownFile` is closed.
+    """
+
+    file: "MarkdownFile"
+    offset: int
+    length: int
+    headers: Tuple[str, ...]
+
+    @property
+    def text(self) -> str:
+        return self.file.mm[self.offset : self.offset + self.length].decode("utf-8")
+
+    @property
+    def metadata(self) -> dict:
+        return chunk_metadata(self.file.path, self.offset, self.length, self.headers)
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.text, metadata=self.metadata)
+
+
+class MarkdownFile:
+    """Memory-mapped markdown file split into header sections and byte-size bounded chunks.
+
+    The file is never read as a whole: headers are found with a regex over the mmap, chunk boundaries with
+    `rfind` in a `chunk_size` byte window, and every chunk is an offset/length view. RSS stays flat even for
+    multi-gigabyte exports, since the pages are backed by the file and can be dropped by the OS.
+
+    A chunk never spans two sections. Headers inside fenced code blocks are ignored.
+
+    `close` (or leaving the `with` block) closes the file descriptor; the mapping itself is released once the
+    `MarkdownFile` and all of its chunks are garbage collected, so chunks stay readable after the block.
+
+    ```
+    with MarkdownFile("docs/langchain/agent/03_react_custom.md") as md:
+        for chunk in md.chunks(chunk_size=1000):
+            print(chunk.headers, chunk.offset, chunk.length)
+    ```
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._file = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file cannot be mapped
+            self.mm = b""
+
+    def close(self) -> None:
+        # the mapping does not need the descriptor; chunks may still read it
+        self._file.close()
+
+    def __enter__(self) -> "MarkdownFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def sections(self) -> Iterator[Tuple[int, int, Tuple[str, ...]]]:
+        """(start, end, headers) of every section, headers being the titles of the enclosing `#` .. `######`."""
+        headers: List[Optional[str]] = []
+        start, in_fence = 0, None
+        for match in _HEADER_OR_FENCE.finditer(self.mm):
+            fence, info, level, title = match.groups()
+            if fence:
+                if in_fence is None:
+                    in_fence = fence
+                elif fence[0] == in_fence[0] and len(fence) >= len(in_fence) and not info.strip():
+                    in_fence = None
+                continue
+            if in_fence:
+                continue
+            yield start, match.start(), _titles(headers)
+            depth = len(level)
+            headers = headers[: depth - 1] + [None] * max(depth - 1 - len(headers), 0)
+            headers.append(title.decode("utf-8", errors="replace"))
+            start = match.start()
+        yield start, len(self.mm), _titles(headers)
+
+    def chunks(self, chunk_size: int = 1000, chunk_overlap: int = 0, separators=MARKDOWN_SEPARATORS) -> Iterator[MarkdownChunk]:
+        """Chunks of at most `chunk_size` bytes with surrounding whitespace excluded."""
+        for section_start, section_end, headers in self.sections():
+            for offset, length in self.section_spans(section_start, section_end, chunk_size, chunk_overlap, separators):
+                yield MarkdownChunk(self, offset, length, headers)
+
+    def section_spans(self, start: int, end: int, chunk_size: int = 1000, chunk_overlap: int = 0, separators=MARKDOWN_SEPARATORS) -> Iterator[Tuple[int, int]]:
+        """(offset, length) of the chunks of mm[start:end]. A section is chunked independently of the others."""
+        if chunk_overlap >= chunk_size or chunk_size < 4:
+            raise ValueError(f"chunk_size ({chunk_size}) must be at least 4 bytes and larger than chunk_overlap ({chunk_overlap})")
+        mm = self.mm
+        while start < end:
+            cut, next_start = next_span(mm, start, end, chunk_size, chunk_overlap, separators)
+            # a hard cut can land inside a multi-byte character; chunk_size >= 4 keeps at least one character
+            overlap = next_start != cut
+            cut = _char_start(mm, cut, backward=True)
+            next_start = _char_start(mm, next_start, backward=False) if overlap else cut
+            chunk_start, chunk_end = _strip(mm, start, cut)
+            if chunk_start < chunk_end:
+                yield chunk_start, chunk_end - chunk_start
+            start = next_start
+
+
+def _titles(headers: List[Optional[str]]) -> Tuple[str, ...]:
+    return tuple(title or "" for title in headers)
+
+
+def _char_start(mm, position: int, backward: bool) -> int:
+    """Nearest UTF-8 character start at or before (`backward`) / after `position`."""
+    step = -1 if backward else 1
+    while 0 < position < len(mm) and mm[position] & 0xC0 == 0x80:
+        position += step
+    return position
+
+
+def _strip(mm, start: int, end: int) -> Tuple[int, int]:
+    while start < end and mm[start] in _WHITESPACE:
+        start += 1
+    while end > start and mm[end - 1] in _WHITESPACE:
+        end -= 1
+    return start, end
+
+
+def iter_markdown_chunks(path: str, chunk_bytes: int = 1000, chunk_overlap_bytes: int = 0) -> Iterator[Document]:
+    """Documents for the chunks (at most `chunk_bytes` UTF-8 bytes) of the markdown file at `path`, decoded one at a time."""
+    with MarkdownFile(path) as md:
+        for chunk in md.chunks(chunk_size=chunk_bytes, chunk_overlap=chunk_overlap_bytes):
+            yield chunk.to_document()
@@ -0,0 +1,137 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+from src.libs.hybrid_search import BM25Index
+from src.libs.search import normalize_query
+
+
+def normalize_title(title: str) -> str:
+    """`Fumio_Kishida`, `fumio kishida` and `Ｆｕｍｉｏ Kishida` are the same page."""
+    return normalize_query(title.replace("_", " "))
+
+
+def _read_dump(dump: Union[str, Iterable[Dict[str, Any]]]) -> Iterable[Dict[str, Any]]:
+    if not isinstance(dump, (str, os.PathLike)):
+        yield from dump
+        return
+    with open(dump, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _blob(texts: List[bytes]) -> tuple:
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    return b"".join(texts), offsets
+
+
+class OfflineWikipedia(Docstore):
+    """Drop-in replacement for `langchain_community.docstore.Wikipedia` reading a local dump.
+
+    `build` turns a Wikipedia-style JSONL dump (`{"title", "text", "url", "redirects"}` per line, as written by
+    WikiExtractor, `redirects` optional) into an index directory:
+
+    - `pages.npy` / `page_offsets.npy`: the pages (UTF-8 JSON), read by offset
+    - `titles.npy` / `title_offsets.npy` / `title_pages.npy`: normalized titles and redirects sorted for binary
+      search, so opening the index and looking a title up do not load the dump
+    - `bm25_*`: inverted index over titles and text, for the `Similar: [...]` suggestions of a missing page
+
+    The arrays are memory-mapped, a search is O(log pages) and needs no network, and `DocstoreExplorer.lookup`
+    works unchanged on the returned Document.
+
+    ```
+    OfflineWikipedia.build("enwiki.jsonl", "index")
+    docstore = DocstoreExplorer(OfflineWikipedia("index"))
+    ```
+    """
+
+    def __init__(self, directory: str, mmap: bool = True, similar: int = 5):
+        directory = Path(directory)
+        mode = "r" if mmap else None
+        self.similar = similar
+        self._pages = np.load(directory / "pages.npy", mmap_mode=mode)
+        self._page_offsets = np.load(directory / "page_offsets.npy", mmap_mode=mode)
+        self._titles = np.load(directory / "titles.npy", mmap_mode=mode)
+        self._title_offsets = np.load(directory / "title_offsets.npy", mmap_mode=mode)
+        self._title_pages = np.load(directory / "title_pages.npy", mmap_mode=mode)
+        self._bm25 = BM25Index.load(directory, mmap=mmap)
+
+    @classmethod
+    def build(cls, dump: Union[str, Iterable[Dict[str, Any]]], directory: str, **kwargs: Any) -> "OfflineWikipedia":
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        pages, keys, redirects, searchable = [], {}, [], []
+        for page_id, page in enumerate(_read_dump(dump)):
+            pages.append(json.dumps({"title": page["title"], "url": page.get("url"), "text": page["text"]}, ensure_ascii=False).encode("utf-8"))
+            searchable.append(f"{page['title']}\n{page['text']}")
+            keys.setdefault(normalize_title(page["title"]).encode("utf-8"), page_id)
+            redirects.extend((title, page_id) for title in page.get("redirects", []))
+        # a page title wins over a redirect of the same name, the first page wins a title
+        for title, page_id in redirects:
+            keys.setdefault(normalize_title(title).encode("utf-8"), page_id)
+        sorted_keys = sorted(keys)
+        blob, page_offsets = _blob(pages)
+        titles, title_offsets = _blob(sorted_keys)
+        arrays = {
+            "pages": np.frombuffer(blob, dtype=np.uint8),
+            "page_offsets": page_offsets,
+            "titles": np.frombuffer(titles, dtype=np.uint8),
+            "title_offsets": title_offsets,
+            "title_pages": np.asarray([keys[key] for key in sorted_keys], dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.tmp.npy", array)
+        for name in arrays:
+            os.replace(directory / f"{name}.tmp.npy", directory / f"{name}.npy")
+        BM25Index.from_texts(searchable).save(directory)
+        return cls(directory, **kwargs)
+
+    @classmethod
+    def open(cls, directory: str, dump: Optional[str] = None, **kwargs: Any) -> "OfflineWikipedia":
+        """Index at `directory`, built from `dump` first when it is missing or older than the dump."""
+        pages = Path(directory) / "pages.npy"
+        if dump is not None and (not pages.exists() or pages.stat().st_mtime < os.stat(dump).st_mtime):
+            return cls.build(dump, directory, **kwargs)
+        return cls(directory, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._page_offsets) - 1
+
+    def _title(self, i: int) -> bytes:
+        return self._titles[self._title_offsets[i] : self._title_offsets[i + 1]].tobytes()
+
+    def _page(self, page_id: int) -> Dict[str, Any]:
+        return json.loads(self._pages[self._page_offsets[page_id] : self._page_offsets[page_id + 1]].tobytes())
+
+    def page_id(self, title: str) -> Optional[int]:
+        """Page of `title` or of a redirect named `title`."""
+        key = normalize_title(title).encode("utf-8")
+        low, high = 0, len(self._title_pages)
+        while low < high:
+            middle = (low + high) // 2
+            if self._title(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._title_pages) and self._title(low) == key:
+            return int(self._title_pages[low])
+        return None
+
+    def titles_like(self, search: str, k: Optional[int] = None) -> List[str]:
+        _, ids = self._bm25.search(search, k=k or self.similar)
+        return [self._page(int(i))["title"] for i in ids]
+
+    def search(self, search: str) -> Union[str, Document]:
+        """The page titled `search` as a Document, or `Could not find [...]. Similar: [...]` like `Wikipedia`."""
+        page_id = self.page_id(search)
+        if page_id is None:
+            return f"Could not find [{search}]. Similar: {self.titles_like(search)}"
+        page = self._page(page_id)
+        return Document(page_content=page["text"], metadata={"page": page["url"] or page["title"]})
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.agents import AgentAction
+
+
+@dataclass
+class ObservationCompaction:
+    """Shorten old observations once the scratchpad exceeds `max_tokens`.
+
+    The observations of all but the last `keep_recent` steps are cut to `max_chars` characters, or replaced by
+    `summarize(observation)` when given. A compacted step is never rewritten again, so the beginning of the
+    prompt stays the same from one iteration to the next. `count_tokens` counts characters by default, pass
+    `llm.get_num_tokens` to count model tokens.
+    """
+
+    max_tokens: int
+    keep_recent: int = 2
+    max_chars: int = 200
+    summarize: Optional[Callable[[str], str]] = None
+    count_tokens: Callable[[str], int] = len
+
+    def compact(self, observation: str) -> str:
+        if self.summarize is not None:
+            return self.summarize(observation)
+        if len(observation) <= self.max_chars:
+            return observation
+        return f"{observation[: self.max_chars]}... ({len(observation) - self.max_chars} characters omitted)"
+
+
+class _Run:
+    def __init__(self, first: AgentAction):
+        self.first = first
+        self.last: Optional[Tuple[AgentAction, object]] = None
+        self.heads: List[str] = []
+        self.observations: List[str] = []
+        self.compacted = 0  # steps [0, compacted) are compacted
+        self.tokens = 0
+        self.text = ""
+
+
+class IncrementalScratchpad:
+    """`agent_scratchpad` built by appending only the steps added since the previous call.
+
+    An AgentExecutor run passes the same growing `intermediate_steps` to every planning call; rebuilding the
+    scratchpad from scratch each time makes a long tool chain quadratic in string building. The text of each run
+    is kept (for the last `max_runs` runs) and extended with the new steps, and rebuilt when the steps are not a
+    continuation of the cached ones. The output is the same as `format_log_to_str` and
+    `Agent._construct_scratchpad`.
+
+    With `group_actions`, consecutive actions with the same log (several actions of one step) write the log once
+    followed by one observation line per action. With `compaction`, old observations are shortened once the
+    scratchpad exceeds the token budget.
+
+    ```
+    scratchpad = IncrementalScratchpad(compaction=ObservationCompaction(max_tokens=2000))
+    agent = RunnablePassthrough.assign(agent_scratchpad=lambda x: scratchpad.format(x["intermediate_steps"])) | prompt | llm | parser
+    ```
+    """
+
+    def __init__(
+        self,
+        observation_prefix: str = "Observation: ",
+        llm_prefix: str = "Thought: ",
+        compaction: Optional[ObservationCompaction] = None,
+        group_actions: bool = False,
+        max_runs: int = 128,
+    ):
+        self.observation_prefix = observation_prefix
+        self.llm_prefix = llm_prefix
+        self.compaction = compaction
+        self.group_actions = group_actions
+        self.max_runs = max_runs
+        self._runs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def format(self, intermediate_steps: Sequence[Tuple[AgentAction, object]]) -> str:
+        if not intermediate_steps:
+            return ""
+        first = intermediate_steps[0][0]
+        with self._lock:
+            # the run holds a reference to its first action, so the id is not reused while it is cached
+            run = self._runs.get(id(first))
+            if run is not None:
+                self._runs.move_to_end(id(first))
+            if run is None or not self._continues(run, intermediate_steps):
+                run = self._runs[id(first)] = _Run(first)
+                while len(self._runs) > self.max_runs:
+                    self._runs.popitem(last=False)
+        # one run is planned by one thread at a time
+        self._extend(run, intermediate_steps)
+        return f"{run.text}\n{self.llm_prefix}"
+
+    @staticmethod
+    def _continues(run: _Run, steps: Sequence[Tuple[AgentAction, object]]) -> bool:
+        count = len(run.heads)
+        return len(steps) >= count and (count == 0 or (steps[count - 1][0] is run.last[0] and steps[count - 1][1] is run.last[1]))
+
+    def _extend(self, run: _Run, steps: Sequence[Tuple[AgentAction, object]]) -> None:
+        start = len(run.heads)
+        if start == len(steps):
+            return
+        added = []
+        for i in range(start, len(steps)):
+            action, observation = steps[i]
+            previous = steps[i - 1][0] if i else None
+            head = ""
+            if previous is None or not self.group_actions or previous.log != action.log:
+                head = (f"\n{self.llm_prefix}" if previous is not None else "") + action.log
+            head += f"\n{self.observation_prefix}"
+            run.heads.append(head)
+            run.observations.append(str(observation))
+            added.append(head + run.observations[-1])
+        run.last = steps[-1]
+        text = "".join(added)
+        run.text += text
+        if self.compaction is not None:
+            run.tokens += self.compaction.count_tokens(text)
+            self._compact(run)
+
+    def _compact(self, run: _Run) -> None:
+        compaction = self.compaction
+        end = len(run.heads) - compaction.keep_recent
+        if run.tokens <= compaction.max_tokens or end <= run.compacted:
+            return
+        for i in range(run.compacted, end):
+            run.observations[i] = compaction.compact(run.observations[i])
+        run.compacted = end
+        run.text = "".join(head + observation for head, observation in zip(run.heads, run.observations))
+        run.tokens = compaction.count_tokens(run.text)
@@ -0,0 +1,281 @@
+import asyncio
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from src.libs.local_server import LocalHTTPServer
+
+GOOGLE_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+NO_RESULT_MESSAGE = "No good Google Search Result was found"
+
+_MISSING = object()
+# set on the future of a cancelled request: the waiters send the request again instead of failing
+_RETRY = object()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that trivially different spellings share one cache entry.
+
+    "Japan's  Prime Minister " and "japan's prime minister" are the same query.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after they are set."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.0, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= self._timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (self._timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class GoogleSearchBackend:
+    """Google Custom Search client with a keep-alive connection pool, a TTL+LRU result cache
+    and in-flight request merging.
+
+    Drop-in replacement for `GoogleSearchAPIWrapper.results` (same arguments, same result format).
+    Nothing is imported or validated until the first search, so constructing it is cheap.
+
+    - identical (normalized) queries are answered from the cache until `ttl` expires
+    - concurrent identical queries, sync or async, wait for the single request already in flight
+    - `base_url` (or `GOOGLE_SEARCH_BASE_URL`) can point at `LocalSearchServer` for offline load tests
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cse_id: Optional[str] = None,
+        base_url: Optional[str] = None,
+        cache_size: int = 1024,
+        ttl: float = 600.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        timeout: float = 10.0,
+    ):
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self.cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self.stats = {"hits": 0, "misses": 0, "merged": 0, "requests": 0}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+    def results(self, query: str, num_results: int, search_params: Optional[Dict[str, str]] = None) -> List[Dict]:
+        key = self._key(query, num_results, search_params)
+        cached = self._lookup(key)
+        if cached is not _MISSING:
+            return cached
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            results = future.result()
+            if results is not _RETRY:
+                return _copy(results)
+        try:
+            results = self._to_results(self._request(self._get_client().get, query, num_results, search_params))
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, results=results)
+        return _copy(results)
+
+    async def aresults(self, query: str, num_results: int, search_params: Optional[Dict[str, str]] = None) -> List[Dict]:
+        key = self._key(query, num_results, search_params)
+        cached = self._lookup(key)
+        if cached is not _MISSING:
+            return cached
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            # shielded: a cancelled waiter must not cancel the request the other waiters share
+            results = await asyncio.shield(asyncio.wrap_future(future))
+            if results is not _RETRY:
+                return _copy(results)
+        try:
+            response = await self._request(self._get_async_client().get, query, num_results, search_params)
+            results = self._to_results(response)
+        except asyncio.CancelledError:
+            # only the leader was cancelled, one of the waiters takes over
+            self._finish(key, future, results=_RETRY)
+            raise
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, results=results)
+        return _copy(results)
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _key(self, query, num_results, search_params) -> Hashable:
+        return (normalize_query(query), num_results, tuple(sorted((search_params or {}).items())))
+
+    def _lookup(self, key):
+        cached = self.cache.get(key, _MISSING)
+        with self._lock:
+            self.stats["hits" if cached is not _MISSING else "misses"] += 1
+        return cached if cached is _MISSING else _copy(cached)
+
+    def _join(self, key) -> Tuple[Future, bool]:
+        """Return the future for `key` and whether the caller has to send the request itself."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["merged"] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.stats["requests"] += 1
+            return future, True
+
+    def _finish(self, key, future: Future, results=None, exception=None) -> None:
+        if exception is None and results is not _RETRY:
+            self.cache.set(key, results)
+        with self._lock:
+            self._inflight.pop(key, None)
+        if exception is None:
+            future.set_result(results)
+        else:
+            future.set_exception(exception)
+
+    def _request(self, get, query, num_results, search_params):
+        params = {
+            "key": self.api_key or os.environ["GOOGLE_API_KEY"],
+            "cx": self.cse_id or os.environ["GOOGLE_CSE_ID"],
+            "q": query,
+            "num": num_results,
+            **(search_params or {}),
+        }
+        return get(self._base_url(), params=params)
+
+    def _base_url(self) -> str:
+        return self.base_url or os.getenv("GOOGLE_SEARCH_BASE_URL") or GOOGLE_SEARCH_URL
+
+    def _limits(self):
+        import httpx
+
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive_connections)
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(limits=self._limits(), timeout=self.timeout)
+        return self._client
+
+    def _get_async_client(self):
+        # httpx.AsyncClient connections belong to the loop they were opened on
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            for closed in [lp for lp in self._async_clients if lp.is_closed()]:
+                del self._async_clients[closed]
+            client = httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _to_results(response) -> List[Dict]:
+        response.raise_for_status()
+        items = response.json().get("items", [])
+        if len(items) == 0:
+            return [{"Result": NO_RESULT_MESSAGE}]
+        results = []
+        for item in items:
+            result = {"title": item["title"], "link": item["link"]}
+            if "snippet" in item:
+                result["snippet"] = item["snippet"]
+            results.append(result)
+        return results
+
+
+def _copy(results: List[Dict]) -> List[Dict]:
+    return [dict(r) for r in results]
+
+
+def default_items(query: str, num: int) -> List[Dict]:
+    return [
+        {
+            "title": f"{query} - result {i}",
+            "link": f"https://example.com/search/{i}?q={query}",
+            "snippet": f"Snippet {i} for {query}",
+        }
+        for i in range(1, num + 1)
+    ]
+
+
+class LocalSearchServer(LocalHTTPServer):
+    """Offline stand-in for the Custom Search JSON API.
+
+    `responder(query, num)` returns the `items` for a query (deterministic synthetic results by default).
+    `queries` records every query the server actually received.
+    """
+
+    def __init__(self, responder: Callable[[str, int], List[Dict]] = default_items, latency: float = 0.0, **kwargs):
+        super().__init__(latency=latency, **kwargs)
+        self.responder = responder
+        self.queries: List[str] = []
+
+    @property
+    def url(self) -> str:
+        return f"{super().url}/customsearch/v1"
+
+    def handle(self, method, path, query, body):
+        if path != "/customsearch/v1":
+            return 404, {"error": {"code": 404, "message": f"unknown path {path}"}}
+        q = query.get("q", [""])[0]
+        num = int(query.get("num", ["10"])[0])
+        with self._lock:
+            self.queries.append(q)
+        return 200, {"items": self.responder(q, num)}
@@ -0,0 +1,180 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+
+# paragraph, line, sentence (。！？), clause (、), word, character
+JAPANESE_SEPARATORS = ("\n\n", "\n", "。", "！", "？", "、", " ", "")
+
+
+def _find_cut(text, start: int, end: int, separators: Sequence) -> int:
+    """Position right after the last highest-priority separator in text[start:end], or `end`."""
+    for separator in separators:
+        if not separator:
+            break
+        index = text.rfind(separator, start, end)
+        if index > start:
+            return index + len(separator)
+    return end
+
+
+def next_span(text, start: int, stop: int, chunk_size: int, chunk_overlap: int, separators: Sequence) -> Tuple[int, int]:
+    """End of the chunk beginning at `start` and start of the following one, within text[:stop].
+
+    Works on anything with `find` / `rfind(sub, start, end)`: str, bytes or mmap.
+    """
+    end = min(start + chunk_size, stop)
+    cut = end if end == stop else _find_cut(text, start, end, separators)
+    if not chunk_overlap or cut == stop:
+        return cut, cut
+    # restart inside the previous chunk at a boundary so the overlap does not begin mid-word
+    next_start = max(cut - chunk_overlap, start + 1)
+    for separator in separators:
+        if not separator:
+            break
+        index = text.find(separator, next_start, cut)
+        if 0 <= index < cut - len(separator):
+            next_start = index + len(separator)
+            break
+    # like RecursiveCharacterTextSplitter, only overlap when the next piece still fits after it
+    if next_start + chunk_size < stop and _find_cut(text, next_start, next_start + chunk_size, separators) <= cut:
+        return cut, cut
+    return cut, next_start
+
+
+def iter_split(
+    fragments: Iterable[str],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 0,
+    separators: Sequence[str] = JAPANESE_SEPARATORS,
+    strip_whitespace: bool = True,
+) -> Iterator[str]:
+    """Split a text given as a stream of fragments into chunks of at most `chunk_size` characters.
+
+    Each chunk ends at the last occurrence of the highest priority separator that fits in the window,
+    which packs paragraphs (then lines, sentences, ...) greedily like RecursiveCharacterTextSplitter, but
+    in one pass with `str.rfind` instead of recursive regex splits. Separators are kept at the end of
+    the chunk so `。` stays with its sentence. Only about one window of text is buffered, so `fragments`
+    can be a file object or any generator over a corpus that does not fit in memory.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+    # next_span looks at most one more window ahead when checking the overlap
+    lookahead = (2 if chunk_overlap else 1) * chunk_size + max(map(len, separators), default=0)
+    buffer = ""
+    for fragment in fragments:
+        buffer += fragment
+        if len(buffer) < 2 * lookahead:
+            continue
+        start = 0
+        while len(buffer) - start > lookahead:
+            cut, next_start = next_span(buffer, start, len(buffer), chunk_size, chunk_overlap, separators)
+            yield from _chunk(buffer[start:cut], strip_whitespace)
+            start = next_start
+        buffer = buffer[start:]
+    start = 0
+    while start < len(buffer):
+        cut, next_start = next_span(buffer, start, len(buffer), chunk_size, chunk_overlap, separators)
+        yield from _chunk(buffer[start:cut], strip_whitespace)
+        start = next_start
+
+
+def _chunk(text: str, strip_whitespace: bool) -> Iterator[str]:
+    if strip_whitespace:
+        text = text.strip()
+    if text:
+        yield text
+
+
+def _split_batch(config: Tuple[int, int, Tuple[str, ...], bool], texts: List[str]) -> List[List[str]]:
+    chunk_size, chunk_overlap, separators, strip_whitespace = config
+    return [list(iter_split([text], chunk_size, chunk_overlap, separators, strip_whitespace)) for text in texts]
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class JapaneseTextSplitter(TextSplitter):
+    """Streaming text splitter aware of Japanese punctuation, with process pool fan-out for large corpora.
+
+    Drop-in `TextSplitter` (`split_text`, `create_documents`, `split_documents`, `load_and_split`), plus
+
+    - `iter_split(fragments)`: chunks of one text streamed from a generator / file object
+    - `split_corpus(texts)`: chunks of many texts, batched across `processes` workers, in input order
+
+    Chunk length is measured in characters.
+
+    ```
+    splitter = JapaneseTextSplitter(chunk_size=1000, processes=8)
+    for chunks in splitter.split_corpus(read_texts()):
+        ...
+    ```
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 0,
+        separators: Sequence[str] = JAPANESE_SEPARATORS,
+        processes: int = 1,
+        batch_chars: int = 1 << 20,
+        **kwargs: Any,
+    ):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self.separators = tuple(separators)
+        self.processes = processes
+        self.batch_chars = batch_chars
+
+    @property
+    def _config(self) -> Tuple[int, int, Tuple[str, ...], bool]:
+        return self._chunk_size, self._chunk_overlap, self.separators, self._strip_whitespace
+
+    def iter_split(self, fragments: Iterable[str]) -> Iterator[str]:
+        return iter_split(fragments, *self._config)
+
+    def split_text(self, text: str) -> List[str]:
+        return list(self.iter_split([text]))
+
+    def split_corpus(self, texts: Iterable[str], executor: Optional[Executor] = None) -> Iterator[List[str]]:
+        """Chunks of every text in `texts`, in order. `texts` is consumed lazily in batches of about `batch_chars`."""
+        if self.processes == 1 and executor is None:
+            for text in texts:
+                yield self.split_text(text)
+            return
+        own_executor = executor is None
+        executor = executor or ProcessPoolExecutor(max_workers=self.processes, mp_context=_mp_context())
+        try:
+            pending = deque()
+            for batch in self._batches(texts):
+                pending.append(executor.submit(_split_batch, self._config, batch))
+                # bounded read-ahead keeps memory flat on large corpora
+                while len(pending) > 2 * self.processes:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
+
+    def iter_documents(self, texts: Iterable[str], metadatas: Optional[Iterable[dict]] = None) -> Iterator[Document]:
+        metadatas = iter(metadatas) if metadatas is not None else None
+        for chunks in self.split_corpus(texts):
+            metadata = next(metadatas) if metadatas is not None else {}
+            for chunk in chunks:
+                yield Document(page_content=chunk, metadata=dict(metadata))
+
+    def _batches(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        batch, size = [], 0
+        for text in texts:
+            batch.append(text)
+            size += len(text)
+            if size >= self.batch_chars:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
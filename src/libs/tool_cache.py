@@ -0,0 +1,145 @@
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.tools import BaseTool
+
+from src.libs.search import TTLCache
+
+_MISSING = object()
+# arguments LangChain injects into the tool function, not part of the tool input
+_INJECTED = frozenset({"callbacks", "run_manager", "config"})
+
+
+@dataclass
+class ToolCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ToolCache:
+    """Results of pure tools by (tool name, arguments): a TTL+LRU cache in memory, optionally backed by SQLite.
+
+    One cache is meant to be shared by every AgentExecutor of the process, so a tool is not called twice for the
+    same input across turns and sessions. With `path`, results that are JSON serializable are also written to
+    disk and survive restarts (until `ttl` expires). Per tool hit rates are in `stats`.
+
+    ```
+    cache = ToolCache(maxsize=10_000, ttl=3600, path=".cache/tool_cache.sqlite3")
+    tools = memoize_tools(tools, cache, impure=["Llm"])
+    ```
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0, path: Optional[str] = None, timer: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.path = path
+        self.stats: Dict[str, ToolCacheStats] = {}
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is not None:
+            if path != ":memory:" and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tool_cache (tool TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (tool, key))")
+
+    def lookup(self, tool: str, key: str) -> Any:
+        """Cached result, or `_MISSING`."""
+        value = self._memory.get((tool, key), _MISSING)
+        if value is _MISSING and self._conn is not None:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM tool_cache WHERE tool = ? AND key = ? AND expires_at > ?", (tool, key, self._timer())).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._memory.set((tool, key), value)
+        with self._lock:
+            stats = self.stats.setdefault(tool, ToolCacheStats())
+            if value is _MISSING:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+        return value
+
+    def update(self, tool: str, key: str, value: Any) -> None:
+        self._memory.set((tool, key), value)
+        if self._conn is None:
+            return
+        try:
+            serialized = json.dumps(value, ensure_ascii=False)
+        except TypeError:
+            return  # kept in memory only
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO tool_cache (tool, key, value, expires_at) VALUES (?, ?, ?, ?)", (tool, key, serialized, self._timer() + self.ttl))
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM tool_cache")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+
+
+def _key(args: tuple, kwargs: Dict[str, Any]) -> str:
+    arguments = {name: value for name, value in kwargs.items() if name not in _INJECTED}
+    return json.dumps([args, arguments], ensure_ascii=False, sort_keys=True, default=repr)
+
+
+def memoize_tool(tool: BaseTool, cache: ToolCache, pure: bool = True) -> BaseTool:
+    """Copy of a `Tool` or `StructuredTool` whose results are looked up in `cache` first.
+
+    Only pure tools (same input, same result, no side effect) may be memoized; an impure tool is returned as is.
+    Errors are not cached.
+    """
+    if not pure:
+        return tool
+    update = {}
+    if getattr(tool, "func", None) is not None:
+        func = tool.func
+
+        @functools.wraps(func)
+        def memoized(*args, **kwargs):
+            key = _key(args, kwargs)
+            value = cache.lookup(tool.name, key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                cache.update(tool.name, key, value)
+            return value
+
+        update["func"] = memoized
+    if getattr(tool, "coroutine", None) is not None:
+        coroutine = tool.coroutine
+
+        @functools.wraps(coroutine)
+        async def amemoized(*args, **kwargs):
+            key = _key(args, kwargs)
+            value = cache.lookup(tool.name, key)
+            if value is _MISSING:
+                value = await coroutine(*args, **kwargs)
+                cache.update(tool.name, key, value)
+            return value
+
+        update["coroutine"] = amemoized
+    if not update:
+        raise TypeError(f"{type(tool).__name__} {tool.name!r} has no func or coroutine to memoize")
+    return tool.model_copy(update=update)
+
+
+def memoize_tools(tools: Sequence[BaseTool], cache: ToolCache, impure: Sequence[str] = ()) -> List[BaseTool]:
+    """`tools` memoized with `cache`, except the tools named in `impure`."""
+    return [memoize_tool(tool, cache, pure=tool.name not in impure) for tool in tools]
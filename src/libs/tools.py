@@ -1,5 +1,61 @@
-from langchain_google_community import GoogleSearchAPIWrapper
-from langchain_core.tools import Tool
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from src.libs.search import GoogleSearchBackend
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+
+class ToolRegistry:
+    """Registry of tool factories looked up by tool name.
+
+    A tool is built by its factory the first time it is requested and reused afterwards,
+    so importing this module does not import langchain or any search client.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], "BaseTool"]] = {}
+        self._tools: Dict[str, "BaseTool"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Optional[Callable[[], "BaseTool"]] = None):
+        """Register `factory` for `name`. Can be used as a decorator."""
+
+        def decorator(factory):
+            with self._lock:
+                self._factories[name] = factory
+                self._tools.pop(name, None)
+            return factory
+
+        return decorator(factory) if factory is not None else decorator
+
+    def get(self, name: str) -> "BaseTool":
+        tool = self._tools.get(name)
+        if tool is not None:
+            return tool
+        with self._lock:
+            if name not in self._tools:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown tool {name!r}. Available tools: {self.names()}")
+                self._tools[name] = self._factories[name]()
+            return self._tools[name]
+
+    def names(self) -> List[str]:
+        return sorted(self._factories)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._tools
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+
+registry = ToolRegistry()
+
+
+def get_tool(name: str) -> "BaseTool":
+    return registry.get(name)
 
 
 def multiplier(a, b):
@@ -11,24 +67,66 @@ def parsing_multiplier(string):
     return multiplier(int(a), int(b))
 
 
-google = GoogleSearchAPIWrapper()
+google = GoogleSearchBackend()
 
 
 def top5_results(query):
     return google.results(query, 5)
 
 
-TOOL_PARSE_MULTIPLIER = Tool(
-    name="Multiplier",
-    func=parsing_multiplier,
-    description=(
-        "useful for when you need to multiply two numbers together. "
-        "The input to this tool should be a comma separated list of numbers of length two, representing the two numbers you want to multiply together. "
-        "For example, `1,2` would be the input if you wanted to multiply 1 by 2."
-    ),
-)
-TOOL_GOOGLE = Tool(
-    name="google-search",
-    description="Search Google for recent results.",
-    func=top5_results,
-)
+async def atop5_results(query):
+    return await google.aresults(query, 5)
+
+
+@registry.register("Multiplier")
+def _create_parse_multiplier_tool():
+    from langchain_core.tools import Tool
+
+    return Tool(
+        name="Multiplier",
+        func=parsing_multiplier,
+        description=(
+            "useful for when you need to multiply two numbers together. "
+            "The input to this tool should be a comma separated list of numbers of length two, representing the two numbers you want to multiply together. "
+            "For example, `1,2` would be the input if you wanted to multiply 1 by 2."
+        ),
+    )
+
+
+@registry.register("BatchArithmetic")
+def _create_batch_arithmetic_tool():
+    from langchain_core.tools import Tool
+
+    from src.libs.arithmetic import BATCH_ARITHMETIC_DESCRIPTION, batch_arithmetic
+
+    return Tool(
+        name="BatchArithmetic",
+        func=batch_arithmetic,
+        description=BATCH_ARITHMETIC_DESCRIPTION,
+    )
+
+
+@registry.register("google-search")
+def _create_google_tool():
+    from langchain_core.tools import Tool
+
+    return Tool(
+        name="google-search",
+        description="Search Google for recent results.",
+        func=top5_results,
+        coroutine=atop5_results,
+    )
+
+
+# module level names kept for `from src.libs.tools import TOOL_GOOGLE`
+_TOOL_ALIASES = {
+    "TOOL_PARSE_MULTIPLIER": "Multiplier",
+    "TOOL_BATCH_ARITHMETIC": "BatchArithmetic",
+    "TOOL_GOOGLE": "google-search",
+}
+
+
+def __getattr__(name):
+    if name in _TOOL_ALIASES:
+        return registry.get(_TOOL_ALIASES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+# ASCII words, or single characters for scripts without spaces (Japanese, Chinese)
+_TOKEN = re.compile(r"[0-9a-z]+|[^\W_]")
+# ranking precision; float32 cosine scores carry about 7 significant digits
+SCORE_DECIMALS = 5
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline embeddings: signed feature hashing of unigrams and bigrams into `dim` dimensions.
+
+    Tokens are ASCII words and single CJK characters, so Japanese text gets character unigrams and
+    bigrams. Deterministic across processes (crc32, not `hash`), no model download and no network,
+    which makes it suitable for tests and local indexes. Vectors are L2-normalized.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(unicodedata.normalize("NFKC", text).casefold())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)), np.asarray(signs, dtype=np.float32))
+        return _normalize(vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed(embeddings: Embeddings, texts: Sequence[str]) -> np.ndarray:
+    """float32 matrix of `texts`, without the list round trip when the embedder supports it."""
+    if hasattr(embeddings, "embed_array"):
+        return embeddings.embed_array(texts)
+    return np.asarray(embeddings.embed_documents(list(texts)), dtype=np.float32)
+
+
+class VectorIndex:
+    """Exact cosine similarity index over L2-normalized float32 vectors.
+
+    - `add` appends in amortized O(1) (capacity doubling)
+    - `search` scores a whole batch of queries with one matrix product and takes the top-k with
+      `argpartition`
+    - `save` writes a `vectors.npy` + `documents.jsonl` snapshot, `load` memory-maps the vectors so
+      opening a large index is instant and pages are shared between processes
+
+    ```
+    index = VectorIndex(dim=256)
+    index.add(embeddings.embed_array(texts), documents)
+    scores, ids = index.search(embeddings.embed_array(["質問"]), k=4)
+    ```
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.documents: List[Document] = []
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[: self._size]
+
+    def add(self, vectors: np.ndarray, documents: Sequence[Document]) -> None:
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        if len(vectors) != len(documents):
+            raise ValueError(f"got {len(vectors)} vectors for {len(documents)} documents")
+        needed = self._size + len(vectors)
+        if needed > len(self._vectors) or not self._vectors.flags.writeable:
+            # a memory-mapped snapshot is read-only: the first append copies it into memory
+            grown = np.empty((max(needed, 2 * len(self._vectors), 16), self.dim), dtype=np.float32)
+            grown[: self._size] = self.vectors
+            self._vectors = grown
+        self._vectors[self._size : needed] = vectors
+        self._size = needed
+        self.documents.extend(documents)
+
+    def search(self, queries: np.ndarray, k: int = 4, batch_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, indices) of shape (len(queries), min(k, len(self))), best first."""
+        queries = _normalize(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        k = min(k, self._size)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        indices = np.empty((len(queries), k), dtype=np.intp)
+        if k == 0:
+            return scores, indices
+        vectors = self.vectors
+        # bounded (batch_size x len(self)) score matrix per step
+        for start in range(0, len(queries), batch_size):
+            similarity = queries[start : start + batch_size] @ vectors.T
+            top = self._top_k(similarity, k)
+            indices[start : start + batch_size] = top
+            scores[start : start + batch_size] = np.take_along_axis(similarity, top, axis=1)
+        return scores, indices
+
+    @staticmethod
+    def _top_k(similarity: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k best columns per row, ordered by (-score, index).
+
+        Scores are rounded before ranking: a single query and a batch go through different BLAS kernels
+        whose results differ in the last bits, and near ties would otherwise come back in a different order.
+        """
+        rounded = np.round(similarity, SCORE_DECIMALS)
+        n = similarity.shape[1]
+        top = np.argpartition(-rounded, k - 1, axis=1)[:, :k] if k < n else np.broadcast_to(np.arange(n), similarity.shape).copy()
+        top_scores = np.take_along_axis(rounded, top, axis=1)
+        kth = top_scores.min(axis=1)
+        for row in np.flatnonzero((rounded >= kth[:, None]).sum(axis=1) > k):
+            # ties at the k-th score: argpartition picks arbitrary ones, keep the lowest indices instead
+            candidates = np.flatnonzero(rounded[row] >= kth[row])
+            top[row] = candidates[np.lexsort((candidates, -rounded[row, candidates]))[:k]]
+            top_scores[row] = rounded[row, top[row]]
+        order = np.lexsort((top, -top_scores), axis=1)
+        return np.take_along_axis(top, order, axis=1)
+
+    def save(self, directory: str) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        # write then rename, so a reader never sees a half written snapshot
+        np.save(directory / "vectors.tmp.npy", self.vectors)
+        with open(directory / "documents.tmp.jsonl", "w", encoding="utf-8") as f:
+            for doc in self.documents:
+                f.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False) + "\n")
+        os.replace(directory / "vectors.tmp.npy", directory / "vectors.npy")
+        os.replace(directory / "documents.tmp.jsonl", directory / "documents.jsonl")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "VectorIndex":
+        directory = Path(directory)
+        vectors = np.load(directory / "vectors.npy", mmap_mode="r" if mmap else None)
+        index = cls(dim=vectors.shape[1])
+        index._vectors = vectors
+        index._size = len(vectors)
+        with open(directory / "documents.jsonl", encoding="utf-8") as f:
+            index.documents = [Document(**json.loads(line)) for line in f]
+        return index
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """Retriever over a `VectorIndex`, e.g. for `langgraph_self_reflection.create_graph`.
+
+    ```
+    retriever = VectorIndexRetriever.from_documents(docs, HashingEmbeddings(), k=4)
+    graph = create_graph(chat, retriever)
+    ```
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: VectorIndex
+    embeddings: Any
+    k: int = 4
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], embeddings: Embeddings, batch_size: int = 1024, **kwargs: Any) -> "VectorIndexRetriever":
+        retriever = None
+        batch: List[Document] = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                retriever = cls._append(retriever, batch, embeddings, **kwargs)
+                batch = []
+        return cls._append(retriever, batch, embeddings, **kwargs)
+
+    @classmethod
+    def _append(cls, retriever: Optional["VectorIndexRetriever"], documents: List[Document], embeddings: Embeddings, **kwargs: Any) -> "VectorIndexRetriever":
+        vectors = embed(embeddings, [doc.page_content for doc in documents]) if documents else None
+        if retriever is None:
+            dim = vectors.shape[1] if vectors is not None else len(embeddings.embed_query(""))
+            retriever = cls(index=VectorIndex(dim), embeddings=embeddings, **kwargs)
+        if vectors is not None:
+            retriever.index.add(vectors, documents)
+        return retriever
+
+    def add_documents(self, documents: Sequence[Document]) -> None:
+        self.index.add(embed(self.embeddings, [doc.page_content for doc in documents]), documents)
+
+    def search_batch(self, queries: Sequence[str], k: Optional[int] = None) -> List[List[Document]]:
+        """Top-k documents for every query with a single embedding call and matrix product."""
+        _, indices = self.index.search(embed(self.embeddings, queries), k=k or self.k)
+        documents = self.index.documents
+        return [[documents[i] for i in row] for row in indices]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_batch([query])[0]
@@ -7,8 +7,7 @@ from langchain_core.runnables.config import RunnableConfig
 from langchain_core.messages import AIMessage, HumanMessage
 from src.examples.agent_react_custom import CUSTOM_PROMPT, tools
 from src.examples.langgraph_agent_supervisor import MemberAgentConfig, construct_graph, construct_supervisor, create_member_agents
-from src.libs.llm import get_llm
-from langchain_openai import ChatOpenAI
+from src.libs.llm import get_chat_model, get_llm
 from src.libs.tools import TOOL_GOOGLE, TOOL_PARSE_MULTIPLIER
 from langchain_experimental.tools.python.tool import PythonAstREPLTool
 from streamlit.delta_generator import DeltaGenerator
@@ -163,7 +162,7 @@ def main():
         llm = get_llm()
         agent_example(llm)
     else:
-        llm = ChatOpenAI(verbose=True, streaming=True)
+        llm = get_chat_model(verbose=True, streaming=True)
         langgraph_example(llm)
 
 
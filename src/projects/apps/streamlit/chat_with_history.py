@@ -5,9 +5,10 @@ from langchain_community.chat_message_histories import (
 )
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
 import streamlit as st
 
+from src.libs.llm import get_chat_model
+
 
 msgs = StreamlitChatMessageHistory(key="langchain_messages")
 
@@ -22,7 +23,7 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-chain = prompt | ChatOpenAI()
+chain = prompt | get_chat_model()
 chain_with_history = RunnableWithMessageHistory(
     chain,
     lambda session_id: msgs,  # Always return the instance created earlier
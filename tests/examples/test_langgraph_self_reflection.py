@@ -1,16 +1,36 @@
-from unittest.mock import MagicMock
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
 from langchain.schema import Document
 from langchain_core.messages import AIMessage
 
-from src.examples.langgraph_self_reflection import create_graph, GradeDocuments, GradeHallucinations, GradeAnswer
+from src.benchmarks.langgraph_self_reflection import LatencyFakeChatModel, SyntheticRetriever, compare, parse_latency, run
+from src.examples.langgraph_self_reflection import create_graph, GradeDocuments, GradeHallucinations, GradeAnswer, GraphMemo, RelevancePrefilter, arun_questions
+from src.libs.dedup import NearDuplicateFilter
+from src.libs.vector_index import HashingEmbeddings
+
+
+def structured_output(relevant=("page1",), latency=0.0, grounded="yes", answered="yes"):
+    """Grader mock answering from the prompt content, since documents are graded concurrently."""
+
+    def grade(prompt_value):
+        text = prompt_value.to_string()
+        time.sleep(latency)
+        if "Retrieved document" in text:
+            return GradeDocuments(binary_score="yes" if any(r in text for r in relevant) else "no")
+        if "Set of facts" in text:
+            return GradeHallucinations(binary_score=grounded)  # hallucination_grader
+        return GradeAnswer(binary_score=answered)  # answer_grader
+
+    return grade
 
 
 def test_graph():
     retriever = MagicMock()
     retriever.invoke.side_effect = [
         [
-            Document(metadata={"title": "Page 1", "source": "http://example.com/page1"}, page_content=""),
-            Document(metadata={"title": "Page 2", "source": "http://example.com/page2"}, page_content=""),
+            Document(metadata={"title": "Page 1", "source": "http://example.com/page1"}, page_content="page1"),
+            Document(metadata={"title": "Page 2", "source": "http://example.com/page2"}, page_content="page2"),
         ],  # retrieve
     ]
 
@@ -23,12 +43,8 @@ def test_graph():
         ),  # rag_chain generate
     ]
 
-    chat_mock.with_structured_output.return_value.side_effect = [
-        GradeDocuments(binary_score="yes"),  # retrieval_grader for the first document
-        GradeDocuments(binary_score="no"),  # retrieval_grader for the second document
-        GradeHallucinations(binary_score="yes"),  # hallucination_grader
-        GradeAnswer(binary_score="yes"),  # answer_grader
-    ]
+    # retrieval_grader: the first document is relevant, the second is not
+    chat_mock.with_structured_output.return_value.side_effect = structured_output(relevant=("page1",))
 
     graph = create_graph(chat=chat_mock, retriever=retriever)
 
@@ -43,6 +59,192 @@ def test_graph():
         "question": "What's the origin of the name 'Sofia'?",
         "generation": expected_output,
         "documents": [
-            Document(metadata={"title": "Page 1", "source": "http://example.com/page1"}, page_content=""),
+            Document(metadata={"title": "Page 1", "source": "http://example.com/page1"}, page_content="page1"),
         ],  # the second document is filtered out by the retrieval_grader
+        "generation_attempts": 1,
     }
+
+
+def test_grade_documents_concurrently_in_order():
+    documents = [Document(page_content=f"doc{i}") for i in range(10)]
+    retriever = MagicMock()
+    retriever.invoke.return_value = documents
+    chat_mock = MagicMock()
+    chat_mock.return_value = AIMessage(content="answer")
+    chat_mock.with_structured_output.return_value.side_effect = structured_output(relevant=("doc7", "doc2", "doc5"), latency=0.1)
+
+    start = time.perf_counter()
+    res = create_graph(chat=chat_mock, retriever=retriever, grade_concurrency=10).invoke({"question": "q"})
+    assert time.perf_counter() - start < 0.1 * 10 / 2  # not ten sequential gradings
+    assert [d.page_content for d in res["documents"]] == ["doc2", "doc5", "doc7"]
+
+
+def test_grade_documents_early_stop():
+    documents = [Document(page_content=f"doc{i}") for i in range(10)]
+    retriever = MagicMock()
+    retriever.invoke.return_value = documents
+    chat_mock = MagicMock()
+    chat_mock.return_value = AIMessage(content="answer")
+    chat_mock.with_structured_output.return_value.side_effect = structured_output(relevant=("doc0", "doc1", "doc2"), latency=0.05)
+
+    res = create_graph(chat=chat_mock, retriever=retriever, grade_concurrency=2, min_relevant=2).invoke({"question": "q"})
+    assert [d.page_content for d in res["documents"]] == ["doc0", "doc1"]
+    # 2 documents graded, 2 more at most in flight when stopping, plus the hallucination and answer graders
+    assert chat_mock.with_structured_output.return_value.call_count <= 6
+
+
+def graph_mocks(documents, **grades):
+    retriever = MagicMock()
+    retriever.invoke.return_value = documents
+    chat_mock = MagicMock()
+    chat_mock.return_value = AIMessage(content="answer")
+    chat_mock.with_structured_output.return_value.side_effect = structured_output(**grades)
+    return chat_mock, retriever
+
+
+def test_parallel_graders():
+    chat_mock, retriever = graph_mocks([Document(page_content="page1")], latency=0.2)
+    start = time.perf_counter()
+    res = create_graph(chat=chat_mock, retriever=retriever, parallel_graders=True).invoke({"question": "q"})
+    elapsed = time.perf_counter() - start
+    assert res["generation"] == "answer"
+    assert elapsed < 0.2 * 3  # document grading + both generation graders at once, instead of 0.2 * 3
+
+
+def test_generation_budget():
+    chat_mock, retriever = graph_mocks([Document(page_content="page1")], grounded="no")
+    res = create_graph(chat=chat_mock, retriever=retriever, max_generations=3).invoke({"question": "q"})
+    assert res["generation_attempts"] == 3
+    assert res["generation"] == "answer"
+
+
+def test_rewrite_budget_and_deadline():
+    chat_mock, retriever = graph_mocks([Document(page_content="unrelated")])
+    res = create_graph(chat=chat_mock, retriever=retriever, max_rewrites=2).invoke({"question": "q"})
+    assert res["rewrites"] == 2
+    assert res["documents"] == []
+    assert res["generation_attempts"] == 1  # generated without documents instead of rewriting forever
+
+    chat_mock, retriever = graph_mocks([Document(page_content="page1")], latency=0.05, answered="no")
+    start = time.perf_counter()
+    res = create_graph(chat=chat_mock, retriever=retriever, deadline_seconds=0.3).invoke({"question": "q"})
+    assert time.perf_counter() - start < 1.0
+    assert res["generation"] == "answer"
+
+
+def test_memo_skips_repeated_rewrites_retrievals_and_gradings():
+    # the rewriter always answers "answer", so the loop keeps coming back to the same question
+    chat_mock, retriever = graph_mocks([Document(page_content="unrelated")])
+    memo = GraphMemo()
+    res = create_graph(chat=chat_mock, retriever=retriever, max_rewrites=4, memo=memo).invoke({"question": "q"})
+    assert res["rewrites"] == 4
+    assert retriever.invoke.call_count == 2  # "q" and "answer"
+    assert memo.misses == {"retrievals": 2, "verdicts": 2, "rewrites": 2}
+    assert memo.hits == {"retrievals": 3, "verdicts": 3, "rewrites": 2}
+
+    # shared across runs: normalized questions hit
+    graders = chat_mock.with_structured_output.return_value
+    graded = graders.call_count
+    create_graph(chat=chat_mock, retriever=retriever, max_rewrites=0, memo=memo).invoke({"question": "  Q "})
+    assert retriever.invoke.call_count == 2
+    assert graders.call_count == graded + 2  # only the hallucination and answer graders
+
+
+def test_memo_per_run():
+    chat_mock, retriever = graph_mocks([Document(page_content="page1"), Document(page_content="page2")])
+    graph = create_graph(chat=chat_mock, retriever=retriever)
+    for _ in range(2):
+        memo = GraphMemo()
+        res = graph.invoke({"question": "q"}, config={"configurable": {"memo": memo}})
+        assert [d.page_content for d in res["documents"]] == ["page1"]
+        assert memo.misses["verdicts"] == 2
+    assert retriever.invoke.call_count == 2  # a fresh memo per run
+
+
+def test_async_graph_matches_sync():
+    documents = [Document(page_content=f"doc{i}") for i in range(6)]
+    for kwargs in [{}, {"min_relevant": 1}, {"parallel_graders": True, "memo": GraphMemo()}]:
+        chat_mock, retriever = graph_mocks(documents, relevant=("doc3",))
+        retriever.ainvoke = AsyncMock(return_value=documents)
+        graph = create_graph(chat=chat_mock, retriever=retriever, **kwargs)
+        res = asyncio.run(graph.ainvoke({"question": "q"}))
+        assert retriever.ainvoke.await_count == 1
+        assert retriever.invoke.call_count == 0  # async all the way down
+        assert res == graph.invoke({"question": "q"})
+
+
+def test_arun_questions_caps_concurrency():
+    in_flight, peak = 0, 0
+
+    async def retrieve(question):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return [Document(page_content="page1")]
+
+    chat_mock, retriever = graph_mocks([])
+    retriever.ainvoke = AsyncMock(side_effect=retrieve)
+    graph = create_graph(chat=chat_mock, retriever=retriever)
+    states = asyncio.run(arun_questions(graph, [f"q{i}" for i in range(20)], max_concurrency=5))
+    assert [state["question"] for state in states] == [f"q{i}" for i in range(20)]
+    assert all(state["generation"] == "answer" for state in states)
+    assert peak == 5
+
+
+def test_arun_questions_return_exceptions():
+    chat_mock, retriever = graph_mocks([])
+    retriever.ainvoke = AsyncMock(side_effect=lambda question: [Document(page_content="page1")] if question != "bad" else 1 / 0)
+    graph = create_graph(chat=chat_mock, retriever=retriever)
+    states = asyncio.run(arun_questions(graph, ["q", "bad"], return_exceptions=True))
+    assert states[0]["generation"] == "answer"
+    assert isinstance(states[1], ZeroDivisionError)
+
+
+def test_benchmark_with_simulated_latency():
+    chat = LatencyFakeChatModel(latency=parse_latency("constant:0.01"), grounded_rate=1.0, answered_rate=1.0)
+    retriever = SyntheticRetriever(latency=parse_latency("uniform:0:0.01"), k=4)
+    graph = create_graph(chat, retriever, max_generations=3, max_rewrites=2)
+    for mode in ("async", "thread"):
+        result = run(graph, [f"question {i}" for i in range(8)], concurrency=4, mode=mode)
+        assert result["p99"] >= result["p50"] >= 0.01 * 3  # at least grading, generation and the 2 generation graders
+        assert result["nodes"]["retrieve"]["count"] >= 8
+        assert result["nodes"]["generate"]["count"] == 8  # always grounded and answered
+        assert compare(result, result) == []
+        assert compare(result, {**result, "p50": result["p50"] / 2})[0].startswith("p50")
+
+
+def test_prefilter_skips_obvious_documents():
+    documents = [Document(page_content="東京の天気は晴れです"), Document(page_content="野球の試合は中止"), Document(page_content="東京で会議")]
+    chat_mock, retriever = graph_mocks(documents, relevant=("会議",))
+    graded = []
+    grade = chat_mock.with_structured_output.return_value.side_effect
+
+    def counting_grade(prompt_value):
+        if "Retrieved document" in prompt_value.to_string():
+            graded.append(prompt_value.to_string())
+        return grade(prompt_value)
+
+    chat_mock.with_structured_output.return_value.side_effect = counting_grade
+    prefilter = RelevancePrefilter(reject_below=0.2, accept_above=0.8)
+    res = create_graph(chat=chat_mock, retriever=retriever, prefilter=prefilter).invoke({"question": "東京の天気"})
+    assert [d.page_content for d in res["documents"]] == ["東京の天気は晴れです", "東京で会議"]
+    assert len(graded) == 1 and "東京で会議" in graded[0]
+    assert prefilter.counts == {"accepted": 1, "rejected": 1, "graded": 1}
+
+    assert RelevancePrefilter(embeddings=HashingEmbeddings()).scores("東京の天気", ["東京の天気", "野球"])[0] > 0.99
+
+
+def test_dedup_collapses_retrieved_duplicates():
+    text = "page1 describes the origin of the name Sofia in detail. " * 4
+    documents = [
+        Document(page_content=text, metadata={"offset": 0}),
+        Document(page_content=text + "more", metadata={"offset": 10}),
+        Document(page_content="page2 is about something else entirely.", metadata={"offset": 500}),
+    ]
+    chat_mock, retriever = graph_mocks(documents)
+    res = create_graph(chat=chat_mock, retriever=retriever, dedup=NearDuplicateFilter(threshold=0.8)).invoke({"question": "q"})
+    assert res["documents"] == [Document(page_content=text, metadata={"offset": 0, "duplicates": [{"offset": 10}]})]
+    # 2 document gradings instead of 3, plus the hallucination and answer graders
+    assert chat_mock.with_structured_output.return_value.call_count == 4
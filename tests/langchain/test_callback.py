@@ -1,5 +1,17 @@
-from src.langchain.callback import PromptStdoutHandler
+import io
+import json
+import uuid
+
+import pytest
 from langchain_community.llms import FakeListLLM
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from src.langchain.callback import ProfilingCallbackHandler, PromptStdoutHandler
+from src.libs.fake_openai import FakeOpenAIServer
+from src.libs.llm import LLMProvider
 
 
 def test_callback():
@@ -7,3 +19,84 @@ def test_callback():
     llm = FakeListLLM(responses=responses, callbacks=[PromptStdoutHandler()])
     llm.invoke("Tell me a joke")
     # poetry run pytest -k test_callback -s
+
+
+@tool
+def double(x: int) -> int:
+    """Double x."""
+    return 2 * x
+
+
+def test_profiling_callback():
+    profiler = ProfilingCallbackHandler(maxlen=100)
+    with FakeOpenAIServer(responses=["one two three four"], latency=0.05, token_latency=0.01) as server:
+        provider = LLMProvider(base_url=server.base_url, api_key="fake")
+        llm = provider.chat_model(model="gpt-4o-mini", max_retries=0, streaming=True, stream_usage=True)
+        chain = ChatPromptTemplate.from_template("{q}") | llm | StrOutputParser() | RunnableLambda(lambda text: double.invoke({"x": len(text.split())}))
+        assert chain.invoke({"q": "count"}, config={"callbacks": [profiler], "run_name": "pipeline"}) == 8
+        provider.close()
+
+    [chat] = [r for r in profiler.records if r.kind == "chat_model"]
+    assert chat.time_to_first_token >= 0.05
+    assert chat.latency >= chat.time_to_first_token
+    assert (chat.prompt_tokens, chat.completion_tokens) == (2, 4)
+    assert chat.tokens_per_second > 0
+    [tool_run] = [r for r in profiler.records if r.kind == "tool"]
+    assert tool_run.name == "double"
+
+    [root] = [r for r in profiler.records if r.parent_run_id is None]
+    assert root.name == "pipeline"
+    tree = profiler.tree(root.run_id)
+    assert [c["kind"] for c in tree["children"]] == ["chain", "chat_model", "chain", "chain"]
+    assert 0 <= root.self_seconds < root.latency
+
+    summary = profiler.summary()
+    assert summary["chat_model:ChatOpenAI"]["count"] == 1
+    metrics = profiler.to_prometheus()
+    assert "# TYPE langchain_run_latency_seconds histogram" in metrics
+    assert 'langchain_run_latency_seconds_count{kind="tool",name="double"} 1' in metrics
+    assert 'langchain_time_to_first_token_seconds_bucket{kind="chat_model",name="ChatOpenAI",le="+Inf"} 1' in metrics
+    assert 'langchain_tokens_total{kind="chat_model",name="ChatOpenAI",type="completion"} 4' in metrics
+
+    out = io.StringIO()
+    assert profiler.export_jsonl(out) == len(profiler.records)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert {line["kind"] for line in lines} == {"chain", "chat_model", "tool"}
+
+
+def fail(x):
+    raise ValueError("boom")
+
+
+def test_profiling_ring_buffer_and_errors():
+    profiler = ProfilingCallbackHandler(maxlen=2)
+    llm = FakeListLLM(responses=["a"], callbacks=[profiler])
+    for _ in range(3):
+        llm.invoke("prompt")
+    assert len(profiler.records) == 2
+    assert profiler.latency[("llm", "FakeListLLM")].count == 3
+
+    with pytest.raises(ValueError):
+        RunnableLambda(fail).invoke(1, config={"callbacks": [profiler]})
+    assert profiler.records[-1].error == "ValueError('boom')"
+    assert 'langchain_run_errors_total{kind="chain",name="fail"} 1' in profiler.to_prometheus()
+
+
+def test_profiling_active_runs():
+    profiler = ProfilingCallbackHandler(maxlen=1, max_active=2)
+    root, child = uuid.uuid4(), uuid.uuid4()
+    profiler.on_chain_start({"name": "root"}, {}, run_id=root)
+    profiler.on_tool_start({"name": "child"}, "x", run_id=child, parent_run_id=root)
+    profiler.on_tool_end("y", run_id=child, parent_run_id=root)
+    # still running: in the tree without a latency
+    tree = profiler.tree(str(root))
+    assert tree["latency"] is None and [c["name"] for c in tree["children"]] == ["child"]
+    # aged out of the ring buffer
+    profiler.on_chain_start({"name": "other"}, {}, run_id=uuid.uuid4())
+    profiler.on_chain_end({}, run_id=root)
+    assert profiler.tree(str(child)) is None
+
+    # runs that never end do not accumulate
+    for _ in range(5):
+        profiler.on_chain_start({"name": "leak"}, {}, run_id=uuid.uuid4())
+    assert len(profiler._active) == 2 and profiler.dropped == 4
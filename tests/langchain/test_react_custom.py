@@ -1,5 +1,5 @@
 from langchain.agents import AgentExecutor
-from src.langchain.react_custom import ReActTestAgent, tools
+from src.langchain.react_custom import TEST_PROMPT, ReActTestAgent, create_agent, create_selected_prompt, default_example_selector, tools
 from langchain_community.llms import FakeListLLM
 
 
@@ -28,3 +28,26 @@ def test_main():
     question = "How much is the difference between the total of company C, F and the total of company A, E ?"
     result = agent_executor.invoke({"input": question})
     assert result["output"] == "21100"
+
+
+def test_selected_examples():
+    selector = default_example_selector(k=1)
+    prompt = create_selected_prompt(selector)
+    text = prompt.format(input="How much is the total invoice amount of company A, E and F ?", agent_scratchpad="")
+    assert text.count("質問: ") == 2 and "Total[2000 6700]" in text  # the example with a total of two companies
+    assert len(text) < len(TEST_PROMPT.format(input="How much is the total invoice amount of company A, E and F ?", agent_scratchpad=""))
+
+    llm = FakeListLLM(responses=["思考: I need to get invoice amount of company C.\n行動: GetInvoice[C]", "思考: So the answer is 20000.\n行動: 完了[20000]"])
+    agent_executor = AgentExecutor.from_agent_and_tools(agent=create_agent(llm, tools, selector), tools=tools)
+    assert agent_executor.invoke({"input": "How much is the invoice of company C ?"})["output"] == "20000"
+
+
+def test_batch_arithmetic():
+    assert "BatchArithmetic[Total[2000 1500]; Diff[20000 6700]]" in TEST_PROMPT.format(input="", agent_scratchpad="")
+    responses = [
+        "思考: I need both at once.\n行動: BatchArithmetic[Total[20000 4100]; Diff[2000 1000]]",
+        "思考: So the answer is 24100 and 1000.\n行動: 完了[24100 and 1000]",
+    ]
+    agent_executor = AgentExecutor.from_agent_and_tools(agent=ReActTestAgent.from_llm_and_tools(FakeListLLM(responses=responses), tools), tools=tools, return_intermediate_steps=True)
+    result = agent_executor.invoke({"input": "How much are the total of company C, F and the difference between company A and E ?"})
+    assert result["intermediate_steps"][0][1] == "Total[20000 4100] = 24100\nDiff[2000 1000] = 1000"
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import FakeStreamingListLLM
+from langchain_core.tools import Tool
+
+from src.langchain.react_custom import ParallelReActTestAgent, ReActTestAgent, tools
+from src.langchain.react_parser import ReActOutputParser, StreamingReActParser, aparse_stream, parse_stream
+from src.libs.agents import ParallelAgentExecutor
+
+COMPLETION = "思考: I need to get invoice amount of company C.\n行動: GetInvoice[C]\n観察: 20000\n思考: hallucinated"
+
+
+def test_parse():
+    parser = ReActOutputParser()
+    assert parser.parse("思考: done.\n行動: 完了[21100]\n") == AgentFinish({"output": "21100"}, "思考: done.\n行動: 完了[21100]\n")
+    action = parser.parse("思考: x\n行動: Diff[24100 3000]")
+    assert (action.tool, action.tool_input) == ("Diff", "24100 3000")
+    with pytest.raises(OutputParserException):
+        parser.parse("思考: no action")
+    with pytest.raises(OutputParserException):
+        parser.parse("行動: Diff 1 2")
+
+
+def test_streaming_parser_stops_at_closing_bracket():
+    parser = StreamingReActParser()
+    results = [parser.feed(c) for c in COMPLETION]
+    stop = COMPLETION.index("]")
+    assert results[:stop] == [None] * stop
+    assert results[stop] == AgentAction("GetInvoice", "C", COMPLETION[: stop + 1])
+    assert parser.text == COMPLETION[: stop + 1]
+    # a `]` outside an action line is not an action
+    parser = StreamingReActParser()
+    assert parser.feed("思考: list [1, 2]\n") is None
+    assert parser.feed("行動: 完了[3]") == AgentFinish({"output": "3"}, "思考: list [1, 2]\n行動: 完了[3]")
+    # the input of an action may contain brackets
+    parser = StreamingReActParser()
+    assert [parser.feed(c) for c in "行動: BatchArithmetic[Total[1 2]; Diff[3 4]"] == [None] * 41
+    assert parser.feed("]\n観察:") == AgentAction("BatchArithmetic", "Total[1 2]; Diff[3 4]", "行動: BatchArithmetic[Total[1 2]; Diff[3 4]]")
+
+
+@pytest.mark.parametrize("chunks", [[COMPLETION], list(COMPLETION), [COMPLETION[:30], COMPLETION[30:]]])
+def test_streaming_matches_full_parse(chunks):
+    parser = StreamingReActParser()
+    for chunk in chunks:
+        if parser.feed(chunk):
+            break
+    truncated = COMPLETION[: COMPLETION.index("]") + 1]
+    assert parser.finish() == ReActOutputParser().parse(truncated)
+
+
+def test_parse_stream_closes_generation():
+    llm = FakeStreamingListLLM(responses=[COMPLETION])
+    result, consumed = parse_stream(llm.stream("prompt"))
+    assert result.tool == "GetInvoice"
+    assert consumed == COMPLETION.index("]") + 1 < len(COMPLETION)
+
+    llm = FakeStreamingListLLM(responses=[COMPLETION])
+    result, consumed = asyncio.run(aparse_stream(llm.astream("prompt")))
+    assert result.tool == "GetInvoice" and consumed == COMPLETION.index("]") + 1
+
+    with pytest.raises(OutputParserException):
+        parse_stream(iter(["思考: ", "no action"]))
+
+
+def test_agent_stops_generation_at_action():
+    responses = [
+        "思考: I need to get invoice amount of company C.\n行動: GetInvoice[C]\n観察: 999\n思考: So the answer is 999.\n行動: 完了[999]",
+        "思考: So the answer is 20000.\n行動: 完了[20000]\n観察: extra",
+    ]
+    llm = FakeStreamingListLLM(responses=responses)
+    agent_executor = AgentExecutor.from_agent_and_tools(agent=ReActTestAgent.from_llm_and_tools(llm, tools), tools=tools, return_intermediate_steps=True)
+    result = agent_executor.invoke({"input": "How much is the invoice of company C ?"})
+    assert result["output"] == "20000"
+    [(action, observation)] = result["intermediate_steps"]
+    assert action.log.endswith("GetInvoice[C]") and observation == 20000
+
+
+PARALLEL_COMPLETION = "思考: independent.\n行動: GetInvoice[A]\n行動: GetInvoice[B]\n観察: 1\n行動: Total[1 2]"
+
+
+def test_parse_multiple_actions():
+    parser = ReActOutputParser(multiple_actions=True)
+    actions = parser.parse("思考: independent.\n行動: GetInvoice[A]\n行動: GetInvoice[B]")
+    assert [(a.tool, a.tool_input) for a in actions] == [("GetInvoice", "A"), ("GetInvoice", "B")]
+    assert parser.parse("思考: x\n行動: Diff[2 1]").tool == "Diff"
+    with pytest.raises(OutputParserException):
+        parser.parse("思考: x\n行動: GetInvoice[A]\n行動: 完了[1]")
+
+    streaming = StreamingReActParser(multiple_actions=True)
+    results = [streaming.feed(c) for c in PARALLEL_COMPLETION]
+    stop = PARALLEL_COMPLETION.index("\n観察")
+    assert results[: stop + 1] == [None] * (stop + 1)  # known once the next line is not `行動:`
+    log = PARALLEL_COMPLETION[:stop]
+    assert results[stop + 1] == [AgentAction("GetInvoice", "A", log), AgentAction("GetInvoice", "B", log)]
+    # the end of the stream completes the actions too
+    assert parse_stream(iter(["思考: x\n行動: GetInvoice[A]\n", "行動: GetInvoice[B]"]), multiple_actions=True)[0][1].tool_input == "B"
+
+
+def test_parallel_agent_runs_actions_of_a_step_concurrently():
+    responses = [
+        "思考: independent.\n行動: GetInvoice[A]\n行動: GetInvoice[B]\n行動: GetInvoice[C]\n行動: GetInvoice[D]\n観察: 1",
+        "思考: So the answer is 10.\n行動: 完了[10]",
+    ]
+    threads = set()
+
+    def get_invoice(name: str) -> int:
+        threads.add(threading.get_ident())
+        time.sleep(0.2)
+        return {"A": 1, "B": 2, "C": 3, "D": 4}[name]
+
+    slow_tools = [Tool(name=t.name, func=get_invoice if t.name == "GetInvoice" else t.func, description=t.description) for t in tools]
+    llm = FakeStreamingListLLM(responses=responses)
+    agent = ParallelReActTestAgent.from_llm_and_tools(llm, slow_tools)
+    agent_executor = ParallelAgentExecutor.from_agent_and_tools(agent=agent, tools=slow_tools, return_intermediate_steps=True)
+    start = time.perf_counter()
+    result = agent_executor.invoke({"input": "How much is the total invoice amount of company A, B, C and D ?"})
+    assert time.perf_counter() - start < 0.6
+    assert result["output"] == "10" and len(threads) == 4
+    steps = result["intermediate_steps"]
+    assert [(action.tool_input, observation) for action, observation in steps] == [("A", 1), ("B", 2), ("C", 3), ("D", 4)]
+    # one log for the step, then the observations in order
+    scratchpad = agent._construct_scratchpad(steps)
+    assert scratchpad == steps[0][0].log + "\n観察: 1\n観察: 2\n観察: 3\n観察: 4\n思考: "
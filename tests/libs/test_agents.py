@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from langchain.memory import ConversationBufferMemory
+from langchain_community.llms import FakeListLLM
+from langchain_core.prompts import PromptTemplate
+
+from src.libs.agents import GOOGLE_AGENT_PROMPT, AgentExecutorFactory, create_google_agent_executor
+
+
+def test_executor_cached_by_model_prompt_and_tools():
+    factory = AgentExecutorFactory()
+    responses = ["Thought: I now know the final answer\nFinal Answer: 12"]
+
+    llm = FakeListLLM(responses=responses)
+    executor = create_google_agent_executor(llm, factory=factory)
+    # the same model and an equal prompt
+    prompt = PromptTemplate.from_template(GOOGLE_AGENT_PROMPT)
+    assert create_google_agent_executor(llm, prompt=prompt, factory=factory) is executor
+    assert factory.stats.hits == 1
+    assert factory.stats.misses == 1
+    assert factory.stats.build_seconds > 0
+
+    # another instance with the same params may differ in endpoint, callbacks or cache
+    other = create_google_agent_executor(FakeListLLM(responses=responses), factory=factory)
+    assert other is not executor
+    assert factory.stats.misses == 2
+    assert factory.stats.hit_rate == 1 / 3
+    assert len(factory) == 2
+
+
+def test_executor_with_memory_reuses_agent():
+    factory = AgentExecutorFactory()
+    llm = FakeListLLM(responses=["Final Answer: 1"])
+    executor = create_google_agent_executor(llm, factory=factory)
+    memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    with_memory = create_google_agent_executor(llm, memory=memory, factory=factory)
+    assert with_memory is not executor
+    assert with_memory.agent is executor.agent
+    assert with_memory.memory is memory
+    assert factory.stats.misses == 1
+
+
+def test_executor_built_once_across_threads():
+    factory = AgentExecutorFactory()
+    llm = FakeListLLM(responses=["Final Answer: 1"])
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        executors = list(pool.map(lambda _: create_google_agent_executor(llm, factory=factory), range(32)))
+    assert all(e is executors[0] for e in executors)
+    assert factory.stats.misses == 1
+    assert factory.stats.hits == 31
+
+
+def test_failed_build_is_not_cached():
+    factory = AgentExecutorFactory()
+    llm = FakeListLLM(responses=["Final Answer: 1"])
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            create_google_agent_executor(llm, prompt=PromptTemplate.from_template("{input}"), factory=factory)
+    assert factory.stats.misses == 2 and len(factory) == 0 and not factory._building
+
+
+@patch("src.libs.tools.google")
+def test_cached_executor_invoke(google_mock):
+    google_mock.results.return_value = [{"title": "首相官邸", "link": "https://www.kantei.go.jp/", "snippet": "首相官邸のホームページです。"}]
+    factory = AgentExecutorFactory()
+    llm = FakeListLLM(
+        responses=[
+            "I need to search\nAction: google-search\nAction Input: Japan's prime minister",
+            "Thought: I now know the final answer\nFinal Answer: 岸田文雄",
+        ]
+    )
+    executor = create_google_agent_executor(llm, factory=factory)
+    assert executor.invoke({"input": "日本の総理大臣は誰ですか？"})["output"] == "岸田文雄"
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from src.libs.arithmetic import batch_arithmetic, evaluate_batch, parse_item
+from src.libs.tools import TOOL_BATCH_ARITHMETIC
+
+
+def test_batch_arithmetic():
+    res = batch_arithmetic("Total[1500 20000 6700]; Diff[2000 1500]\nMultiplier[3,4]; 2000+6700; 3*4*5")
+    assert res.splitlines() == [
+        "Total[1500 20000 6700] = 28200",
+        "Diff[2000 1500] = 500",
+        "Multiplier[3,4] = 12",
+        "2000+6700 = 8700",
+        "3*4*5 = 60",
+    ]
+
+
+def test_batch_arithmetic_errors_are_reported_per_item():
+    res = batch_arithmetic("Diff[1]; Foo[1 2]; 1+2*3; Total[1 - 2]; Total[1 2]")
+    lines = res.splitlines()
+    assert lines[0] == "Diff[1] = error: Diff needs exactly two numbers: 'Diff[1]'"
+    assert lines[1].startswith("Foo[1 2] = error: Unknown operation 'Foo'")
+    assert lines[2] == "1+2*3 = error: Mixed operators are not supported: '1+2*3'"
+    assert lines[3].startswith("Total[1 - 2] = error: Could not parse numbers")
+    assert lines[4] == "Total[1 2] = 3"
+
+
+def test_parse_item():
+    operation, numbers = parse_item("Total[1, 2,3]")
+    assert operation == "total"
+    assert isinstance(numbers, np.ndarray)
+    assert numbers.tolist() == [1, 2, 3]
+    # does not fit in int64
+    assert parse_item("Multiplier[99999999999999999999 2]") == ("multiply", [99999999999999999999, 2])
+    with pytest.raises(ValueError):
+        parse_item("Total[1 a]")
+
+
+@pytest.mark.parametrize(
+    "item,expected",
+    [
+        ("Total[9223372036854775807 1]", 9223372036854775808),
+        ("Total[4611686018427387904 4611686018427387904]", 2**63),
+        ("Diff[-9223372036854775807 9223372036854775806]", 2**64 - 3),
+        ("Multiplier[4294967296 4294967296]", 2**64),
+        ("Multiplier[99999999999 99999999999 99999999999]", 99999999999**3),
+        ("Total[-99999999999999999999 1]", -99999999999999999998),
+    ],
+)
+def test_exact_fallback(item, expected):
+    assert evaluate_batch([parse_item(item)]) == [expected]
+
+
+def test_evaluate_batch_keeps_order():
+    items = [f"Total[{i} {i}]" if i % 2 else f"Diff[{i} 1]" for i in range(1000)]
+    expected = [2 * i if i % 2 else abs(i - 1) for i in range(1000)]
+    assert evaluate_batch([parse_item(item) for item in items]) == expected
+
+
+def test_tool():
+    assert TOOL_BATCH_ARITHMETIC.invoke("Total[1 2 3]; Diff[5 8]") == "Total[1 2 3] = 6\nDiff[5 8] = 3"
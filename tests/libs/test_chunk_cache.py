@@ -0,0 +1,81 @@
+import os
+
+from src.langchain.text_splitter import split_markdown_tree
+from src.libs.chunk_cache import ChunkCache
+from src.libs.markdown_chunker import MarkdownFile
+
+DOC = """# ガイド
+
+## インストール
+
+pip install する。
+
+## 使い方
+
+{body}
+"""
+
+
+def write(path, text, mtime_ns=None):
+    path.write_text(text, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def expected(path, chunk_size):
+    with MarkdownFile(path) as md:
+        return [(c.text, c.metadata) for c in md.chunks(chunk_size=chunk_size)]
+
+
+def test_incremental_ingest(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    write(docs / "a.md", DOC.format(body="説明です。" * 50), mtime_ns=1)
+    write(docs / "sub" / "b.md", DOC.format(body="別の説明。"), mtime_ns=1)
+    cache_path = str(tmp_path / "cache.sqlite3")
+
+    cache = ChunkCache(cache_path, chunk_size=100)
+    first = cache.ingest_tree(docs)
+    assert [(d.page_content, d.metadata) for d in first] == expected(docs / "a.md", 100) + expected(docs / "sub" / "b.md", 100)
+    # the preamble, "# ガイド" and "## インストール" sections of b.md are the same as a.md
+    assert (cache.stats.files, cache.stats.unchanged_files, cache.stats.section_hits, cache.stats.section_misses) == (2, 0, 3, 5)
+    cache.close()
+
+    # nothing changed: files are not reopened
+    cache = ChunkCache(cache_path, chunk_size=100)
+    assert cache.ingest_tree(docs) == first
+    assert (cache.stats.unchanged_files, cache.stats.section_hits, cache.stats.section_misses) == (2, 0, 0)
+
+    # edit the first section of a.md: the following sections move but are still hits
+    write(docs / "a.md", DOC.format(body="説明です。" * 50).replace("pip install する。", "poetry add する。"), mtime_ns=2)
+    (docs / "sub" / "b.md").unlink()
+    docs_after = cache.ingest_tree(docs)
+    assert [(d.page_content, d.metadata) for d in docs_after] == expected(docs / "a.md", 100)
+    assert (cache.stats.section_hits, cache.stats.section_misses, cache.stats.removed_files) == (3, 1, 1)
+    cache.close()
+
+    # other chunking parameters do not reuse the cached chunks
+    cache = ChunkCache(cache_path, chunk_size=50)
+    assert [(d.page_content, d.metadata) for d in cache.ingest_tree(docs)] == expected(docs / "a.md", 50)
+    assert cache.stats.unchanged_files == 0
+    cache.close()
+
+
+def test_split_markdown_tree(tmp_path):
+    write(tmp_path / "doc.md", DOC.format(body="本文。"))
+    docs = split_markdown_tree(tmp_path, cache_path=str(tmp_path / ".cache" / "chunks.sqlite3"))
+    assert docs[-1].page_content == "## 使い方\n\n本文。"
+    assert docs[-1].metadata["Header 2"] == "使い方"
+
+
+def test_forget_relative_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "docs").mkdir()
+    write(tmp_path / "docs" / "a.md", DOC.format(body="本文。"))
+    write(tmp_path / "docs" / "b.md", DOC.format(body="別の本文。"))
+    cache = ChunkCache(":memory:")
+    cache.ingest_tree(".")
+    (tmp_path / "docs" / "b.md").unlink()
+    assert {d.metadata["source"] for d in cache.ingest_tree(".")} == {os.path.join("docs", "a.md")}
+    assert cache.stats.removed_files == 1
+    assert [p for (p,) in cache._conn.execute("SELECT path FROM files")] == [os.path.join("docs", "a.md")]
@@ -0,0 +1,29 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from src.libs.dedup import NearDuplicateFilter
+from src.libs.splitter import JapaneseTextSplitter
+
+TEXT = "".join(f"{i}番目の段落では、会議の資料と東京の天気について説明します。" for i in range(40))
+
+
+def test_minhash_estimates_jaccard():
+    dedup = NearDuplicateFilter(num_perm=256)
+    a, b = "LangChain agents call tools to answer questions.", "LangChain agents call tools to answer many questions."
+    shingles = [{t[i : i + 5] for i in range(len(t) - 4)} for t in (a, b)]
+    jaccard = len(shingles[0] & shingles[1]) / len(shingles[0] | shingles[1])
+    signatures = dedup.signatures([a, b])
+    assert abs(np.mean(signatures[0] == signatures[1]) - jaccard) < 0.1
+
+
+def test_collapse_overlapping_chunks():
+    chunks = JapaneseTextSplitter(chunk_size=400, chunk_overlap=360, processes=1).split_text(TEXT)
+    documents = [Document(page_content=c, metadata={"chunk": i}) for i, c in enumerate(chunks[:3])]
+    documents.append(Document(page_content="野球の試合は雨で中止になりました。", metadata={"chunk": "other"}))
+    dedup = NearDuplicateFilter(threshold=0.7)
+    collapsed = dedup.collapse(documents)
+    assert [d.metadata["chunk"] for d in collapsed] == [0, "other"]
+    assert collapsed[0].metadata["duplicates"] == [{"chunk": 1}, {"chunk": 2}]
+    assert "duplicates" not in documents[0].metadata  # inputs are not modified
+    assert dedup.removed == 2
+    assert NearDuplicateFilter(threshold=0.99).collapse(documents) == documents
@@ -0,0 +1,25 @@
+from src.libs.example_selector import IndexedExampleSelector, examples_from_texts
+from src.libs.vector_index import HashingEmbeddings
+
+EXAMPLES = examples_from_texts(
+    [
+        "質問: 東京の天気は？\n思考: 天気を調べる。",
+        "質問: How much is the invoice of company A ?\n思考: I need to get invoice amount of company A.",
+        "質問: 大阪の人口は？\n思考: 人口を調べる。" + "長い説明" * 100,
+        "質問: 大阪の面積は？\n思考: 面積を調べる。",
+    ]
+)
+
+
+def test_selects_similar_examples_within_budget(tmp_path):
+    assert EXAMPLES[0]["question"] == "東京の天気は？"
+    selector = IndexedExampleSelector.from_examples(EXAMPLES, HashingEmbeddings(), k=2, max_tokens=200)
+    assert selector.select_examples({"input": "How much is the invoice of company B ?"})[0] == EXAMPLES[1]
+    # the population example is the most similar but does not fit in the budget
+    assert selector.select_examples({"input": "大阪の人口は？"}) == [EXAMPLES[3]]
+
+    selector.save(tmp_path / "examples")
+    loaded = IndexedExampleSelector.load(tmp_path / "examples", HashingEmbeddings(), k=2, max_tokens=200)
+    assert loaded.select_examples({"input": "大阪の人口は？"}) == [EXAMPLES[3]]
+    loaded.add_example({"question": "大阪の人口密度は？", "example": "質問: 大阪の人口密度は？"})
+    assert loaded.select_examples({"input": "大阪の人口は？"})[0]["question"] == "大阪の人口密度は？"
@@ -0,0 +1,63 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from src.libs.hybrid_search import BM25Index, HybridRetriever, reciprocal_rank_fusion, tokenize
+from src.libs.vector_index import HashingEmbeddings
+
+TEXTS = [
+    "部品J-26の在庫は東京倉庫にあります。",
+    "部品J-62の在庫は大阪倉庫にあります。",
+    "東京の天気は晴れです。",
+    "LangChain agent uses tools.",
+    "会議の資料を確認します。",
+]
+
+
+def test_tokenize():
+    assert tokenize("ｊ－２６の在庫") == ["j-26", "j", "26", "の在", "在庫"]
+    assert tokenize("東京都 café v1.2") == ["東京", "京都", "café", "v1.2", "v1", "2"]
+
+
+def test_bm25_ranks_exact_codes():
+    index = BM25Index.from_texts(TEXTS)
+    scores, ids = index.search("J-26の在庫", k=3)
+    assert ids.tolist() == [0, 1]  # J-62 shares the parts and the bigrams, not the code
+    assert scores[0] > scores[1] > 0
+    assert index.search("存在しない語", k=3)[1].tolist() == []
+
+
+def test_bm25_matches_brute_force():
+    rng = np.random.default_rng(0)
+    words = ["東京", "大阪", "在庫", "部品", "A-1", "B-2", "会議", "資料"]
+    texts = [" ".join(rng.choice(words, size=rng.integers(1, 12))) for _ in range(200)]
+    index = BM25Index.from_texts(texts)
+    documents = [tokenize(t) for t in texts]
+    average = sum(map(len, documents)) / len(documents)
+    query = tokenize("東京 A-1 資料")
+    expected = np.zeros(len(texts))
+    for term in set(query):
+        df = sum(term in d for d in documents)
+        idf = np.log1p((len(texts) - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(documents):
+            tf = d.count(term)
+            expected[i] += query.count(term) * idf * tf * 2.5 / (tf + 1.5 * (0.25 + 0.75 * len(d) / average))
+    np.testing.assert_allclose(index.scores("東京 A-1 資料"), expected, rtol=1e-4)
+    scores, ids = index.search("東京 A-1 資料", k=10)
+    assert ids.tolist() == sorted(np.flatnonzero(expected > 0), key=lambda i: (-round(expected[i], 4), i))[:10]
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]]) == [1, 3, 2]
+    assert reciprocal_rank_fusion([[], [5]]) == [5]
+
+
+def test_hybrid_retriever_round_trip(tmp_path):
+    retriever = HybridRetriever.from_documents([Document(page_content=t, metadata={"i": i}) for i, t in enumerate(TEXTS)], HashingEmbeddings(), k=2)
+    assert [d.metadata["i"] for d in retriever.invoke("J-26の在庫")] == [0, 1]
+    assert retriever.invoke("天気を教えて")[0].metadata["i"] == 2
+
+    retriever.save(tmp_path / "index")
+    loaded = HybridRetriever.load(tmp_path / "index", HashingEmbeddings(), k=2)
+    assert isinstance(loaded.bm25.doc_ids, np.memmap)
+    for query in ["J-26の在庫", "LangChain tools", "会議"]:
+        assert loaded.invoke(query) == retriever.invoke(query)
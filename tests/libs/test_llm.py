@@ -0,0 +1,63 @@
+import time
+
+import httpx
+
+from langchain_core.messages import HumanMessage
+
+from src.libs.fake_openai import FakeOpenAIServer
+from src.libs.llm import LLMProvider, PoolLimits
+
+
+def test_models_are_shared_by_params():
+    provider = LLMProvider(base_url="http://127.0.0.1:1/v1", api_key="fake")
+    llm = provider.chat_model(model="gpt-4o-mini", temperature=0)
+    assert provider.chat_model(model="gpt-4o-mini", temperature=0) is llm
+    assert provider.chat_model(model="gpt-4o-mini", temperature=1) is not llm
+    assert provider.completion_model(temperature=0) is not llm
+    assert llm.http_client is provider.http_client
+
+
+def test_pool_limits_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_POOL_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("LLM_POOL_KEEPALIVE_EXPIRY", "1.5")
+    limits = PoolLimits.from_env()
+    assert limits.max_connections == 7
+    assert limits.keepalive_expiry == 1.5
+    assert limits.max_keepalive_connections == PoolLimits.max_keepalive_connections
+
+
+def test_fake_server_chat_keep_alive():
+    with FakeOpenAIServer() as server:
+        provider = LLMProvider(base_url=server.base_url, api_key="fake")
+        llm = provider.chat_model(model="gpt-4o-mini", temperature=0, max_retries=0)
+        first = llm.invoke([HumanMessage(content="こんにちは")])
+        second = provider.chat_model(model="gpt-4o-mini", temperature=0, max_retries=0).invoke([HumanMessage(content="こんにちは")])
+        assert first.content == second.content
+        assert first.content.startswith("fake response ")
+        assert first.usage_metadata["output_tokens"] == 3
+        assert server.request_count == 2
+        assert len(server.clients) == 1  # the second request reused the connection
+        provider.close()
+
+
+def test_fake_server_streaming_latency():
+    with FakeOpenAIServer(responses=["思考: 計算します\n行動: Total[1 2]\n観察: 3"], latency=0.1, token_latency=0.05) as server:
+        provider = LLMProvider(base_url=server.base_url, api_key="fake")
+        llm = provider.chat_model(model="gpt-4o-mini", max_retries=0)
+        start = time.perf_counter()
+        chunks = [chunk.content for chunk in llm.stream("question", stop=["\n観察"])]
+        elapsed = time.perf_counter() - start
+        assert "".join(chunks) == "思考: 計算します\n行動: Total[1 2]"
+        assert [c for c in chunks if c] == ["思考: ", "計算します\n", "行動: ", "Total[1 ", "2]"]
+        assert elapsed >= 0.1 + 4 * 0.05
+
+        completion = provider.completion_model(max_retries=0)
+        assert completion.invoke("question") == "思考: 計算します\n行動: Total[1 2]\n観察: 3"
+        provider.close()
+
+
+def test_fake_server_stop_string():
+    with FakeOpenAIServer(responses=["行動: Total[1 2]\n観察: 3"]) as server:
+        for stop in ["\n観察", ["\n観察"]]:
+            response = httpx.post(f"{server.base_url}/completions", json={"model": "fake", "prompt": "question", "stop": stop})
+            assert response.json()["choices"][0]["text"] == "行動: Total[1 2]"
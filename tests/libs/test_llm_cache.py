@@ -0,0 +1,102 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, Generation
+from pydantic import BaseModel
+
+from src.libs.fake_openai import FakeOpenAIServer
+from src.libs.llm import LLMProvider
+from src.libs.llm_cache import SQLiteLRUCache, get_llm_cache, with_cache
+
+
+class Route(BaseModel):
+    next: str
+
+
+def test_round_trip_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteLRUCache(path)
+    message = AIMessage(content="", tool_calls=[{"name": "Route", "args": {"next": "FINISH"}, "id": "call_1"}])
+    cache.update("prompt", "llm", [ChatGeneration(message=message)])
+    cache.update("prompt", "other llm", [Generation(text="completion")])
+    assert cache.lookup("unknown", "llm") is None
+    cache.close()
+
+    reopened = SQLiteLRUCache(path)
+    assert len(reopened) == 2
+    [generation] = reopened.lookup("prompt", "llm")
+    assert generation.message.tool_calls[0]["args"] == {"next": "FINISH"}
+    assert reopened.lookup("prompt", "other llm")[0].text == "completion"
+    assert (reopened.stats.hits, reopened.stats.misses) == (2, 0)
+    reopened.clear()
+    assert len(reopened) == 0
+
+
+def test_lru_eviction_by_entries_and_bytes(tmp_path):
+    cache = SQLiteLRUCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.update("a", "llm", [Generation(text="a")])
+    cache.update("b", "llm", [Generation(text="b")])
+    assert cache.lookup("a", "llm") is not None  # "b" becomes the least recently used
+    cache.update("c", "llm", [Generation(text="c")])
+    assert cache.lookup("b", "llm") is None
+    assert cache.lookup("a", "llm") is not None
+    assert cache.lookup("c", "llm") is not None
+    assert cache.stats.evictions == 1
+
+    small = SQLiteLRUCache(":memory:", max_bytes=1)
+    small.update("a", "llm", [Generation(text="a")])
+    assert len(small) == 0
+
+    # the byte budget evicts as many least recently used entries as needed, the totals follow
+    path = str(tmp_path / "bytes.sqlite3")
+    sized = SQLiteLRUCache(path, max_bytes=3000)
+    for name in "abcde":
+        sized.update(name, "llm", [Generation(text=name * 500)])
+    kept = [sized.lookup(name, "llm") is not None for name in "abcde"]
+    assert kept == sorted(kept) and not kept[0] and kept[-1] and sized._size <= 3000  # the oldest went first
+    sized.update("e", "llm", [Generation(text="e")])  # replacing an entry frees its old size
+    sized.update("f", "llm", [Generation(text="f" * 500)])
+    assert sized._size <= 3000 and sized._size == sum(len(row[0]) for row in sized._conn.execute("SELECT value FROM llm_cache"))
+    count = len(sized)
+    sized.close()
+    assert SQLiteLRUCache(path)._count == count
+
+
+def test_repeated_calls_hit_cache(tmp_path):
+    cache = SQLiteLRUCache(str(tmp_path / "cache.sqlite3"))
+    with FakeOpenAIServer(responses=['{"next": "FINISH"}']) as server:
+        provider = LLMProvider(base_url=server.base_url, api_key="fake")
+        llm = provider.chat_model(model="gpt-4o-mini", temperature=0, max_retries=0)
+        cached = with_cache(llm, cache)
+        first = cached.invoke([HumanMessage(content="route this")])
+        second = cached.invoke([HumanMessage(content="route this")])
+        assert first.content == second.content
+        assert server.request_count == 1
+
+        # different params are a different key
+        with_cache(provider.chat_model(model="gpt-4o-mini", temperature=0.1, max_retries=0), cache).invoke([HumanMessage(content="route this")])
+        assert server.request_count == 2
+
+        # caching is opt-in: the provider's models are not cached
+        llm.invoke([HumanMessage(content="route this")])
+        provider.chat_model(model="gpt-4o-mini", temperature=0.5, max_retries=0).invoke([HumanMessage(content="route this")])
+        assert server.request_count == 4
+        provider.close()
+    assert cache.stats.hits == 1
+    assert cache.stats.hit_rate == 1 / 3
+
+
+def test_with_cache_and_env(tmp_path, monkeypatch):
+    cache = SQLiteLRUCache(":memory:")
+    with FakeOpenAIServer() as server:
+        llm = LLMProvider(base_url=server.base_url, api_key="fake").chat_model(max_retries=0)
+        cached = with_cache(llm, cache)
+        assert with_cache(llm, None) is llm
+        assert cached.cache is cache and llm.cache is not cache
+        cached.invoke("hello")
+        cached.invoke("hello")
+        assert server.request_count == 1
+
+    monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+    assert get_llm_cache() is None
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "env" / "cache.sqlite3"))
+    assert get_llm_cache() is get_llm_cache()
+    assert (tmp_path / "env" / "cache.sqlite3").exists()
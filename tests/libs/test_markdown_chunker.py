@@ -0,0 +1,101 @@
+import tracemalloc
+
+import pytest
+
+from src.langchain.text_splitter import iter_markdown_text
+from src.libs.markdown_chunker import MarkdownFile
+
+MARKDOWN = """# タイトル
+
+はじめに。
+
+## 1. 使い方
+
+```
+# コメントで見出しではない
+poetry run python main.py
+```
+
+### 1.1. 詳細
+
+とても長い説明です。とても長い説明です。とても長い説明です。
+
+## 2. まとめ
+"""
+
+
+@pytest.fixture
+def md_path(tmp_path):
+    path = tmp_path / "doc.md"
+    path.write_text(MARKDOWN, encoding="utf-8")
+    return path
+
+
+def test_sections_and_headers(md_path):
+    with MarkdownFile(md_path) as md:
+        chunks = list(md.chunks(chunk_size=1000))
+        assert [c.headers for c in chunks] == [
+            ("タイトル",),
+            ("タイトル", "1. 使い方"),
+            ("タイトル", "1. 使い方", "1.1. 詳細"),
+            ("タイトル", "2. まとめ"),
+        ]
+        assert "# コメントで見出しではない" in chunks[1].text
+        raw = md_path.read_bytes()
+        for chunk in chunks:
+            assert raw[chunk.offset : chunk.offset + chunk.length].decode("utf-8") == chunk.text
+        assert chunks[2].metadata == {
+            "source": str(md_path),
+            "offset": chunks[2].offset,
+            "length": chunks[2].length,
+            "Header 1": "タイトル",
+            "Header 2": "1. 使い方",
+            "Header 3": "1.1. 詳細",
+        }
+
+
+def test_fences_with_info_string(tmp_path):
+    path = tmp_path / "fences.md"
+    path.write_text("# A\n\n```python\n# not a header\n~~~\n## still code\n```\n\n## B\n\n````md\n```\n# nested\n````\n", encoding="utf-8")
+    with MarkdownFile(path) as md:
+        chunks = list(md.chunks())
+    assert [c.headers for c in chunks] == [("A",), ("A", "B")]
+    assert "## still code" in chunks[0].text and "# nested" in chunks[1].text
+    # chunks keep the mapping alive after the file is closed
+    assert chunks[1].text.startswith("## B")
+
+
+def test_byte_bounded_chunks_on_character_boundaries(md_path):
+    with MarkdownFile(md_path) as md:
+        chunks = list(md.chunks(chunk_size=40, chunk_overlap=10))
+        assert all(c.length <= 40 for c in chunks)
+        texts = [c.text for c in chunks]  # would raise on a split multi-byte character
+    assert "とても長い説明です。" in texts
+    with pytest.raises(ValueError):
+        list(MarkdownFile(md_path).chunks(chunk_size=10, chunk_overlap=10))
+
+
+def test_documents_and_empty_file(md_path, tmp_path):
+    docs = list(iter_markdown_text(md_path))
+    assert docs[0].page_content == "# タイトル\n\nはじめに。"
+    assert docs[-1].metadata["Header 2"] == "2. まとめ"
+    empty = tmp_path / "empty.md"
+    empty.write_text("")
+    assert list(iter_markdown_text(empty)) == []
+
+
+def test_large_file_memory_is_flat(tmp_path):
+    path = tmp_path / "large.md"
+    section = ("## 見出し\n\n" + "長い文章が続きます。" * 300 + "\n\n").encode("utf-8")
+    with open(path, "wb") as f:
+        for _ in range(2000):
+            f.write(section)
+    size = path.stat().st_size
+    tracemalloc.start()
+    with MarkdownFile(path) as md:
+        count = sum(1 for _ in md.chunks(chunk_size=1000))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert size > 18_000_000
+    assert count > 18_000
+    assert peak < 1_000_000
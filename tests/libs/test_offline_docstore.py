@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import numpy as np
+from langchain.agents.react.base import DocstoreExplorer
+from langchain_core.documents import Document
+
+from src.libs.offline_docstore import OfflineWikipedia
+
+DUMP = Path(__file__).resolve().parents[2] / "data" / "wikipedia_sample.jsonl"
+
+
+def test_search_and_lookup_offline(tmp_path):
+    docstore = OfflineWikipedia.build(str(DUMP), tmp_path / "index")
+    assert len(docstore) == 4 and isinstance(docstore._pages, np.memmap)
+    page = docstore.search("fumio_kishida")
+    assert isinstance(page, Document) and page.metadata["page"] == "https://en.wikipedia.org/wiki/Fumio_Kishida"
+    assert docstore.search("岸田総理") == page  # redirect
+    assert docstore.search("Kishida speech") == "Could not find [Kishida speech]. Similar: ['Fumio Kishida']"
+
+    explorer = DocstoreExplorer(docstore)
+    assert explorer.search("Kishida").startswith("Fumio Kishida is a Japanese politician")
+    assert explorer.lookup("explosive").startswith("(Result 1/1) On 15 April 2023")
+
+
+def test_page_title_wins_over_redirect(tmp_path):
+    pages = [{"title": "A", "text": "first", "redirects": ["B"]}, {"title": "B", "text": "second"}]
+    docstore = OfflineWikipedia.build(pages, tmp_path / "index")
+    assert docstore.search("b").page_content == "second"
+    assert OfflineWikipedia.open(tmp_path / "index").search("a").metadata == {"page": "A"}
@@ -0,0 +1,49 @@
+from langchain.agents.format_scratchpad import format_log_to_str
+from langchain_core.agents import AgentAction
+
+from src.libs.scratchpad import IncrementalScratchpad, ObservationCompaction
+
+
+def steps(count, observation="x" * 50):
+    return [(AgentAction("Search", str(i), f"Thought: step {i}\nAction: Search[{i}]"), f"{observation} {i}") for i in range(count)]
+
+
+def test_matches_format_log_to_str_and_appends_only_new_steps():
+    scratchpad = IncrementalScratchpad()
+    intermediate_steps = []
+    assert scratchpad.format(intermediate_steps) == format_log_to_str(intermediate_steps)
+    for step in steps(5):
+        intermediate_steps.append(step)
+        assert scratchpad.format(intermediate_steps) == format_log_to_str(intermediate_steps)
+    [run] = scratchpad._runs.values()
+    assert len(run.heads) == 5
+
+    # steps that do not continue the cached ones are rebuilt
+    changed = intermediate_steps[:3] + steps(2, "y")
+    assert scratchpad.format(changed) == format_log_to_str(changed)
+
+
+def test_group_actions_of_one_step():
+    log = "Thought: both\nAction: A[1]\nAction: A[2]"
+    grouped = [(AgentAction("A", "1", log), 1), (AgentAction("A", "2", log), 2), (AgentAction("B", "3", "Action: B[3]"), 3)]
+    scratchpad = IncrementalScratchpad(group_actions=True)
+    assert scratchpad.format(grouped) == f"{log}\nObservation: 1\nObservation: 2\nThought: Action: B[3]\nObservation: 3\nThought: "
+
+
+def test_compaction_shortens_old_observations_once():
+    compaction = ObservationCompaction(max_tokens=300, keep_recent=2, max_chars=10)
+    scratchpad = IncrementalScratchpad(compaction=compaction)
+    intermediate_steps = []
+    texts = []
+    for step in steps(8, "x" * 200):
+        intermediate_steps.append(step)
+        texts.append(scratchpad.format(intermediate_steps))
+    assert len(texts[-1]) < len(format_log_to_str(intermediate_steps)) - 6 * 150
+    assert "x" * 200 + " 7" in texts[-1] and "x" * 200 + " 6" in texts[-1]
+    assert "x" * 200 + " 0" not in texts[-1] and "xxxxxxxxxx... (192 characters omitted)" in texts[-1]
+    # compacted steps stay the same, the prompt prefix is stable between iterations
+    prefix = texts[-1][: texts[-1].index("step 5")]
+    assert texts[-2].startswith(prefix[: prefix.index("step 4")])
+
+    summarized = IncrementalScratchpad(compaction=ObservationCompaction(max_tokens=100, summarize=lambda text: "(summary)"))
+    assert summarized.format(steps(4)).count("(summary)") == 2
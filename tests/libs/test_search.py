@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from src.libs.search import NO_RESULT_MESSAGE, GoogleSearchBackend, LocalSearchServer, TTLCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Japan's   Prime Minister ") == "japan's prime minister"
+    assert normalize_query("ＪＡＰＡＮ") == "japan"
+
+
+def test_ttl_cache_expire_and_lru():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a is now the most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None  # evicted
+    now[0] = 11
+    assert cache.get("a") is None  # expired
+    assert len(cache) == 1
+
+
+def test_results_cached():
+    with LocalSearchServer() as server:
+        backend = GoogleSearchBackend(base_url=server.url)
+        res = backend.results("Japan's prime minister", 5)
+        assert len(res) == 5
+        assert set(res[0]) == {"title", "link", "snippet"}
+        assert backend.results("japan's  PRIME minister", 5) == res
+        assert server.queries == ["Japan's prime minister"]
+        assert backend.stats["hits"] == 1
+        backend.close()
+
+
+def test_results_no_items():
+    with LocalSearchServer(responder=lambda q, n: []) as server:
+        backend = GoogleSearchBackend(base_url=server.url)
+        assert backend.results("nothing", 5) == [{"Result": NO_RESULT_MESSAGE}]
+
+
+def test_inflight_requests_merged():
+    with LocalSearchServer(latency=0.2) as server:
+        backend = GoogleSearchBackend(base_url=server.url)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: backend.results("Japan's prime minister", 5), range(8)))
+        assert all(r == results[0] for r in results)
+        assert len(server.queries) == 1
+        assert backend.stats["requests"] == 1
+
+
+def test_aresults_merged():
+    async def run(backend):
+        results = await asyncio.gather(*[backend.aresults("Japan's prime minister", 3) for _ in range(10)])
+        await backend.aclose()
+        return results
+
+    with LocalSearchServer(latency=0.1) as server:
+        backend = GoogleSearchBackend(base_url=server.url)
+        results = asyncio.run(run(backend))
+        assert len(results) == 10
+        assert len(results[0]) == 3
+        assert len(server.queries) == 1
+        # the sync path shares the cache
+        assert backend.results("Japan's prime minister", 3) == results[0]
+        assert len(server.queries) == 1
+
+
+def test_cancelled_leader_hands_off_to_waiters():
+    async def run(backend):
+        leader = asyncio.create_task(backend.aresults("Japan's prime minister", 3))
+        await asyncio.sleep(0.05)
+        waiters = [asyncio.create_task(backend.aresults("Japan's prime minister", 3)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        await backend.aclose()
+        return leader, results
+
+    with LocalSearchServer(latency=0.2) as server:
+        backend = GoogleSearchBackend(base_url=server.url)
+        leader, results = asyncio.run(run(backend))
+        assert leader.cancelled()
+        assert all(len(r) == 3 for r in results)
+        assert backend.stats["requests"] == 2 and backend.stats["merged"] == 5
+        assert backend._inflight == {}
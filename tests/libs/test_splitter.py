@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.libs.splitter import JapaneseTextSplitter
+
+TEXT = """このくらい長いテキストを切ってみます。さらにたくさんのテキストを入れます。
+
+二つ目の段落です、ここも切ります。短い。
+最後の行です。"""
+
+
+def test_split_on_japanese_punctuation():
+    splitter = JapaneseTextSplitter(chunk_size=25)
+    chunks = splitter.split_text(TEXT)
+    assert chunks == [
+        "このくらい長いテキストを切ってみます。",
+        "さらにたくさんのテキストを入れます。",
+        "二つ目の段落です、ここも切ります。短い。",
+        "最後の行です。",
+    ]
+    assert all(len(chunk) <= 25 for chunk in chunks)
+
+
+def test_streaming_matches_whole_text():
+    text = TEXT * 200
+    for overlap in (0, 10):
+        splitter = JapaneseTextSplitter(chunk_size=40, chunk_overlap=overlap)
+        fragments = (text[i : i + 7] for i in range(0, len(text), 7))
+        assert list(splitter.iter_split(fragments)) == splitter.split_text(text)
+    with pytest.raises(ValueError):
+        list(JapaneseTextSplitter(chunk_size=40, chunk_overlap=40).iter_split([text]))
+
+
+def test_overlap_starts_at_boundary():
+    chunks = JapaneseTextSplitter(chunk_size=25, chunk_overlap=12).split_text(TEXT)
+    assert chunks[1].startswith("テキストを切ってみます。") or chunks[1].startswith("さらに")
+
+
+def test_split_corpus_in_order():
+    texts = [f"{i}番目の文書です。" * (i + 1) for i in range(20)]
+    serial = JapaneseTextSplitter(chunk_size=30)
+    assert serial.processes == 1  # no pool unless asked for
+    expected = [serial.split_text(text) for text in texts]
+    parallel = JapaneseTextSplitter(chunk_size=30, processes=2, batch_chars=50)
+    with ThreadPoolExecutor(2) as executor:
+        assert list(parallel.split_corpus(iter(texts), executor=executor)) == expected
+    assert list(parallel.split_corpus(texts)) == expected  # process pool
+
+    docs = list(serial.iter_documents(texts[:2], metadatas=[{"source": "a"}, {"source": "b"}]))
+    assert [d.metadata["source"] for d in docs] == ["a", "b"]
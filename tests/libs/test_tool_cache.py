@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from langchain_core.tools import StructuredTool, Tool
+
+from src.libs.tool_cache import ToolCache, memoize_tool, memoize_tools
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_tools(calls):
+    def get_invoice(name: str) -> int:
+        calls.append(name)
+        return {"A": 2000, "B": 1500}[name]
+
+    def add(a: int, b: int) -> int:
+        calls.append((a, b))
+        return a + b
+
+    async def aadd(a: int, b: int) -> int:
+        calls.append((a, b))
+        return a + b
+
+    return [
+        Tool(name="GetInvoice", func=get_invoice, description="Get invoice amount of trading company."),
+        StructuredTool.from_function(func=add, coroutine=aadd, name="Add", description="Add two numbers."),
+    ]
+
+
+def test_memoizes_pure_tools_with_stats():
+    calls = []
+    cache = ToolCache()
+    invoice, add = memoize_tools(counting_tools(calls), cache)
+    assert [invoice.invoke("A"), invoice.invoke("A"), invoice.invoke("B")] == [2000, 2000, 1500]
+    assert add.invoke({"a": 1, "b": 2}) == add.invoke({"b": 2, "a": 1}) == asyncio.run(add.ainvoke({"a": 1, "b": 2})) == 3
+    assert calls == ["A", "B", (1, 2)]
+    assert (cache.stats["GetInvoice"].hits, cache.stats["GetInvoice"].misses) == (1, 2)
+    assert cache.stats["Add"].hit_rate == pytest.approx(2 / 3)
+
+    # errors are not cached, impure tools are not wrapped
+    with pytest.raises(KeyError):
+        invoice.invoke("Z")
+    with pytest.raises(KeyError):
+        invoice.invoke("Z")
+    assert calls.count("Z") == 2
+    tool = counting_tools(calls)[0]
+    assert memoize_tool(tool, cache, pure=False) is tool
+
+
+def test_ttl_and_persistence(tmp_path):
+    calls = []
+    clock = Clock()
+    path = str(tmp_path / "tools.sqlite3")
+    cache = ToolCache(ttl=60, path=path, timer=clock)
+    invoice = memoize_tool(counting_tools(calls)[0], cache)
+    invoice.invoke("A")
+    clock.now += 30
+    invoice.invoke("A")
+    assert calls == ["A"]
+    clock.now += 31
+    invoice.invoke("A")
+    assert calls == ["A", "A"]
+    cache.close()
+
+    # a new process reads the results from disk
+    reopened = ToolCache(ttl=60, path=path, timer=clock)
+    assert memoize_tool(counting_tools(calls)[0], reopened).invoke("A") == 2000
+    assert calls == ["A", "A"] and reopened.stats["GetInvoice"].hits == 1
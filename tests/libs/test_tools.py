@@ -0,0 +1,64 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.libs import tools
+from src.libs.tools import ToolRegistry
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# modules that must only be imported when a tool is actually used
+LAZY_MODULES = ["numpy", "langchain_core", "langchain_google_community", "googleapiclient", "httpx"]
+IMPORT_TIME_BUDGET_US = 500_000
+
+
+def test_registry_builds_lazily():
+    calls = []
+    registry = ToolRegistry()
+
+    @registry.register("Echo")
+    def create_echo():
+        calls.append(1)
+        return object()
+
+    assert registry.names() == ["Echo"]
+    assert "Echo" in registry
+    assert not registry.is_built("Echo")
+    assert calls == []
+
+    tool = registry.get("Echo")
+    assert registry.get("Echo") is tool
+    assert calls == [1]
+
+    with pytest.raises(KeyError, match="Available tools: \\['Echo'\\]"):
+        registry.get("Unknown")
+
+
+def test_default_tools():
+    assert tools.registry.names() == ["BatchArithmetic", "Multiplier", "google-search"]
+    assert tools.TOOL_PARSE_MULTIPLIER is tools.get_tool("Multiplier")
+    assert tools.TOOL_PARSE_MULTIPLIER.invoke("3,4") == 12
+    assert tools.TOOL_GOOGLE.name == "google-search"
+
+
+def test_import_time_budget():
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.libs.tools"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # "import time: self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, total, name = line[len("import time:") :].split("|")
+        cumulative[name.strip()] = int(total)
+
+    for name in LAZY_MODULES:
+        assert name not in cumulative, f"{name} is imported by src.libs.tools"
+    assert cumulative["src.libs.tools"] < IMPORT_TIME_BUDGET_US
@@ -0,0 +1,86 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from src.examples.langgraph_self_reflection import GradeAnswer, GradeDocuments, GradeHallucinations, create_graph
+from src.libs.vector_index import HashingEmbeddings, VectorIndex, VectorIndexRetriever
+
+TEXTS = [
+    "東京の天気は晴れです。",
+    "大阪で会議があります。",
+    "LangChain agent uses tools.",
+    "野球の試合は雨で中止です。",
+]
+
+
+def test_hashing_embeddings():
+    embeddings = HashingEmbeddings(dim=64)
+    vectors = embeddings.embed_array(TEXTS)
+    assert vectors.shape == (4, 64) and vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+    assert embeddings.embed_query("東京の天気") == embeddings.embed_documents(["東京の天気"])[0]
+    query = embeddings.embed_array(["東京の天気を教えて"])[0]
+    assert int(np.argmax(vectors @ query)) == 0
+
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    index = VectorIndex(dim=32)
+    for start in range(0, 500, 64):  # incremental appends
+        index.add(vectors[start : start + 64], [Document(page_content=str(i)) for i in range(start, min(start + 64, 500))])
+    queries = rng.normal(size=(37, 32)).astype(np.float32)
+    scores, indices = index.search(queries, k=5, batch_size=8)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(queries @ normalized.T), axis=1)[:, :5]
+    np.testing.assert_array_equal(indices, expected)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    assert index.search(queries[:1], k=1000)[1].shape == (1, 500)
+    assert VectorIndex(dim=32).search(queries, k=3)[1].shape == (37, 0)
+
+
+def test_snapshot_round_trip(tmp_path):
+    retriever = VectorIndexRetriever.from_documents([Document(page_content=t, metadata={"i": i}) for i, t in enumerate(TEXTS)], HashingEmbeddings(), k=2)
+    retriever.index.save(tmp_path / "index")
+    loaded = VectorIndex.load(tmp_path / "index")
+    assert isinstance(loaded.vectors, np.memmap)
+    np.testing.assert_array_equal(loaded.vectors, retriever.index.vectors)
+    assert loaded.documents == retriever.index.documents
+
+    reopened = VectorIndexRetriever(index=loaded, embeddings=HashingEmbeddings(), k=2)
+    reopened.add_documents([Document(page_content="京都の天気は雨です。")])  # copies the read-only snapshot
+    assert len(loaded) == 5
+    assert [d.page_content for d in reopened.invoke("京都の天気")][0] == "京都の天気は雨です。"
+    assert VectorIndex.load(tmp_path / "index").vectors.shape == (4, 256)
+
+
+def test_retriever_single_and_batch_agree():
+    words = ["東京", "大阪", "天気", "会議", "資料", "LangChain", "agent", "検索", "文書", "予定"]
+    rng = np.random.default_rng(0)
+    docs = [Document(page_content="".join(rng.choice(words, size=20))) for _ in range(5000)]
+    retriever = VectorIndexRetriever.from_documents(docs, HashingEmbeddings(), k=4)
+    queries = ["東京の天気", "会議の資料", "LangChain agent 検索"] * 100
+    results = [retriever.invoke(q) for q in queries]
+    assert all(len(r) == 4 for r in results)
+    # near ties are ranked by index, so one query at a time and a batch return the same order
+    assert results == retriever.search_batch(queries)
+
+
+def test_graph_with_vector_index_retriever():
+    docs = [Document(page_content=t) for t in TEXTS]
+    retriever = VectorIndexRetriever.from_documents(docs, HashingEmbeddings(), k=2)
+    chat = MagicMock()
+    chat.side_effect = [AIMessage(content="晴れです。")]
+
+    def grade(prompt_value):
+        text = prompt_value.to_string()
+        if "Retrieved document" in text:
+            return GradeDocuments(binary_score="yes" if "東京" in text.split("User question")[0] else "no")
+        return GradeHallucinations(binary_score="yes") if "Set of facts" in text else GradeAnswer(binary_score="yes")
+
+    chat.with_structured_output.return_value.side_effect = grade
+    res = create_graph(chat=chat, retriever=retriever).invoke({"question": "東京の天気は?"})
+    assert res["documents"] == [docs[0]]
+    assert res["generation"] == "晴れです。"